@@ -0,0 +1,103 @@
+"""
+Registry of LLM providers, models and agents.
+
+Nothing is built at import time: agents are registered as factories and
+constructed on first use (or up front by warm_up() in the app lifespan), then
+cached. Providers are shared between models on the same endpoint, so several
+model configs can live side by side without opening extra connection pools.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIChatModel
+from pydantic_ai.providers.openai import OpenAIProvider
+
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """Endpoint, credentials and model name of one LLM."""
+
+    base_url: str
+    api_key: str
+    model_name: str
+
+
+def main_model_config() -> ModelConfig:
+    """Read the main AI provider's config from the environment."""
+    return ModelConfig(
+        base_url=os.environ.get("AI_PROVIDER_BASE_URL", ""),
+        api_key=os.environ.get("AI_PROVIDER_API_KEY", ""),
+        model_name=os.environ.get("AI_PROVIDER_MODEL", "llama3.1:8b"),
+    )
+
+
+class ModelRegistry:
+    """Lazily builds and caches providers, models and named agents."""
+
+    def __init__(self) -> None:
+        self._factories: dict[str, Callable[[], Agent[Any, Any]]] = {}
+        self._agents: dict[str, Agent[Any, Any]] = {}
+        self._providers: dict[tuple[str, str], OpenAIProvider] = {}
+        self._models: dict[ModelConfig, OpenAIChatModel] = {}
+
+    def register(self, name: str, factory: Callable[[], Agent[Any, Any]]) -> None:
+        """Register how to build the agent called name; nothing is built yet."""
+        self._factories[name] = factory
+        self._agents.pop(name, None)
+
+    def get_model(self, config: ModelConfig) -> OpenAIChatModel:
+        """Return the cached chat model for config, building it on first use."""
+        model = self._models.get(config)
+        if model is None:
+            provider_key = (config.base_url, config.api_key)
+            provider = self._providers.get(provider_key)
+            if provider is None:
+                provider = OpenAIProvider(
+                    base_url=config.base_url, api_key=config.api_key
+                )
+                self._providers[provider_key] = provider
+            model = OpenAIChatModel(model_name=config.model_name, provider=provider)
+            self._models[config] = model
+        return model
+
+    def get_agent(self, name: str) -> Agent[Any, Any]:
+        """Return the agent called name, building it on first use."""
+        agent = self._agents.get(name)
+        if agent is None:
+            if name not in self._factories:
+                raise KeyError(f"No agent registered as {name!r}")
+            agent = self._factories[name]()
+            self._agents[name] = agent
+        return agent
+
+    def warm_up(self) -> None:
+        """Build every registered agent now rather than on the first request."""
+        for name in self._factories:
+            self.get_agent(name)
+
+    async def aclose(self) -> None:
+        """Close the providers' HTTP clients and drop everything built so far.
+
+        Factories stay registered, so agents are rebuilt on next use.
+        """
+        providers = list(self._providers.values())
+        self._agents.clear()
+        self._models.clear()
+        self._providers.clear()
+        for provider in providers:
+            await provider.client.close()
+
+    def stats(self) -> dict[str, int]:
+        """Return how many agents, models and providers are built."""
+        return {
+            "registered_agents": len(self._factories),
+            "agents": len(self._agents),
+            "models": len(self._models),
+            "providers": len(self._providers),
+        }
+
+
+model_registry = ModelRegistry()
@@ -3,16 +3,18 @@ Stakeholder Agent using PydanticAI.
 Simulates a project stakeholder persona for interactive conversations.
 """
 
-import os
+from collections.abc import AsyncIterator
 
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent, RunContext, ModelMessage
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.openai import OpenAIProvider
 from typing import cast
 
 
+from src.agents.model_registry import main_model_config, model_registry
+from src.exceptions.llm_overloaded_exception import LlmOverloadedException
 from src.exceptions.llm_response_exception import LlmResponseException
+from src.limits.admission import LlmPriority, LlmQueueTimeout, llm_admission
+from src.limits.quota import acharge_token_usage
 from src.schemas.persona_model import Persona
 from src.schemas.project_model import Project
 
@@ -35,23 +37,8 @@ class AgentResponse(BaseModel):
 def create_stakeholder_agent() -> Agent[AgentDependencies, AgentResponse]:
     """Create and configure the stakeholder agent."""
 
-    # Get environment variables
-    api_base_url = os.environ.get("AI_PROVIDER_BASE_URL", "")
-    api_key = os.environ.get("AI_PROVIDER_API_KEY", "")
-    model_name = os.environ.get("AI_PROVIDER_MODEL", "llama3.1:8b")
-
-    provider = OpenAIProvider(
-        base_url=api_base_url,
-        api_key=api_key,
-    )
-
-    model = OpenAIChatModel(
-        model_name=model_name,
-        provider=provider,
-    )
-
     agent = Agent(
-        model=model,
+        model=model_registry.get_model(main_model_config()),
         deps_type=AgentDependencies,
         output_type=AgentResponse,
     )
@@ -81,16 +68,16 @@ def create_stakeholder_agent() -> Agent[AgentDependencies, AgentResponse]:
     return cast(Agent[AgentDependencies, AgentResponse], cast(object, agent))
 
 
-# Singleton instance
-_agent: Agent[AgentDependencies, AgentResponse] | None = None
+# Built on first use (or at startup by model_registry.warm_up())
+model_registry.register("stakeholder", create_stakeholder_agent)
 
 
 def get_stakeholder_agent() -> Agent[AgentDependencies, AgentResponse]:
     """Get or create the stakeholder agent singleton."""
-    global _agent
-    if _agent is None:
-        _agent = create_stakeholder_agent()
-    return _agent
+    return cast(
+        Agent[AgentDependencies, AgentResponse],
+        model_registry.get_agent("stakeholder"),
+    )
 
 
 async def run_stakeholder_query(
@@ -98,8 +85,13 @@ async def run_stakeholder_query(
     persona: Persona,
     project: Project,
     history: list[ModelMessage],
+    user_id: str | None = None,
 ) -> str:
-    """Run a query through the stakeholder agent."""
+    """Run a query through the stakeholder agent.
+
+    If user_id is given, the tokens used are charged to that user's quota.
+    Raises LlmOverloadedException if the call is shed by admission control.
+    """
     agent = get_stakeholder_agent()
 
     # Create dependencies
@@ -109,8 +101,58 @@ async def run_stakeholder_query(
         history=history,
     )
     try:
-        result = await agent.run(message, deps=deps, message_history=history)
-        return result.output.content
+        async with llm_admission.admit(LlmPriority.interactive):
+            result = await agent.run(message, deps=deps, message_history=history)
+    except LlmQueueTimeout:
+        raise LlmOverloadedException()
+    except Exception as e:
+        raise LlmResponseException(
+            message="Error running stakeholder agent", details={"error": str(e)}
+        )
+    if user_id is not None:
+        await acharge_token_usage(user_id, result.usage())
+    return result.output.content
+
+
+async def stream_stakeholder_query(
+    message: str,
+    persona: Persona,
+    project: Project,
+    history: list[ModelMessage],
+    user_id: str | None = None,
+) -> AsyncIterator[str]:
+    """Stream the stakeholder's reply as it is generated, yielding new text.
+
+    If user_id is given, the tokens used are charged to that user's quota,
+    also when the caller stops consuming the stream part way.
+    Raises LlmOverloadedException if the call is shed by admission control.
+    """
+    agent = get_stakeholder_agent()
+
+    deps = AgentDependencies(
+        persona=persona,
+        project=project,
+        history=history,
+    )
+    sent = ""
+    try:
+        async with (
+            # The slot is held until the whole reply has been streamed
+            llm_admission.admit(LlmPriority.interactive),
+            agent.run_stream(message, deps=deps, message_history=history) as result,
+        ):
+            try:
+                # Each partial output holds the reply so far; pass on what is new
+                async for partial in result.stream_output():
+                    if len(partial.content) > len(sent):
+                        delta = partial.content[len(sent) :]
+                        sent = partial.content
+                        yield delta
+            finally:
+                if user_id is not None:
+                    await acharge_token_usage(user_id, result.usage())
+    except LlmQueueTimeout:
+        raise LlmOverloadedException()
     except Exception as e:
         raise LlmResponseException(
             message="Error running stakeholder agent", details={"error": str(e)}
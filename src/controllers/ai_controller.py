@@ -5,12 +5,77 @@ AIController is responsible for:
     delegating processing to AgentService
 """
 
+import asyncio
+import hashlib
+import json
+import os
+from collections.abc import AsyncIterator, Awaitable
+from contextlib import aclosing
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException
+from functools import partial
+from typing import Annotated, Any
 
-from src.dependencies import WideEvent, CurrentUser, AgentService, RateLimit
-from src.schemas.ai import GenerateRequest, GenerateResponse, MessageType
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 
+from src.dependencies import (
+    WideEvent,
+    CurrentUser,
+    AgentService,
+    SessionAgentService,
+    RateLimit,
+    TokenQuota,
+    RetryExemptRateLimit,
+    RetryExemptTokenQuota,
+    RetryExemptConcurrencyLimit,
+    StreamConcurrencyLimit,
+    DisconnectWatch,
+    authenticate_token,
+    enforce_token_quota,
+    rate_limit,
+)
+from src.dependencies.disconnect import ClientDisconnected, client_disconnects
+from src.dependencies.services import AgentSession
+from src.dependencies.user import AuthenticatedUser
+from src.exceptions.authentication_error import AuthenticationError
+from src.exceptions.base_exceptions import AppException
+from src.limits.concurrency import ConcurrencyLimitExceeded, generation_limiter
+from src.service.agent_service import AgentService as AgentServiceClass
+from src.service.generation_jobs import (
+    JobStatus,
+    generation_job_worker,
+    generation_jobs,
+    submit_generation_job,
+)
+from src.service.idempotency import IdempotencyKeyMismatch, generate_idempotency
+from src.schemas.ai import (
+    GenerateJobResponse,
+    GenerateRequest,
+    GenerateResponse,
+    MessageType,
+)
+
+
+# How long a WebSocket client has to send its token after connecting
+WEBSOCKET_AUTH_TIMEOUT_SECONDS = float(
+    os.environ.get("WEBSOCKET_AUTH_TIMEOUT_SECONDS", "10")
+)
+
+# Longest a job poll may wait for the result; stays under gateway timeouts
+GENERATION_JOB_MAX_WAIT_SECONDS = float(
+    os.environ.get("GENERATION_JOB_MAX_WAIT_SECONDS", "25")
+)
 
 router = APIRouter(prefix="/api/v1", tags=["ai"])
 
@@ -21,8 +86,13 @@ async def generate(
     current_user: CurrentUser,
     wide_event: WideEvent,
     agent_service: AgentService,
-    _: RateLimit,
-) -> GenerateResponse:
+    _: RetryExemptRateLimit,
+    __: RetryExemptTokenQuota,
+    ___: RetryExemptConcurrencyLimit,
+    disconnect: DisconnectWatch,
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
+    prefer: Annotated[str | None, Header()] = None,
+) -> GenerateResponse | Response:
     start_time = datetime.now(timezone.utc)
     wide_event.add_context(
         user_id=current_user.user_id,
@@ -33,11 +103,50 @@ async def generate(
         ai_service_start_time=start_time.isoformat(),
     )
 
-    ai_service_response = await agent_service.process_agent_query(
-        user_id=current_user.user_id,
-        conversation_id=payload.conversation_id,
-        content=payload.content,
-    )
+    # "Prefer: respond-async" (RFC 7240) opts into a job instead of waiting
+    if prefer is not None and "respond-async" in prefer.lower():
+        return await _submit_generation(
+            payload, current_user, wide_event, agent_service, idempotency_key
+        )
+
+    def process() -> Awaitable[dict[str, Any]]:
+        return agent_service.process_agent_query(
+            user_id=current_user.user_id,
+            conversation_id=payload.conversation_id,
+            content=payload.content,
+        )
+
+    try:
+        if idempotency_key is not None:
+            # The client will retry, so the work outlives a disconnect and a
+            # retry with the same key attaches to it or gets its result
+            wide_event.add_context(idempotency_key_used=True)
+            ai_service_response = await generate_idempotency.run(
+                f"{current_user.user_id}:{idempotency_key}",
+                _fingerprint(payload),
+                process,
+                cache_if=lambda response: response.get("status") == "success",
+            )
+        else:
+            # Stop the model (and any inline summarization) if nobody is waiting
+            ai_service_response = await disconnect.run(process(), route="generate")
+    except IdempotencyKeyMismatch:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    except ClientDisconnected:
+        end_time = datetime.now(timezone.utc)
+        wide_event.add_context(
+            ai_service_process_message_status="cancelled",
+            client_disconnected=True,
+            ai_service_end_time=end_time.isoformat(),
+            ai_service_duration_time_ms=int(
+                (end_time - start_time).total_seconds() * 1000
+            ),
+        )
+        # Nginx's "client closed request"; nobody reads it
+        return Response(status_code=499)
 
     end_time = datetime.now(timezone.utc)
     duration_ms = int((end_time - start_time).total_seconds() * 1000)
@@ -59,3 +168,317 @@ async def generate(
         content=ai_service_response.get("response", ""),
         type=MessageType.ai,
     )
+
+
+async def _submit_generation(
+    payload: GenerateRequest,
+    current_user: AuthenticatedUser,
+    wide_event: WideEvent,
+    agent_service: AgentServiceClass,
+    idempotency_key: str | None,
+) -> Response:
+    """Save the user message and queue its answer as a job; 202 with the job."""
+    if generation_job_worker.full:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many queued generations",
+            headers={"Retry-After": "5"},
+        )
+
+    async def submit() -> dict[str, Any]:
+        # Queued and running jobs count against the user's in-flight
+        # generations; checked again when the job is queued
+        if generation_jobs.unfinished(current_user.user_id) >= generation_limiter.limit:
+            return {"status": "busy"}
+        # Saved and queued within the conversation's turn; the message is
+        # deleted again if the queue filled up in the meantime
+        job = await agent_service.queue_agent_query(
+            user_id=current_user.user_id,
+            conversation_id=payload.conversation_id,
+            content=payload.content,
+            enqueue=partial(
+                submit_generation_job,
+                current_user.user_id,
+                payload.conversation_id,
+                payload.content,
+            ),
+        )
+        if job is None:
+            return {"status": "error"}
+        return {"status": "accepted", "job_id": job.id}
+
+    if idempotency_key is not None:
+        wide_event.add_context(idempotency_key_used=True)
+        try:
+            submitted = await generate_idempotency.run(
+                f"{current_user.user_id}:{idempotency_key}",
+                # Never replays a synchronous response, nor the other way round
+                f"{_fingerprint(payload)}:async",
+                submit,
+                cache_if=lambda response: response.get("status") == "accepted",
+            )
+        except IdempotencyKeyMismatch:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request",
+            )
+    else:
+        submitted = await submit()
+
+    if submitted.get("status") == "busy":
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent requests",
+            headers={"Retry-After": "1"},
+        )
+    if submitted.get("status") != "accepted":
+        raise HTTPException(
+            status_code=503,
+            detail="Too many queued generations",
+            headers={"Retry-After": "5"},
+        )
+    job_id = submitted["job_id"]
+    wide_event.add_context(ai_service_process_message_status="queued", job_id=job_id)
+    body = GenerateJobResponse(
+        job_id=job_id,
+        conversation_id=payload.conversation_id,
+        status=JobStatus.queued.value,
+    )
+    return JSONResponse(
+        status_code=202,
+        content=body.model_dump(mode="json"),
+        headers={"Location": f"{router.prefix}/generate/jobs/{job_id}"},
+    )
+
+
+@router.get("/generate/jobs/{job_id}", response_model=GenerateJobResponse)
+async def get_generation_job(
+    job_id: str,
+    current_user: CurrentUser,
+    wait: Annotated[float, Query(ge=0, le=GENERATION_JOB_MAX_WAIT_SECONDS)] = 0,
+) -> GenerateJobResponse:
+    """Poll an async generation; with wait, long-poll up to that many seconds
+    for it to finish
+    """
+    job = generation_jobs.get(job_id, current_user.user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait > 0 and not job.done.is_set():
+        try:
+            await asyncio.wait_for(job.done.wait(), wait)
+        except TimeoutError:
+            pass
+    return GenerateJobResponse(
+        job_id=job.id,
+        conversation_id=job.conversation_id,
+        status=job.status.value,
+        content=job.response,
+        error=job.error,
+    )
+
+
+def _fingerprint(payload: GenerateRequest) -> str:
+    """Identify a request body, to catch an Idempotency-Key being reused."""
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/generate/stream")
+async def generate_stream(
+    payload: GenerateRequest,
+    current_user: CurrentUser,
+    wide_event: WideEvent,
+    agent_service: AgentService,
+    _: RateLimit,
+    __: TokenQuota,
+    ___: StreamConcurrencyLimit,
+) -> StreamingResponse:
+    """Stream the stakeholder response as Server-Sent Events:
+    "delta" events carry new text, then a final "done" event carries the
+    whole response (or an "error" event if the model call failed)
+    """
+    start_time = datetime.now(timezone.utc)
+    wide_event.emit_after_body = True
+    wide_event.add_context(
+        user_id=current_user.user_id,
+        conversation_id=str(payload.conversation_id),
+        user_message_preview=payload.content[:50],
+        user_message_length=len(payload.content),
+        ai_service_process_message_status="started",
+        ai_service_start_time=start_time.isoformat(),
+    )
+
+    async def events() -> AsyncIterator[str]:
+        chunks: list[str] = []
+        # Stays "disconnected" if the client goes away before the end
+        status = "disconnected"
+        error_details = ""
+        try:
+            async for delta in agent_service.stream_agent_query(
+                user_id=current_user.user_id,
+                conversation_id=payload.conversation_id,
+                content=payload.content,
+            ):
+                chunks.append(delta)
+                yield _sse("delta", {"content": delta})
+            status = "success"
+            response = GenerateResponse(
+                conversation_id=payload.conversation_id,
+                content="".join(chunks),
+                type=MessageType.ai,
+            )
+            yield _sse("done", response.model_dump(mode="json"))
+        except Exception as e:
+            # Headers are already sent, so the error is reported in-stream
+            status = "error"
+            error_details = str(e)
+            error_code = e.error if isinstance(e, AppException) else "INTERNAL_ERROR"
+            yield _sse(
+                "error",
+                {"error": error_code, "message": "Error processing agent query"},
+            )
+        finally:
+            end_time = datetime.now(timezone.utc)
+            content = "".join(chunks)
+            if status == "disconnected":
+                client_disconnects.record("generate_stream")
+                wide_event.add_context(client_disconnected=True)
+            wide_event.add_context(
+                ai_service_process_message_status=status,
+                ai_service_response_preview=content[:50],
+                ai_service_response_length=len(content),
+                ai_service_response_error_details=error_details,
+                ai_service_end_time=end_time.isoformat(),
+                ai_service_duration_time_ms=int(
+                    (end_time - start_time).total_seconds() * 1000
+                ),
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _authenticate_websocket(websocket: WebSocket) -> AuthenticatedUser:
+    """Authenticate from the Authorization header or, since browsers cannot
+    set headers on a WebSocket, from a first {"token": ...} message."""
+    authorization = websocket.headers.get("authorization")
+    if authorization and authorization.startswith("Bearer "):
+        return await authenticate_token(authorization.split(" ")[1])
+    try:
+        first = await asyncio.wait_for(
+            websocket.receive_json(), WEBSOCKET_AUTH_TIMEOUT_SECONDS
+        )
+    except (TimeoutError, ValueError):
+        raise AuthenticationError("No authorization token provided")
+    token = first.get("token") if isinstance(first, dict) else None
+    if not isinstance(token, str) or not token:
+        raise AuthenticationError("No authorization token provided")
+    return await authenticate_token(token)
+
+
+async def _session_turn(
+    websocket: WebSocket,
+    current_user: AuthenticatedUser,
+    agent_session: AgentSession,
+    payload: GenerateRequest,
+) -> None:
+    """Run one turn of a WebSocket session, streaming the response back."""
+    # Same per-turn limits as the HTTP endpoints; off the event loop, since
+    # the shared backends block
+    await run_in_threadpool(rate_limit, current_user, Response())
+    await run_in_threadpool(enforce_token_quota, current_user, Response())
+    chunks: list[str] = []
+    async with (
+        generation_limiter.acquire(current_user.user_id),
+        agent_session.turn() as agent_service,
+    ):
+        stream = agent_service.stream_agent_query(
+            user_id=current_user.user_id,
+            conversation_id=payload.conversation_id,
+            content=payload.content,
+        )
+        # Closed right away if sending fails, so the model call stops too
+        async with aclosing(stream):
+            try:
+                async for delta in stream:
+                    chunks.append(delta)
+                    await websocket.send_json({"type": "delta", "content": delta})
+            except WebSocketDisconnect:
+                client_disconnects.record("generate_ws")
+                raise
+    response = GenerateResponse(
+        conversation_id=payload.conversation_id,
+        content="".join(chunks),
+        type=MessageType.ai,
+    )
+    await websocket.send_json(
+        {"type": "done", "response": response.model_dump(mode="json")}
+    )
+
+
+@router.websocket("/generate/ws")
+async def generate_session(
+    websocket: WebSocket, agent_session: SessionAgentService
+) -> None:
+    """Multi-turn session: authenticates once, then each
+    {"conversation_id", "content"} message is answered with "delta" messages
+    and a final "done" (or "error") message
+    """
+    await websocket.accept()
+    try:
+        current_user = await _authenticate_websocket(websocket)
+    except AuthenticationError as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.message)
+        return
+    except WebSocketDisconnect:
+        return
+
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if current_user.is_expired():
+                await websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION, reason="Token has expired"
+                )
+                return
+            try:
+                payload = GenerateRequest.model_validate_json(message)
+                await _session_turn(websocket, current_user, agent_session, payload)
+            except ValidationError:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "error": "VALIDATION_ERROR",
+                        "message": "Expected conversation_id and content",
+                    }
+                )
+            except HTTPException as e:
+                await websocket.send_json(
+                    {"type": "error", "error": "HTTP_ERROR", "message": str(e.detail)}
+                )
+            except ConcurrencyLimitExceeded:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "error": "HTTP_ERROR",
+                        "message": "Too many concurrent requests",
+                    }
+                )
+            except AppException as e:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "error": e.error,
+                        "message": "Error processing agent query",
+                    }
+                )
+    except WebSocketDisconnect:
+        return
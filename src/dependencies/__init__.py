@@ -1,9 +1,31 @@
 from .event import get_wide_event, WideEvent
-from .user import get_current_user, CurrentUser
-from .rate_limiter import rate_limit, RateLimit
+from .user import authenticate_token, get_current_user, CurrentUser
+from .idempotency import get_idempotent_retry, IdempotentRetry
+from .rate_limiter import (
+    rate_limit,
+    rate_limit_unless_retry,
+    RateLimit,
+    RetryExemptRateLimit,
+)
+from .token_quota import (
+    enforce_token_quota,
+    enforce_token_quota_unless_retry,
+    TokenQuota,
+    RetryExemptTokenQuota,
+)
+from .concurrency import (
+    limit_concurrency,
+    limit_concurrency_unless_retry,
+    ConcurrencyLimit,
+    RetryExemptConcurrencyLimit,
+    StreamConcurrencyLimit,
+)
+from .disconnect import get_disconnect_watcher, DisconnectWatch
 from .database import (
+    get_conversation_summary_repository,
     get_message_repository,
     get_message_service,
+    ConversationSummaryRepository,
     MessageRepository,
     MessageService,
 )
@@ -11,26 +33,48 @@ from .services import (
     get_persona_service,
     get_project_service,
     get_agent_service,
+    get_session_agent_service,
     PersonaService,
     ProjectService,
     AgentService,
+    SessionAgentService,
 )
 
 __all__ = [
     "get_wide_event",
     "WideEvent",
+    "authenticate_token",
     "get_current_user",
     "CurrentUser",
+    "get_idempotent_retry",
+    "IdempotentRetry",
     "rate_limit",
+    "rate_limit_unless_retry",
     "RateLimit",
+    "RetryExemptRateLimit",
+    "enforce_token_quota",
+    "enforce_token_quota_unless_retry",
+    "TokenQuota",
+    "RetryExemptTokenQuota",
+    "limit_concurrency",
+    "limit_concurrency_unless_retry",
+    "ConcurrencyLimit",
+    "RetryExemptConcurrencyLimit",
+    "StreamConcurrencyLimit",
+    "get_disconnect_watcher",
+    "DisconnectWatch",
+    "get_conversation_summary_repository",
     "get_message_repository",
     "get_message_service",
+    "ConversationSummaryRepository",
     "MessageRepository",
     "MessageService",
     "get_persona_service",
     "get_project_service",
     "get_agent_service",
+    "get_session_agent_service",
     "PersonaService",
     "ProjectService",
     "AgentService",
+    "SessionAgentService",
 ]
@@ -0,0 +1,44 @@
+"""Caps how many generations a single user can have in flight at once."""
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, status
+
+from src.dependencies.idempotency import IdempotentRetry
+from src.dependencies.user import CurrentUser
+from src.limits.concurrency import ConcurrencyLimitExceeded, generation_limiter
+
+
+async def limit_concurrency(current_user: CurrentUser) -> AsyncIterator[None]:
+    try:
+        async with generation_limiter.acquire(current_user.user_id):
+            yield
+    except ConcurrencyLimitExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent requests",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def limit_concurrency_unless_retry(
+    retry: IdempotentRetry, current_user: CurrentUser
+) -> AsyncIterator[None]:
+    # A retry waits on the attempt holding the slot; it must not need another
+    if retry:
+        yield
+        return
+    async with asynccontextmanager(limit_concurrency)(current_user):
+        yield
+
+
+# Released as soon as the endpoint returns, not after the response is sent
+ConcurrencyLimit = Annotated[None, Depends(limit_concurrency, scope="function")]
+# Retries answered from the idempotency store take no slot
+RetryExemptConcurrencyLimit = Annotated[
+    None, Depends(limit_concurrency_unless_retry, scope="function")
+]
+# Held until a streamed response has been fully sent
+StreamConcurrencyLimit = Annotated[None, Depends(limit_concurrency)]
@@ -4,7 +4,10 @@ from typing import Annotated
 from fastapi import Depends
 
 from src.database import DatabaseSession
-from src.repository.model_repository import MessageRepository as MessageRepositoryClass
+from src.repository.model_repository import (
+    ConversationSummaryRepository as ConversationSummaryRepositoryClass,
+    MessageRepository as MessageRepositoryClass,
+)
 from src.service.message_service import MessageService as MessageServiceClass
 
 
@@ -13,6 +16,13 @@ def get_message_repository(session: DatabaseSession) -> MessageRepositoryClass:
     return MessageRepositoryClass(session)
 
 
+def get_conversation_summary_repository(
+    session: DatabaseSession,
+) -> ConversationSummaryRepositoryClass:
+    """Get ConversationSummaryRepository instance with injected database session."""
+    return ConversationSummaryRepositoryClass(session)
+
+
 def get_message_service(
     repository: Annotated[MessageRepositoryClass, Depends(get_message_repository)],
 ) -> MessageServiceClass:
@@ -22,4 +32,7 @@ def get_message_service(
 
 # Type aliases for dependency injection
 MessageRepository = Annotated[MessageRepositoryClass, Depends(get_message_repository)]
+ConversationSummaryRepository = Annotated[
+    ConversationSummaryRepositoryClass, Depends(get_conversation_summary_repository)
+]
 MessageService = Annotated[MessageServiceClass, Depends(get_message_service)]
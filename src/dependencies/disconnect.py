@@ -0,0 +1,73 @@
+"""Cancels request work whose client has already gone away."""
+
+import asyncio
+from collections import Counter
+from collections.abc import Awaitable
+from contextlib import suppress
+from typing import Annotated, TypeVar
+
+from fastapi import Depends, Request
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client disconnected before the work finished."""
+
+
+class DisconnectCounter:
+    """Counts work cancelled because its client disconnected, per route."""
+
+    def __init__(self) -> None:
+        self.cancelled: Counter[str] = Counter()
+
+    def record(self, route: str) -> None:
+        self.cancelled[route] += 1
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.cancelled)
+
+
+client_disconnects = DisconnectCounter()
+
+
+class DisconnectWatcher:
+    """Runs a request's work, cancelling it if the client disconnects first."""
+
+    def __init__(self, request: Request):
+        self.request = request
+
+    async def _wait_for_disconnect(self) -> None:
+        # The body has already been read, so the next message is the disconnect
+        while True:
+            message = await self.request.receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def run(self, work: Awaitable[T], route: str) -> T:
+        """Await work; if the client disconnects first, cancel it, count it
+        against route and raise ClientDisconnected."""
+        task = asyncio.ensure_future(work)
+        watcher = asyncio.ensure_future(self._wait_for_disconnect())
+        try:
+            done, _ = await asyncio.wait(
+                {task, watcher}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            watcher.cancel()
+            if not task.done():
+                task.cancel()
+        if task in done:
+            return task.result()
+        # Let the cancellation unwind the work before reporting it
+        with suppress(asyncio.CancelledError):
+            await task
+        client_disconnects.record(route)
+        raise ClientDisconnected()
+
+
+def get_disconnect_watcher(request: Request) -> DisconnectWatcher:
+    return DisconnectWatcher(request)
+
+
+DisconnectWatch = Annotated[DisconnectWatcher, Depends(get_disconnect_watcher)]
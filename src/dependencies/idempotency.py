@@ -0,0 +1,23 @@
+"""Recognizes retries that the idempotency store will answer by itself."""
+
+from typing import Annotated
+
+from fastapi import Depends, Header
+
+from src.dependencies.user import CurrentUser
+from src.service.idempotency import generate_idempotency
+
+
+def get_idempotent_retry(
+    current_user: CurrentUser,
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
+) -> bool:
+    """Whether the request retries a /generate attempt that is still in flight
+    or whose response is cached; it joins or replays that attempt, so it is
+    exempt from the per-user limits."""
+    return idempotency_key is not None and generate_idempotency.has(
+        f"{current_user.user_id}:{idempotency_key}"
+    )
+
+
+IdempotentRetry = Annotated[bool, Depends(get_idempotent_retry)]
@@ -1,31 +1,57 @@
-"""Per-user in-memory sliding window rate limiter."""
+"""Per-user rate limiter with per-route, per-tier policies and RateLimit headers."""
 
-from collections import defaultdict, deque
-from datetime import UTC, datetime, timedelta
+import math
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Response, status
 
+from src.dependencies.idempotency import IdempotentRetry
 from src.dependencies.user import CurrentUser
+from src.limits.backends import RateLimitResult, get_rate_limit_backend
+from src.limits.policies import get_policy
 
-_buckets: dict[str, deque[datetime]] = defaultdict(deque)
-_LIMIT = 5
-_WINDOW = timedelta(minutes=1)
-
-
-def rate_limit(current_user: CurrentUser) -> None:
-    user_id = current_user.user_id
-    now = datetime.now(UTC)
-    cutoff = now - _WINDOW
-    bucket = _buckets[user_id]
-    while bucket and bucket[0] < cutoff:
-        bucket.popleft()
-    if len(bucket) >= _LIMIT:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded",
+
+def _rate_limit_headers(policy_header: str, result: RateLimitResult) -> dict[str, str]:
+    return {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset_after)),
+        "RateLimit-Policy": policy_header,
+    }
+
+
+class RateLimiter:
+    """Dependency enforcing the rate limit policy of one route."""
+
+    def __init__(self, route: str):
+        self.route = route
+
+    def __call__(self, current_user: CurrentUser, response: Response) -> None:
+        policy = get_policy(self.route, current_user.role)
+        result = get_rate_limit_backend().check(
+            f"{self.route}:{current_user.user_id}", policy
         )
-    bucket.append(now)
+        headers = _rate_limit_headers(policy.header_value(), result)
+        if not result.allowed:
+            headers["Retry-After"] = str(math.ceil(result.retry_after))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers=headers,
+            )
+        response.headers.update(headers)
+
+
+rate_limit = RateLimiter("generate")
+
+
+def rate_limit_unless_retry(
+    retry: IdempotentRetry, current_user: CurrentUser, response: Response
+) -> None:
+    if not retry:
+        rate_limit(current_user, response)
 
 
 RateLimit = Annotated[None, Depends(rate_limit)]
+# Retries answered from the idempotency store are not counted
+RetryExemptRateLimit = Annotated[None, Depends(rate_limit_unless_retry)]
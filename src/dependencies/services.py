@@ -1,5 +1,7 @@
 """Service dependencies for FastAPI dependency injection."""
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends
@@ -8,7 +10,15 @@ from src.service.agent_service import AgentService as AgentServiceClass
 from src.service.persona_service import PersonaService as PersonaServiceClass
 from src.service.project_service import ProjectService as ProjectServiceClass
 from src.service.message_service import MessageService as MessageServiceClass
-from src.dependencies.database import get_message_service
+from src.dependencies.database import (
+    get_conversation_summary_repository,
+    get_message_service,
+)
+from src.database import SessionLocal
+from src.repository.model_repository import (
+    ConversationSummaryRepository,
+    MessageRepository,
+)
 
 
 def get_persona_service() -> PersonaServiceClass:
@@ -23,16 +33,57 @@ def get_project_service() -> ProjectServiceClass:
 
 def get_agent_service(
     message_service: Annotated[MessageServiceClass, Depends(get_message_service)],
+    summary_repository: Annotated[
+        ConversationSummaryRepository, Depends(get_conversation_summary_repository)
+    ],
 ) -> AgentServiceClass:
     """Get AgentService instance with injected dependencies."""
     return AgentServiceClass(
         message_service=message_service,
         persona_service=get_persona_service(),
         project_service=get_project_service(),
+        summary_repository=summary_repository,
     )
 
 
+class AgentSession:
+    """AgentService for a long-lived connection, e.g. a WebSocket.
+
+    Persona, project and conversation histories stay warm across turns, but
+    each turn runs on a database session of its own, so an idle connection
+    does not hold a pooled database connection.
+    """
+
+    def __init__(self) -> None:
+        self._agent_service: AgentServiceClass | None = None
+
+    @asynccontextmanager
+    async def turn(self) -> AsyncIterator[AgentServiceClass]:
+        """Yield the session's AgentService bound to a fresh database session."""
+        async with SessionLocal() as session:
+            message_service = MessageServiceClass(MessageRepository(session))
+            summary_repository = ConversationSummaryRepository(session)
+            if self._agent_service is None:
+                self._agent_service = AgentServiceClass(
+                    message_service=message_service,
+                    persona_service=get_persona_service(),
+                    project_service=get_project_service(),
+                    summary_repository=summary_repository,
+                    keep_context=True,
+                )
+            else:
+                self._agent_service.message_service = message_service
+                self._agent_service.summary_repository = summary_repository
+            yield self._agent_service
+
+
+def get_session_agent_service() -> AgentSession:
+    """Get an AgentSession that keeps its context warm across turns."""
+    return AgentSession()
+
+
 # Type aliases for dependency injection
 PersonaService = Annotated[PersonaServiceClass, Depends(get_persona_service)]
 ProjectService = Annotated[ProjectServiceClass, Depends(get_project_service)]
 AgentService = Annotated[AgentServiceClass, Depends(get_agent_service)]
+SessionAgentService = Annotated[AgentSession, Depends(get_session_agent_service)]
@@ -0,0 +1,42 @@
+"""Rejects users who have used up their LLM token quota before any LLM call."""
+
+import math
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Response, status
+
+from src.dependencies.idempotency import IdempotentRetry
+from src.dependencies.user import CurrentUser
+from src.limits import quota
+
+
+def enforce_token_quota(current_user: CurrentUser, response: Response) -> None:
+    if quota.LLM_TOKEN_QUOTA <= 0:
+        return
+    usage = quota.get_token_usage(current_user.user_id)
+    remaining = max(quota.LLM_TOKEN_QUOTA - usage.used, 0)
+    headers = {
+        "X-Token-Quota-Limit": str(quota.LLM_TOKEN_QUOTA),
+        "X-Token-Quota-Remaining": str(remaining),
+        "X-Token-Quota-Reset": str(math.ceil(usage.reset_after)),
+    }
+    if remaining == 0:
+        headers["Retry-After"] = headers["X-Token-Quota-Reset"]
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Token quota exceeded",
+            headers=headers,
+        )
+    response.headers.update(headers)
+
+
+def enforce_token_quota_unless_retry(
+    retry: IdempotentRetry, current_user: CurrentUser, response: Response
+) -> None:
+    if not retry:
+        enforce_token_quota(current_user, response)
+
+
+TokenQuota = Annotated[None, Depends(enforce_token_quota)]
+# Retries answered from the idempotency store use no tokens
+RetryExemptTokenQuota = Annotated[None, Depends(enforce_token_quota_unless_retry)]
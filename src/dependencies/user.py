@@ -2,31 +2,47 @@
 FastAPI dependencies for authentication
 """
 
-from dataclasses import dataclass
+import os
+import time
+from dataclasses import dataclass, field
 from typing import Annotated
 from fastapi import Depends, Header
 from pydantic import ValidationError
 
 from src.exceptions.authentication_error import AuthenticationError
-from src.security.neon import validate_neon_token
+from src.security.neon import on_key_rotation, validate_neon_token
+from src.security.token_cache import VerifiedTokenCache
 from src.schemas.neon_auth_model import NeonAuthTokenPayload
 
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
 
-@dataclass
+
+@dataclass(frozen=True)
 class AuthenticatedUser:
     """Represents an authenticated user in the system."""
 
     user_id: str
+    # Token role, used as the rate limit tier
+    role: str = "authenticated"
+    # Unix time the token expires; long-lived sessions must stop using it then
+    expires_at: float | None = field(default=None, compare=False)
 
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+
+# Repeat requests with the same bearer token skip signature verification
+verified_token_cache: VerifiedTokenCache[AuthenticatedUser] = VerifiedTokenCache(
+    AUTH_TOKEN_CACHE_SIZE
+)
+on_key_rotation(verified_token_cache.clear)
 
-async def get_current_user(
-    authorization: Annotated[str | None, Header()] = None,
-) -> AuthenticatedUser:
-    """FastAPI dependency to validate authorization token and retrieve authenticated user."""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise AuthenticationError("No authorization token provided")
 
-    token = authorization.split(" ")[1]
+async def authenticate_token(token: str) -> AuthenticatedUser:
+    """Validate a bearer token and return the user it was issued to."""
+    cached_user = verified_token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
 
     user_data = await validate_neon_token(token)
 
@@ -35,7 +51,23 @@ async def get_current_user(
     except ValidationError as e:
         raise AuthenticationError(f"Invalid token payload: {e.errors()[0]['msg']}")
 
-    return AuthenticatedUser(user_id=token_payload.user_id)
+    user = AuthenticatedUser(
+        user_id=token_payload.user_id,
+        role=token_payload.role,
+        expires_at=token_payload.exp,
+    )
+    verified_token_cache.put(token, user, expires_at=token_payload.exp)
+    return user
+
+
+async def get_current_user(
+    authorization: Annotated[str | None, Header()] = None,
+) -> AuthenticatedUser:
+    """FastAPI dependency to validate authorization token and retrieve authenticated user."""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise AuthenticationError("No authorization token provided")
+
+    return await authenticate_token(authorization.split(" ")[1])
 
 
 CurrentUser = Annotated[AuthenticatedUser, Depends(get_current_user)]
@@ -0,0 +1,23 @@
+"""
+Custom Exception
+thrown if a turn waited too long for the previous turn on its conversation
+"""
+
+from typing import Any, Optional
+from .base_exceptions import AppException
+
+
+class ConversationBusyException(AppException):
+    """Exception raised when another turn on the conversation is still running."""
+
+    def __init__(
+        self,
+        message: str = "Another turn on this conversation is still in progress",
+        details: Optional[dict[str, Any]] = None,
+    ):
+        super().__init__(
+            status_code=409,
+            error="CONVERSATION_BUSY",
+            message=message,
+            details=details,
+        )
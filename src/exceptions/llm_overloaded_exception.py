@@ -0,0 +1,23 @@
+"""
+Custom Exception
+thrown if an LLM call waited too long for the model backend
+"""
+
+from typing import Any, Optional
+from .base_exceptions import AppException
+
+
+class LlmOverloadedException(AppException):
+    """Exception raised when an LLM call was shed by admission control."""
+
+    def __init__(
+        self,
+        message: str = "The model backend is overloaded, please retry later",
+        details: Optional[dict[str, Any]] = None,
+    ):
+        super().__init__(
+            status_code=503,
+            error="LLM_OVERLOADED",
+            message=message,
+            details=details,
+        )
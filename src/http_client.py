@@ -0,0 +1,54 @@
+import os
+from typing import Annotated
+
+from fastapi import Depends
+from httpx import AsyncClient, Limits, Timeout
+
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30")
+)
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", "5")
+)
+# HTTP/2 needs the optional 'h2' package (httpx[http2])
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "false").lower() == "true"
+
+_client: AsyncClient | None = None
+
+
+def create_http_client() -> AsyncClient:
+    """Create a pooled AsyncClient from the HTTP_* settings."""
+    return AsyncClient(
+        limits=Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        http2=HTTP2_ENABLED,
+    )
+
+
+def get_http_client() -> AsyncClient:
+    """Get or create the app-wide pooled HTTP client."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the app-wide HTTP client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+HttpClient = Annotated[AsyncClient, Depends(get_http_client)]
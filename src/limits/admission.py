@@ -0,0 +1,127 @@
+"""
+Admission control in front of the model backend.
+
+A global cap on LLM calls in flight in this process. Calls over the cap queue
+by priority, so user-facing turns go before background summarization, and
+first come first served within a priority. A call still queued at the
+deadline is shed rather than piling more load onto an overloaded backend.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any
+
+# LLM calls in flight at once in this process; 0 disables admission control
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+# How long a call waits in the queue before it is shed; 0 sheds immediately
+LLM_QUEUE_WAIT_SECONDS = float(os.environ.get("LLM_QUEUE_WAIT_SECONDS", "10"))
+
+
+class LlmPriority(IntEnum):
+    """Queue priority of an LLM call; lower values are admitted first."""
+
+    interactive = 0
+    background = 1
+
+
+class LlmQueueTimeout(Exception):
+    """Raised when a call was not admitted before the queue deadline."""
+
+
+class AdmissionController:
+    """Admits at most limit concurrent calls, queueing the rest by priority."""
+
+    def __init__(self, limit: int, wait_timeout: float):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        # (priority, arrival, waiter); abandoned waiters are skipped lazily
+        self._queue: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._arrivals = itertools.count()
+        self.in_flight = 0
+        self.queued: Counter[str] = Counter()
+        self.admitted: Counter[str] = Counter()
+        self.shed: Counter[str] = Counter()
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _release(self) -> None:
+        # Hand the slot straight to the best waiter, so nobody can jump the queue
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _acquire(self, priority: LlmPriority) -> None:
+        # Slots are handed over on release, so a free one means nobody waits
+        if self.in_flight < self.limit:
+            self.in_flight += 1
+            return
+        if self.wait_timeout <= 0:
+            raise LlmQueueTimeout
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._arrivals), waiter))
+        self.queued[priority.name] += 1
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.wait_timeout):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we gave up; pass it on
+                self._release()
+            else:
+                waiter.cancel()
+            if isinstance(e, TimeoutError):
+                raise LlmQueueTimeout from None
+            raise
+        finally:
+            self.queued[priority.name] -= 1
+            waited = time.monotonic() - started
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    @asynccontextmanager
+    async def admit(self, priority: LlmPriority) -> AsyncIterator[None]:
+        """Hold an LLM slot for the duration of the block.
+
+        Raises LlmQueueTimeout if no slot was free before the deadline.
+        """
+        if self.limit <= 0:
+            self.admitted[priority.name] += 1
+            yield
+            return
+        try:
+            await self._acquire(priority)
+        except LlmQueueTimeout:
+            self.shed[priority.name] += 1
+            raise
+        self.admitted[priority.name] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict[str, Any]:
+        """Return slot usage, queue lengths and wait times."""
+        priorities = [priority.name for priority in LlmPriority]
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": {name: self.queued[name] for name in priorities},
+            "admitted": {name: self.admitted[name] for name in priorities},
+            "shed": {name: self.shed[name] for name in priorities},
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+
+llm_admission = AdmissionController(LLM_MAX_CONCURRENCY, LLM_QUEUE_WAIT_SECONDS)
@@ -0,0 +1,487 @@
+"""
+Storage backends for the request rate limiter and usage quotas.
+
+The in-memory backend is local to one process. The SQLite backend keeps its
+state in a WAL-mode database file, so every uvicorn worker on the host shares
+the same limits and they survive restarts.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from src.limits.policies import RateLimitPolicy
+
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.environ.get("RATE_LIMIT_SQLITE_PATH") or os.path.join(
+    tempfile.gettempdir(), "ai-server-rate-limit.sqlite3"
+)
+# Hard cap on in-memory buckets; the least recently active are dropped first
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of a rate limit check."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until at least one more request becomes available
+    reset_after: float
+    # Seconds until the next request would be allowed; 0 when allowed
+    retry_after: float = 0.0
+
+
+@dataclass(frozen=True)
+class QuotaUsage:
+    """Amount consumed in the current quota window."""
+
+    used: int
+    # Seconds until the window ends and usage starts over
+    reset_after: float
+
+
+def _gcra(
+    tat: float | None, now: float, limit: int, period: float, burst: int
+) -> tuple[RateLimitResult, float | None]:
+    """Apply GCRA to a stored theoretical arrival time.
+
+    Returns the result and the new arrival time to store, or None if the
+    request was rejected and the stored value should stay as it is.
+    """
+    interval = period / limit
+    tolerance = interval * burst
+    tat = now if tat is None else max(tat, now)
+    new_tat = tat + interval
+    allow_at = new_tat - tolerance
+    if now < allow_at:
+        return RateLimitResult(False, burst, 0, tat - now, allow_at - now), None
+    remaining = int((now - allow_at) / interval)
+    return RateLimitResult(True, burst, remaining, new_tat - now), new_tat
+
+
+class RateLimitBackend(ABC):
+    """Interface for rate limit state stores."""
+
+    name: str
+
+    def check(self, key: str, policy: RateLimitPolicy) -> RateLimitResult:
+        """Record a request for key under policy, if the policy allows it."""
+        if policy.algorithm == "gcra":
+            return self.gcra(key, policy.limit, policy.period, policy.capacity)
+        return self.hit(key, policy.limit, policy.period)
+
+    @abstractmethod
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        """Record a request for key if fewer than limit happened in the last window seconds."""
+
+    @abstractmethod
+    def gcra(self, key: str, limit: int, period: float, burst: int) -> RateLimitResult:
+        """Record a request for key if GCRA allows limit per period with burst."""
+
+    @abstractmethod
+    def get_usage(self, key: str, window: float) -> QuotaUsage:
+        """Return what key has consumed in its current fixed window."""
+
+    @abstractmethod
+    def add_usage(self, key: str, amount: int, window: float) -> QuotaUsage:
+        """Add amount to key's current window, starting a new one if it ended."""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget all recorded requests."""
+
+    @abstractmethod
+    def stats(self) -> dict[str, Any]:
+        """Report the size of the stored state."""
+
+
+class _Bucket:
+    """Fixed-size ring buffer of monotonic request timestamps for one key."""
+
+    __slots__ = ("timestamps", "head", "count", "idle_after")
+
+    def __init__(self, limit: int):
+        self.timestamps = array("d", bytes(8 * limit))
+        self.head = 0
+        self.count = 0
+        self.idle_after = 0.0
+
+    def size_bytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.timestamps)
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Sliding window log held in this process's memory.
+
+    Each key owns a ring buffer of at most limit timestamps, so memory per key
+    is fixed. Buckets are kept in least-recently-hit order and dropped once
+    their window has passed without a request, so idle users cost nothing.
+    GCRA keys hold a single float and are dropped once fully replenished.
+    """
+
+    name = "memory"
+
+    # Upper bound of idle buckets dropped per check, keeping each check O(1)
+    SWEEP_BATCH = 16
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS) -> None:
+        self.max_buckets = max_buckets
+        self.buckets: OrderedDict[str, _Bucket] = OrderedDict()
+        self.arrival_times: OrderedDict[str, float] = OrderedDict()
+        # key -> (window end, used), in window start order
+        self.usage: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self.evictions = 0
+        self._bucket_bytes = 0
+        # Sync dependencies run in a threadpool, so checks can race
+        self._lock = threading.Lock()
+
+    def _drop_oldest(self) -> None:
+        _, bucket = self.buckets.popitem(last=False)
+        self._bucket_bytes -= bucket.size_bytes()
+        self.evictions += 1
+
+    def _sweep(self, now: float) -> None:
+        for _ in range(self.SWEEP_BATCH):
+            if not self.buckets:
+                break
+            oldest = next(iter(self.buckets.values()))
+            if oldest.idle_after > now:
+                break
+            self._drop_oldest()
+        for _ in range(self.SWEEP_BATCH):
+            if not self.arrival_times:
+                break
+            if next(iter(self.arrival_times.values())) > now:
+                break
+            self.arrival_times.popitem(last=False)
+            self.evictions += 1
+        for _ in range(self.SWEEP_BATCH):
+            if not self.usage:
+                break
+            if next(iter(self.usage.values()))[0] > now:
+                break
+            self.usage.popitem(last=False)
+            self.evictions += 1
+
+    def _bucket(self, key: str, limit: int) -> _Bucket:
+        bucket = self.buckets.get(key)
+        if bucket is not None and len(bucket.timestamps) != limit:
+            # The limit for this key changed; start a fresh log at the new size
+            self._bucket_bytes -= bucket.size_bytes()
+            del self.buckets[key]
+            bucket = None
+        if bucket is None:
+            while self.buckets and len(self.buckets) >= self.max_buckets:
+                self._drop_oldest()
+            bucket = _Bucket(limit)
+            self.buckets[key] = bucket
+            self._bucket_bytes += bucket.size_bytes()
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        now = time.monotonic()
+        cutoff = now - window
+        with self._lock:
+            self._sweep(now)
+            bucket = self._bucket(key, limit)
+            timestamps = bucket.timestamps
+            while bucket.count and timestamps[bucket.head] < cutoff:
+                bucket.head = (bucket.head + 1) % limit
+                bucket.count -= 1
+            if bucket.count >= limit:
+                retry_after = timestamps[bucket.head] - cutoff
+                return RateLimitResult(False, limit, 0, retry_after, retry_after)
+            timestamps[(bucket.head + bucket.count) % limit] = now
+            bucket.count += 1
+            bucket.idle_after = now + window
+            reset_after = timestamps[bucket.head] - cutoff
+            return RateLimitResult(True, limit, limit - bucket.count, reset_after)
+
+    def gcra(self, key: str, limit: int, period: float, burst: int) -> RateLimitResult:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            result, new_tat = _gcra(
+                self.arrival_times.get(key), now, limit, period, burst
+            )
+            if new_tat is not None:
+                if (
+                    key not in self.arrival_times
+                    and len(self.arrival_times) >= self.max_buckets
+                ):
+                    self.arrival_times.popitem(last=False)
+                    self.evictions += 1
+                # Most recently hit keys have the latest arrival times, so the sweep
+                # can stop at the first one still in the future
+                self.arrival_times[key] = new_tat
+                self.arrival_times.move_to_end(key)
+            return result
+
+    def _current_usage(self, key: str, now: float) -> tuple[float, int] | None:
+        entry = self.usage.get(key)
+        if entry is not None and entry[0] <= now:
+            del self.usage[key]
+            return None
+        return entry
+
+    def get_usage(self, key: str, window: float) -> QuotaUsage:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._current_usage(key, now)
+            if entry is None:
+                return QuotaUsage(0, window)
+            return QuotaUsage(entry[1], entry[0] - now)
+
+    def add_usage(self, key: str, amount: int, window: float) -> QuotaUsage:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            entry = self._current_usage(key, now)
+            if entry is None:
+                if len(self.usage) >= self.max_buckets:
+                    self.usage.popitem(last=False)
+                    self.evictions += 1
+                entry = (now + window, 0)
+            window_end, used = entry
+            self.usage[key] = (window_end, used + amount)
+            return QuotaUsage(used + amount, window_end - now)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.buckets.clear()
+            self.arrival_times.clear()
+            self.usage.clear()
+            self._bucket_bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "bucket_count": len(self.buckets) + len(self.arrival_times),
+                "quota_count": len(self.usage),
+                "memory_bytes": self._bucket_bytes
+                + sys.getsizeof(self.buckets)
+                + sys.getsizeof(self.arrival_times)
+                + len(self.arrival_times) * sys.getsizeof(0.0)
+                + sys.getsizeof(self.usage)
+                + len(self.usage) * sys.getsizeof((0.0, 0)),
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Sliding window log in a SQLite WAL file shared by all local processes."""
+
+    name = "sqlite"
+
+    # Rows of keys that stopped sending requests are purged every this many hits
+    PURGE_EVERY = 1000
+    # Lifetime given to log rows written before rows carried their expiry
+    LEGACY_ROW_TTL = 86400.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # expires (ts + the window it was counted in) lets any process
+            # purge rows without knowing the windows other processes use
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_hit "
+                "(key TEXT NOT NULL, ts REAL NOT NULL, expires REAL NOT NULL)"
+            )
+            columns = {
+                row[1]
+                for row in connection.execute("PRAGMA table_info(rate_limit_hit)")
+            }
+            if "expires" not in columns:
+                # Files from before expires; keep old rows for the longest
+                # window a policy is likely to use
+                connection.execute(
+                    "ALTER TABLE rate_limit_hit "
+                    "ADD COLUMN expires REAL NOT NULL DEFAULT 0"
+                )
+                connection.execute(
+                    "UPDATE rate_limit_hit SET expires = ts + ?",
+                    (self.LEGACY_ROW_TTL,),
+                )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_hit_key_ts "
+                "ON rate_limit_hit (key, ts)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_hit_expires "
+                "ON rate_limit_hit (expires)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_gcra "
+                "(key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_quota "
+                "(key TEXT PRIMARY KEY, window_end REAL NOT NULL, used INTEGER NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        now = time.time()
+        cutoff = now - window
+        connection = self._connection()
+        # IMMEDIATE takes the write lock up front so concurrent workers serialize
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM rate_limit_hit WHERE key = ? AND ts < ?", (key, cutoff)
+            )
+            count, oldest = connection.execute(
+                "SELECT COUNT(*), MIN(ts) FROM rate_limit_hit WHERE key = ?", (key,)
+            ).fetchone()
+            if count >= limit:
+                retry_after = oldest - cutoff
+                result = RateLimitResult(False, limit, 0, retry_after, retry_after)
+            else:
+                connection.execute(
+                    "INSERT INTO rate_limit_hit (key, ts, expires) VALUES (?, ?, ?)",
+                    (key, now, now + window),
+                )
+                reset_after = (now if oldest is None else oldest) - cutoff
+                result = RateLimitResult(True, limit, limit - count - 1, reset_after)
+            self._after_write(connection, now)
+            connection.execute("COMMIT")
+            return result
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def gcra(self, key: str, limit: int, period: float, burst: int) -> RateLimitResult:
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tat FROM rate_limit_gcra WHERE key = ?", (key,)
+            ).fetchone()
+            result, new_tat = _gcra(
+                None if row is None else row[0], now, limit, period, burst
+            )
+            if new_tat is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_limit_gcra (key, tat) VALUES (?, ?)",
+                    (key, new_tat),
+                )
+            self._after_write(connection, now)
+            connection.execute("COMMIT")
+            return result
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_usage(self, key: str, window: float) -> QuotaUsage:
+        now = time.time()
+        row = (
+            self._connection()
+            .execute(
+                "SELECT window_end, used FROM rate_limit_quota "
+                "WHERE key = ? AND window_end > ?",
+                (key, now),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return QuotaUsage(0, window)
+        return QuotaUsage(row[1], row[0] - now)
+
+    def add_usage(self, key: str, amount: int, window: float) -> QuotaUsage:
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window_end, used FROM rate_limit_quota "
+                "WHERE key = ? AND window_end > ?",
+                (key, now),
+            ).fetchone()
+            window_end, used = (now + window, 0) if row is None else row
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limit_quota (key, window_end, used) "
+                "VALUES (?, ?, ?)",
+                (key, window_end, used + amount),
+            )
+            self._after_write(connection, now)
+            connection.execute("COMMIT")
+            return QuotaUsage(used + amount, window_end - now)
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _after_write(self, connection: sqlite3.Connection, now: float) -> None:
+        self._hits += 1
+        if self._hits % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM rate_limit_hit WHERE expires < ?", (now,))
+            connection.execute("DELETE FROM rate_limit_gcra WHERE tat < ?", (now,))
+            connection.execute(
+                "DELETE FROM rate_limit_quota WHERE window_end <= ?", (now,)
+            )
+
+    def reset(self) -> None:
+        connection = self._connection()
+        connection.execute("DELETE FROM rate_limit_hit")
+        connection.execute("DELETE FROM rate_limit_gcra")
+        connection.execute("DELETE FROM rate_limit_quota")
+
+    def stats(self) -> dict[str, Any]:
+        bucket_count, quota_count = (
+            self._connection()
+            .execute(
+                "SELECT (SELECT COUNT(DISTINCT key) FROM rate_limit_hit)"
+                " + (SELECT COUNT(*) FROM rate_limit_gcra),"
+                " (SELECT COUNT(*) FROM rate_limit_quota)"
+            )
+            .fetchone()
+        )
+        return {
+            "backend": self.name,
+            "bucket_count": bucket_count,
+            "quota_count": quota_count,
+            "file_bytes": os.path.getsize(self.path),
+        }
+
+
+def create_rate_limit_backend(name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    """Create the rate limit backend selected by name."""
+    if name == InMemoryRateLimitBackend.name:
+        return InMemoryRateLimitBackend()
+    if name == SQLiteRateLimitBackend.name:
+        return SQLiteRateLimitBackend(RATE_LIMIT_SQLITE_PATH)
+    raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND: {name!r}")
+
+
+# Singleton instance
+_backend: RateLimitBackend | None = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """Get or create the configured rate limit backend singleton."""
+    global _backend
+    if _backend is None:
+        _backend = create_rate_limit_backend()
+    return _backend
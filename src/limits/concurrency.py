@@ -0,0 +1,125 @@
+"""
+Per-key cap on concurrent in-flight work, e.g. generations per user, or
+one turn at a time per conversation.
+
+Requests over the cap wait for a free slot up to a deadline and are rejected
+after it. Slots live in an async context manager, so they are released on
+success, on exceptions and on cancellation alike.
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+GENERATE_MAX_CONCURRENT_PER_USER = int(
+    os.environ.get("GENERATE_MAX_CONCURRENT_PER_USER", "2")
+)
+# How long a request over the cap waits for a slot; 0 rejects immediately
+GENERATE_CONCURRENCY_WAIT_SECONDS = float(
+    os.environ.get("GENERATE_CONCURRENCY_WAIT_SECONDS", "2")
+)
+# How long a turn waits for the previous turn on its conversation to finish
+CONVERSATION_TURN_WAIT_SECONDS = float(
+    os.environ.get("CONVERSATION_TURN_WAIT_SECONDS", "30")
+)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when no slot became free before the wait deadline."""
+
+
+class _KeySlots:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        # Requests holding or waiting for a slot; the entry is dropped at 0
+        self.users = 0
+
+
+class ConcurrencyLimiter:
+    """Allows at most limit concurrent holders per key."""
+
+    def __init__(self, limit: int, wait_timeout: float):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self._slots: dict[str, _KeySlots] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Acquisitions, and how many of them had to wait and for how long
+        self.acquired = 0
+        self.contended = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def _acquire(self, semaphore: asyncio.Semaphore) -> None:
+        if not semaphore.locked():
+            await semaphore.acquire()
+            self.acquired += 1
+            return
+        if self.wait_timeout <= 0:
+            raise ConcurrencyLimitExceeded
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.wait_timeout):
+                await semaphore.acquire()
+        except TimeoutError:
+            raise ConcurrencyLimitExceeded from None
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - started
+            self.contended += 1
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.acquired += 1
+
+    @asynccontextmanager
+    async def acquire(self, key: str) -> AsyncIterator[None]:
+        """Hold one of key's slots for the duration of the block."""
+        slots = self._slots.get(key)
+        if slots is None:
+            slots = self._slots[key] = _KeySlots(self.limit)
+        slots.users += 1
+        try:
+            try:
+                await self._acquire(slots.semaphore)
+            except ConcurrencyLimitExceeded:
+                self.rejected += 1
+                raise
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                slots.semaphore.release()
+        finally:
+            slots.users -= 1
+            if slots.users == 0:
+                del self._slots[key]
+
+    def stats(self) -> dict[str, Any]:
+        """Return slot usage counters."""
+        return {
+            "limit": self.limit,
+            "active_keys": len(self._slots),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+
+generation_limiter = ConcurrencyLimiter(
+    GENERATE_MAX_CONCURRENT_PER_USER, GENERATE_CONCURRENCY_WAIT_SECONDS
+)
+
+# Turns on one conversation run one at a time, in this process
+conversation_locks = ConcurrencyLimiter(1, CONVERSATION_TURN_WAIT_SECONDS)
@@ -0,0 +1,88 @@
+"""
+Rate limit policies per route and user tier.
+
+Policies come from the RATE_LIMIT_POLICIES environment variable, a JSON object
+mapping route name to user tier (the token's role) to policy, e.g.
+
+    {"generate": {"default": {"limit": 5, "period": 60},
+                  "service": {"limit": 600, "period": 60, "algorithm": "gcra",
+                              "burst": 50}}}
+
+A "default" route and a "default" tier act as fallbacks.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Literal
+
+DEFAULT_TIER = "default"
+DEFAULT_ROUTE = "default"
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """How many requests a user may make, and with which algorithm."""
+
+    limit: int
+    period: float
+    # sliding_window: exact log of recent requests, O(limit) state per key
+    # gcra: generic cell rate algorithm, one timestamp per key with a burst
+    algorithm: Literal["sliding_window", "gcra"] = "sliding_window"
+    # gcra only: requests allowed back to back; defaults to limit
+    burst: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.limit < 1 or self.period <= 0:
+            raise ValueError("Rate limit policy needs limit >= 1 and period > 0")
+        if self.algorithm not in ("sliding_window", "gcra"):
+            raise ValueError(f"Unknown rate limit algorithm: {self.algorithm!r}")
+        if self.burst is not None and self.burst < 1:
+            raise ValueError("Rate limit policy burst must be >= 1")
+
+    @property
+    def capacity(self) -> int:
+        """Largest number of requests that can be made at once."""
+        if self.algorithm == "gcra" and self.burst is not None:
+            return self.burst
+        return self.limit
+
+    def header_value(self) -> str:
+        """Describe the policy for the RateLimit-Policy header."""
+        if self.algorithm == "gcra":
+            return f"{self.limit};w={self.period:g};burst={self.capacity}"
+        return f"{self.limit};w={self.period:g}"
+
+
+DEFAULT_POLICIES: dict[str, dict[str, RateLimitPolicy]] = {
+    DEFAULT_ROUTE: {DEFAULT_TIER: RateLimitPolicy(limit=5, period=60.0)},
+}
+
+
+def parse_policies(raw: str) -> dict[str, dict[str, RateLimitPolicy]]:
+    """Parse RATE_LIMIT_POLICIES JSON, keeping the built-in defaults as fallback."""
+    policies = {route: dict(tiers) for route, tiers in DEFAULT_POLICIES.items()}
+    if not raw:
+        return policies
+    try:
+        for route, tiers in json.loads(raw).items():
+            for tier, config in tiers.items():
+                policies.setdefault(route, {})[tier] = RateLimitPolicy(**config)
+    except (AttributeError, TypeError, ValueError) as e:
+        raise RuntimeError(f"Invalid RATE_LIMIT_POLICIES: {e}") from e
+    return policies
+
+
+_policies = parse_policies(os.environ.get("RATE_LIMIT_POLICIES", ""))
+
+
+def get_policy(route: str, tier: str) -> RateLimitPolicy:
+    """Resolve the policy for route and tier, falling back to the defaults."""
+    for route_name in (route, DEFAULT_ROUTE):
+        tiers = _policies.get(route_name)
+        if tiers is None:
+            continue
+        policy = tiers.get(tier) or tiers.get(DEFAULT_TIER)
+        if policy is not None:
+            return policy
+    return DEFAULT_POLICIES[DEFAULT_ROUTE][DEFAULT_TIER]
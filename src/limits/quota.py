@@ -0,0 +1,55 @@
+"""
+Per-user LLM token quota.
+
+Every agent run charges its prompt and completion tokens to the user who
+triggered it. Usage is counted in fixed windows in the rate limit backend, so
+the quota is shared by the same processes that share the request limits.
+"""
+
+import os
+
+import anyio
+from pydantic_ai.usage import RunUsage
+
+from src.limits.backends import QuotaUsage, get_rate_limit_backend
+
+# Tokens each user may consume per window; 0 disables the quota
+LLM_TOKEN_QUOTA = int(os.environ.get("LLM_TOKEN_QUOTA", "0"))
+LLM_TOKEN_QUOTA_WINDOW_SECONDS = float(
+    os.environ.get("LLM_TOKEN_QUOTA_WINDOW_SECONDS", "86400")
+)
+
+
+def _quota_key(user_id: str) -> str:
+    return f"llm_tokens:{user_id}"
+
+
+def get_token_usage(user_id: str) -> QuotaUsage:
+    """Return the tokens user_id has used in the current window."""
+    return get_rate_limit_backend().get_usage(
+        _quota_key(user_id), LLM_TOKEN_QUOTA_WINDOW_SECONDS
+    )
+
+
+def charge_token_usage(user_id: str, usage: RunUsage) -> QuotaUsage | None:
+    """Charge the tokens of an agent run to user_id."""
+    tokens = usage.input_tokens + usage.output_tokens
+    if LLM_TOKEN_QUOTA <= 0 or tokens <= 0:
+        return None
+    return get_rate_limit_backend().add_usage(
+        _quota_key(user_id), tokens, LLM_TOKEN_QUOTA_WINDOW_SECONDS
+    )
+
+
+async def acharge_token_usage(user_id: str, usage: RunUsage) -> QuotaUsage | None:
+    """charge_token_usage for async code: the backend call runs in a worker
+    thread, since the shared backends block on their own locks.
+
+    Shielded, so the tokens are still charged when the caller is being
+    cancelled (e.g. a stream whose client went away).
+    """
+    if LLM_TOKEN_QUOTA <= 0:
+        return None
+    with anyio.CancelScope(shield=True):
+        charged = await anyio.to_thread.run_sync(charge_token_usage, user_id, usage)
+    return charged
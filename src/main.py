@@ -1,12 +1,28 @@
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from src.agents.model_registry import model_registry
 from src.database import engine
+from src.http_client import close_http_client, get_http_client
 from src.controllers.ai_controller import router as ai_router
+from src.dependencies.disconnect import client_disconnects
+from src.dependencies.user import verified_token_cache
+from src.limits.admission import llm_admission
+from src.limits.backends import get_rate_limit_backend
+from src.limits.concurrency import conversation_locks, generation_limiter
 from src.middlewares.correlation_id import CorrelationIDMiddleware
 from src.middlewares.error_handler import global_exception_handler
 from src.middlewares.events import EventMiddleware
+from src.service.compaction_worker import compaction_worker
+from src.service.generation_jobs import generation_job_worker, generation_jobs
+from src.service.idempotency import generate_idempotency
+from src.security.neon import (
+    jwks_health,
+    prefetch_jwks,
+    start_jwks_refresh,
+    stop_jwks_refresh,
+)
 
 # Reduce uvicorn and starlette errors logging levels to avoid cluttering logs
 logging.getLogger("uvicorn.error").setLevel(logging.CRITICAL)
@@ -15,9 +31,23 @@ logging.getLogger("starlette.middleware.errors").setLevel(logging.CRITICAL)
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
+    # Open the shared outbound connection pool before serving requests
+    get_http_client()
+    # Load signing keys up front so the first request does not pay for them
+    await prefetch_jwks()
+    start_jwks_refresh()
+    # Build the LLM providers and agents before the first request needs them
+    model_registry.warm_up()
+    compaction_worker.start()
+    generation_job_worker.start()
     try:
         yield
     finally:
+        await generation_job_worker.stop()
+        await compaction_worker.stop()
+        await model_registry.aclose()
+        await stop_jwks_refresh()
+        await close_http_client()
         await engine.dispose()
 
 
@@ -40,5 +70,28 @@ async def health():
 
 
 @app.get("/ready")
-async def ready():
-    return {"status": "ok"}
+async def ready(response: Response):
+    jwks = jwks_health()
+    if not jwks["healthy"]:
+        response.status_code = 503
+        return {"status": "unavailable", "jwks": jwks}
+    return {"status": "ok", "jwks": jwks}
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "auth_token_cache": verified_token_cache.stats(),
+        "rate_limiter": get_rate_limit_backend().stats(),
+        "generation_concurrency": generation_limiter.stats(),
+        "conversation_locks": conversation_locks.stats(),
+        "client_disconnects": client_disconnects.stats(),
+        "idempotency": generate_idempotency.stats(),
+        "compaction": compaction_worker.stats(),
+        "generation_jobs": {
+            **generation_jobs.stats(),
+            "worker": generation_job_worker.stats(),
+        },
+        "llm_models": model_registry.stats(),
+        "llm_admission": llm_admission.stats(),
+    }
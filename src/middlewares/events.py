@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 import json
 import time
+from collections.abc import AsyncIterator
 from typing import Any, Dict
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -18,6 +19,8 @@ class WideEvent:
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
         self.start_time = time.time()
+        # Set by streaming endpoints so the event also covers the response body
+        self.emit_after_body = False
 
     def add_context(self, **kwargs):
         """
@@ -56,15 +59,39 @@ class EventMiddleware(BaseHTTPMiddleware):
         outcome = "error"
         error = None
 
+        deferred = False
+
         try:
             response = await call_next(request)
             status_code = response.status_code
             outcome = "success" if status_code < 400 else "client_error"
+            body_iterator = getattr(response, "body_iterator", None)
+            if wide_event.emit_after_body and body_iterator is not None:
+                setattr(
+                    response,
+                    "body_iterator",
+                    self._emit_after(body_iterator, wide_event, status_code, outcome),
+                )
+                deferred = True
             return response
         except Exception as e:
             error = e
             outcome = "error"
             raise
         finally:
-            if error is None:
+            if error is None and not deferred:
                 wide_event.emit(status_code, outcome, error)
+
+    @staticmethod
+    async def _emit_after(
+        body_iterator: AsyncIterator[Any],
+        wide_event: WideEvent,
+        status_code: int,
+        outcome: str,
+    ) -> AsyncIterator[Any]:
+        """Pass the body through, then emit once it is sent or abandoned."""
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            wide_event.emit(status_code, outcome)
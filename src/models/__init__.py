@@ -2,12 +2,14 @@
 
 from .base import Base
 from .conversation import Conversation
+from .conversation_summary import ConversationSummary
 from .message import Message, MessageType
 from .user import User
 
 __all__ = [
     "Base",
     "Conversation",
+    "ConversationSummary",
     "Message",
     "MessageType",
     "User",
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+import uuid
+
+from sqlalchemy import UUID, Column, DateTime, ForeignKey, Index, Integer, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class ConversationSummary(Base):
+    """Summary of a stretch of a conversation, ending with one message."""
+
+    __tablename__ = "conversation_summary"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    conversation_id = Column(
+        UUID,
+        ForeignKey("conversation.id"),
+        nullable=False,
+    )
+    user_id = Column(
+        UUID,
+        ForeignKey("neon_auth.user.id"),
+        nullable=False,
+    )
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    # Newest message folded into this summary
+    last_message_id: Mapped[uuid.UUID] = mapped_column(UUID, nullable=False)
+    last_message_created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    # 0 for summaries of messages, n + 1 for summaries of level n summaries
+    level: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    __table_args__ = (
+        Index(
+            "ix_conversation_summary_conversation_last_message",
+            "conversation_id",
+            "last_message_created_at",
+        ),
+    )
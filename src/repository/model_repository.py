@@ -1,5 +1,10 @@
-from sqlalchemy import select
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
+
+from sqlalchemy import delete, select
 from src.repository.base import BaseCRUDRepository
+from src.models.conversation_summary import ConversationSummary
 from src.models.message import Message
 from src.schemas.message_model import MessageType
 
@@ -36,6 +41,67 @@ class MessageRepository(BaseCRUDRepository[Message]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def get_latest_message_id(
+        self, conversation_id: str, user_id: str
+    ) -> uuid.UUID | None:
+        """Return the id of the conversation's newest message, if any."""
+        stmt = (
+            select(Message.id)
+            .where(Message.conversation_id == conversation_id)
+            .where(Message.user_id == user_id)
+            .order_by(Message.created_at.desc())
+            .limit(1)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
     async def delete_message(self, message: Message) -> None:
         """Delete a message record."""
         await self.delete(message)
+
+
+class ConversationSummaryRepository(BaseCRUDRepository[ConversationSummary]):
+    """Repository for persisted rolling conversation summaries."""
+
+    model = ConversationSummary
+
+    async def get_summaries(
+        self, conversation_id: str, user_id: str
+    ) -> list[ConversationSummary]:
+        """Fetch all summaries of a conversation, oldest stretch first."""
+        stmt = (
+            select(ConversationSummary)
+            .where(ConversationSummary.conversation_id == conversation_id)
+            .where(ConversationSummary.user_id == user_id)
+            .order_by(ConversationSummary.last_message_created_at)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def save_summary(
+        self,
+        conversation_id: str,
+        user_id: str,
+        content: str,
+        last_message_id: str,
+        last_message_created_at: datetime,
+        level: int = 0,
+        replaced: Sequence[ConversationSummary] = (),
+    ) -> ConversationSummary:
+        """Store a new summary, deleting the summaries it replaces."""
+        replaced_ids = [summary.id for summary in replaced]
+        if replaced_ids:
+            await self.session.execute(
+                delete(ConversationSummary).where(
+                    ConversationSummary.id.in_(replaced_ids)
+                )
+            )
+        summary = ConversationSummary(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            content=content,
+            last_message_id=last_message_id,
+            last_message_created_at=last_message_created_at,
+            level=level,
+        )
+        return await self.create(summary)
@@ -19,3 +19,11 @@ class GenerateResponse(BaseModel):
     conversation_id: str
     content: str
     type: MessageType
+
+
+class GenerateJobResponse(BaseModel):
+    job_id: str
+    conversation_id: str
+    status: str
+    content: str | None = None
+    error: str | None = None
@@ -9,9 +9,11 @@ contains:
 - conversationID
 - content
 - role (user or ai)
+- created_at
 """
 
 import uuid
+from datetime import datetime
 from pydantic import BaseModel, ConfigDict, Field
 from enum import Enum
 
@@ -37,3 +39,4 @@ class Message(BaseModel):
     # alias between role and type
     # to match both DB model and agent framework expectations
     role: MessageType = Field(alias="type")
+    created_at: datetime | None = None
@@ -1,65 +1,433 @@
+import asyncio
 import base64
+import contextlib
+import json
+import logging
 import os
+import re
+import time
+from typing import Any, Callable, Protocol
 from urllib.parse import urlparse
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
-from httpx import AsyncClient
 
 import jwt
 from jwt import PyJWTError
 
 from src.exceptions.authentication_error import AuthenticationError
+from src.http_client import get_http_client
 
 NEON_AUTH_BASE_URL = os.environ.get("AUTH_URL", "")
 NEON_JWKS_URL = f"{NEON_AUTH_BASE_URL}/.well-known/jwks.json"
 parsed = urlparse(NEON_AUTH_BASE_URL)
 ORIGIN = f"{parsed.scheme}://{parsed.netloc}"
 
+# Used when the JWKS response carries no usable Cache-Control max-age
+JWKS_CACHE_TTL_SECONDS = float(os.environ.get("JWKS_CACHE_TTL_SECONDS", "300"))
+# Lower bound between refreshes triggered by an unknown 'kid', and on the
+# cache lifetime (e.g. for a key set served with no-cache)
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(
+    os.environ.get("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30")
+)
 
-async def get_jwks():
-    """Fetch JWKS from Neon Auth service."""
-    async with AsyncClient() as client:
-        response = await client.get(NEON_JWKS_URL)
+# How long before expiry the background task refreshes the key set
+JWKS_REFRESH_LEAD_SECONDS = float(os.environ.get("JWKS_REFRESH_LEAD_SECONDS", "30"))
+# Upper bound of the retry backoff after failed background refreshes
+JWKS_REFRESH_MAX_BACKOFF_SECONDS = float(
+    os.environ.get("JWKS_REFRESH_MAX_BACKOFF_SECONDS", "60")
+)
+
+# Local key sources for deployments that cannot reach the auth service
+AUTH_JWKS_FILE = os.environ.get("AUTH_JWKS_FILE", "")
+AUTH_JWKS_JSON = os.environ.get("AUTH_JWKS_JSON", "")
+AUTH_JWKS_FILE_POLL_SECONDS = float(os.environ.get("AUTH_JWKS_FILE_POLL_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def parse_cache_control_ttl(cache_control: str | None) -> float | None:
+    """Return the TTL in seconds from a Cache-Control header, if it has one."""
+    if not cache_control:
+        return None
+    directives = cache_control.lower()
+    if "no-store" in directives or "no-cache" in directives:
+        return 0.0
+    match = _MAX_AGE_PATTERN.search(directives)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class JWKSSource(Protocol):
+    """Where the JWKS document comes from."""
+
+    name: str
+
+    async def fetch(self) -> tuple[dict[str, Any], float | None]:
+        """Return the JWKS document and its TTL in seconds, if the source has one."""
+        ...
+
+
+class RemoteJWKSSource:
+    """Fetches the JWKS over HTTP from the Neon Auth service."""
+
+    name = "remote"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def fetch(self) -> tuple[dict[str, Any], float | None]:
+        """Return the JWKS along with its Cache-Control TTL."""
+        response = await get_http_client().get(self.url)
         response.raise_for_status()
-        return response.json()
+        return response.json(), parse_cache_control_ttl(
+            response.headers.get("cache-control")
+        )
 
 
-def get_signing_key(token, jwks):
+class FileJWKSSource:
+    """Reads the JWKS from a local file, reloading it when the file changes.
+
+    The poll interval is returned as the TTL, so the cache re-checks the file's
+    modification time that often. A file caught mid-write keeps the previous
+    key set in service until the next poll.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str, poll_interval: float):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._mtime_ns: int | None = None
+        self._document: dict[str, Any] | None = None
+
+    async def fetch(self) -> tuple[dict[str, Any], float | None]:
+        """Return the JWKS from the file, re-reading it only if it changed."""
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns != self._mtime_ns or self._document is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    document = json.load(f)
+            except json.JSONDecodeError:
+                if self._document is None:
+                    raise
+            else:
+                self._document = document
+                self._mtime_ns = mtime_ns
+        return self._document, self.poll_interval
+
+
+class StaticJWKSSource:
+    """Serves a JWKS supplied inline, e.g. through an environment variable."""
+
+    name = "inline"
+
+    def __init__(self, document: dict[str, Any]):
+        self.document = document
+
+    async def fetch(self) -> tuple[dict[str, Any], float | None]:
+        """Return the inline JWKS; it never changes, so no TTL is given."""
+        return self.document, None
+
+
+def create_jwks_source() -> JWKSSource:
+    """Pick the key source: a local file, an inline document, or the auth service."""
+    if AUTH_JWKS_FILE:
+        return FileJWKSSource(AUTH_JWKS_FILE, AUTH_JWKS_FILE_POLL_SECONDS)
+    if AUTH_JWKS_JSON:
+        try:
+            return StaticJWKSSource(json.loads(AUTH_JWKS_JSON))
+        except json.JSONDecodeError as e:
+            raise RuntimeError("AUTH_JWKS_JSON is not valid JSON") from e
+    return RemoteJWKSSource(NEON_JWKS_URL)
+
+
+def _load_public_key(x: str) -> Ed25519PublicKey:
+    padding = "=" * (-len(x) % 4)
+    public_key_bytes = base64.urlsafe_b64decode(x + padding)
+    return Ed25519PublicKey.from_public_bytes(public_key_bytes)
+
+
+class SigningKeyRegistry:
+    """Ed25519 public keys from one JWKS document, parsed once and keyed by kid.
+
+    Malformed JWKs are remembered rather than raised at build time, and only
+    fail lookups of their own kid. A JWK without a kid does not get in the way
+    of keys listed after it: it is only reported when no JWK matches the kid.
+    """
+
+    def __init__(self, jwks: dict[str, Any]):
+        keys: dict[str, Ed25519PublicKey] = {}
+        invalid: dict[str, tuple[str, dict[str, Any]]] = {}
+        jwk_missing_kid: dict[str, Any] | None = None
+        for jwk in jwks.get("keys", []):
+            if "kid" not in jwk:
+                if jwk_missing_kid is None:
+                    jwk_missing_kid = jwk
+                continue
+            kid = jwk["kid"]
+            # First JWK with a given kid wins, as with a linear scan
+            if kid in keys or kid in invalid:
+                continue
+            if "x" not in jwk:
+                invalid[kid] = (f"JWK with kid '{kid}' missing 'x' field", jwk)
+                continue
+            try:
+                keys[kid] = _load_public_key(jwk["x"])
+            except ValueError:
+                invalid[kid] = (f"JWK with kid '{kid}' has an invalid 'x' field", jwk)
+        self._keys = keys
+        self._invalid = invalid
+        self._jwk_missing_kid = jwk_missing_kid
+        self.available_kids = [jwk.get("kid") for jwk in jwks.get("keys", [])]
+
+    def __contains__(self, kid: object) -> bool:
+        return kid in self._keys or kid in self._invalid
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get_key(self, kid: str) -> Ed25519PublicKey:
+        """Return the public key for kid, or raise AuthenticationError."""
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        if kid in self._invalid:
+            message, jwk = self._invalid[kid]
+            raise AuthenticationError(message=message, details={"jwk": jwk})
+        if self._jwk_missing_kid is not None:
+            raise AuthenticationError(
+                message="JWK missing 'kid' field",
+                details={"jwk": self._jwk_missing_kid},
+            )
+        raise AuthenticationError(
+            message="Matching JWK not found",
+            details={"kid": kid, "available_kids": self.available_kids},
+        )
+
+
+_EMPTY_REGISTRY = SigningKeyRegistry({"keys": []})
+
+
+class JWKSCache:
+    """In-process JWKS cache.
+
+    The key set is refetched when its TTL runs out, or when a token presents a
+    'kid' the cached set does not know about. Concurrent refreshes share one
+    in-flight fetch. Rotation listeners run whenever a fetched key set replaces
+    a different one.
+
+    A failed refresh keeps the last good key set in service. An optional
+    background task refreshes ahead of expiry so requests never wait on a fetch.
+    """
+
+    def __init__(
+        self,
+        source: JWKSSource,
+        default_ttl: float = JWKS_CACHE_TTL_SECONDS,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+    ):
+        self.source = source
+        self.default_ttl = default_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.document: dict[str, Any] | None = None
+        self.fetched_at = 0.0
+        self.expires_at = 0.0
+        self.fetch_count = 0
+        self.failure_count = 0
+        self.consecutive_failures = 0
+        self.last_error: str | None = None
+        self.registry = _EMPTY_REGISTRY
+        self._lock = asyncio.Lock()
+        self._rotation_listeners: list[Callable[[], None]] = []
+        self._refresh_task: asyncio.Task | None = None
+
+    def add_rotation_listener(self, listener: Callable[[], None]) -> None:
+        """Call listener every time the cached key set is replaced."""
+        self._rotation_listeners.append(listener)
+
+    def _needs_refresh(self, kid: str | None, now: float) -> bool:
+        if self.document is None or now >= self.expires_at:
+            return True
+        if kid is not None and kid not in self.registry:
+            return now - self.fetched_at >= self.min_refresh_interval
+        return False
+
+    async def _ensure_fresh(self, kid: str | None) -> None:
+        if not self._needs_refresh(kid, time.monotonic()):
+            return
+        fetch_count = self.fetch_count
+        async with self._lock:
+            # Another request may have refreshed while this one was waiting;
+            # its key set is as fresh as any, even if its TTL was 0
+            if self.fetch_count != fetch_count:
+                return
+            if self._needs_refresh(kid, time.monotonic()):
+                await self._refresh()
+
+    async def get(self, kid: str | None = None) -> dict[str, Any]:
+        """Return the cached JWKS, refreshing it first if it is stale or misses kid."""
+        await self._ensure_fresh(kid)
+        return self.document  # type: ignore[return-value]
+
+    async def get_registry(self, kid: str | None = None) -> SigningKeyRegistry:
+        """Return the parsed signing keys, refreshing first if stale or missing kid."""
+        await self._ensure_fresh(kid)
+        return self.registry
+
+    async def refresh(self) -> None:
+        """Refetch the key set now, regardless of its TTL."""
+        async with self._lock:
+            await self._refresh()
+
+    async def _refresh(self) -> None:
+        try:
+            document, ttl = await self.source.fetch()
+        except Exception as e:
+            self.failure_count += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self.document is None:
+                raise
+            # Keep serving the last good key set and retry after a short pause
+            self.expires_at = time.monotonic() + self.min_refresh_interval
+            return
+        now = time.monotonic()
+        self.fetch_count += 1
+        self.consecutive_failures = 0
+        self.last_error = None
+        if document != self.document:
+            # Build the new registry fully before swapping it in, so readers
+            # only ever see a complete key set
+            registry = SigningKeyRegistry(document)
+            rotated = self.document is not None
+            self.document, self.registry = document, registry
+            if rotated:
+                for listener in self._rotation_listeners:
+                    listener()
+        self.fetched_at = now
+        # Even a key set served with max-age=0 or no-store is reused for
+        # min_refresh_interval, so requests do not each refetch it
+        ttl = self.default_ttl if ttl is None else ttl
+        self.expires_at = now + max(ttl, self.min_refresh_interval)
+
+    def clear(self) -> None:
+        """Drop the cached key set."""
+        self.document = None
+        self.registry = _EMPTY_REGISTRY
+        self.fetched_at = 0.0
+        self.expires_at = 0.0
+
+    def next_refresh_delay(self) -> float:
+        """Seconds until the background task should refresh the key set."""
+        if self.consecutive_failures or self.document is None:
+            return min(
+                2.0 ** max(self.consecutive_failures, 1),
+                JWKS_REFRESH_MAX_BACKOFF_SECONDS,
+            )
+        lead = min(JWKS_REFRESH_LEAD_SECONDS, (self.expires_at - self.fetched_at) / 2)
+        return max(self.expires_at - lead - time.monotonic(), 1.0)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.next_refresh_delay())
+            try:
+                await self.refresh()
+            except Exception:
+                # Recorded in last_error; the next delay backs off
+                pass
+
+    def start_background_refresh(self) -> None:
+        """Start refreshing the key set shortly before it expires."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self) -> None:
+        """Stop the background refresh task, if running."""
+        task, self._refresh_task = self._refresh_task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def health(self) -> dict[str, Any]:
+        """Report the age and state of the cached key set."""
+        now = time.monotonic()
+        loaded = self.document is not None
+        return {
+            "healthy": loaded,
+            "source": self.source.name,
+            "key_count": len(self.registry),
+            "age_seconds": round(now - self.fetched_at, 3) if loaded else None,
+            "expires_in_seconds": round(self.expires_at - now, 3) if loaded else None,
+            "background_refresh": self._refresh_task is not None
+            and not self._refresh_task.done(),
+            "fetch_count": self.fetch_count,
+            "failure_count": self.failure_count,
+            "last_error": self.last_error,
+        }
+
+
+# Singleton instance
+_jwks_cache = JWKSCache(create_jwks_source())
+
+
+def on_key_rotation(listener: Callable[[], None]) -> None:
+    """Register a callback to run when the Neon signing keys rotate."""
+    _jwks_cache.add_rotation_listener(listener)
+
+
+async def prefetch_jwks() -> bool:
+    """Load the key set ahead of the first request; returns False on failure."""
+    try:
+        await _jwks_cache.refresh()
+        return True
+    except Exception as e:
+        logger.warning("JWKS prefetch failed: %s", e)
+        return False
+
+
+def start_jwks_refresh() -> None:
+    """Keep the cached key set refreshed in the background."""
+    _jwks_cache.start_background_refresh()
+
+
+async def stop_jwks_refresh() -> None:
+    """Stop the background key set refresh."""
+    await _jwks_cache.stop_background_refresh()
+
+
+def jwks_health() -> dict[str, Any]:
+    """Report the age and health of the cached key set."""
+    return _jwks_cache.health()
+
+
+async def get_jwks():
+    """Get JWKS from the configured key source, served from the in-process cache."""
+    return await _jwks_cache.get()
+
+
+def get_token_kid(token: str) -> str:
+    """Read the 'kid' from a token's unverified header."""
     unverified_header = jwt.get_unverified_header(token)
     if "kid" not in unverified_header:
         raise AuthenticationError(
             message="Token header missing 'kid' field",
             details={"header": unverified_header},
         )
-    kid = unverified_header["kid"]
-    for jwk in jwks["keys"]:
-        if "kid" not in jwk:
-            raise AuthenticationError(
-                message="JWK missing 'kid' field",
-                details={"jwk": jwk},
-            )
-        if jwk["kid"] == kid:
-            if "x" not in jwk:
-                raise AuthenticationError(
-                    message=f"JWK with kid '{kid}' missing 'x' field",
-                    details={"jwk": jwk},
-                )
-            x = jwk["x"]
-            padding = "=" * (-len(x) % 4)
-            public_key_bytes = base64.urlsafe_b64decode(x + padding)
-            return Ed25519PublicKey.from_public_bytes(public_key_bytes)
-    raise AuthenticationError(
-        message="Matching JWK not found",
-        details={
-            "kid": kid,
-            "available_kids": [jwk.get("kid") for jwk in jwks.get("keys", [])],
-        },
-    )
+    return unverified_header["kid"]
+
+
+def get_signing_key(token, jwks):
+    return SigningKeyRegistry(jwks).get_key(get_token_kid(token))
 
 
 async def validate_neon_token(token: str):
     try:
-        jwks = await get_jwks()
-        signing_key = get_signing_key(token, jwks)
+        kid = get_token_kid(token)
+        registry = await _jwks_cache.get_registry(kid)
+        signing_key = registry.get_key(kid)
         payload = jwt.decode(
             token, key=signing_key, algorithms=["EdDSA"], issuer=ORIGIN, audience=ORIGIN
         )
@@ -0,0 +1,74 @@
+"""
+Bounded LRU cache of already-verified bearer tokens.
+
+Entries are keyed by a SHA-256 digest of the token, so raw tokens are never
+held in memory, and expire at the token's own 'exp' claim.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+ValueT = TypeVar("ValueT")
+
+
+class VerifiedTokenCache(Generic[ValueT]):
+    """LRU of verified tokens with hit, miss and eviction counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, tuple[ValueT, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> ValueT | None:
+        """Return the cached value for token, or None if absent or expired."""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, token: str, value: ValueT, expires_at: float) -> None:
+        """Cache value for token until expires_at (a Unix timestamp)."""
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Evict every entry, e.g. after the signing keys rotate."""
+        self.evictions += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache size and counters."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -4,16 +4,43 @@ This service will orchestrate conversation flow,
 persistence, persona, project context, and LLM interaction for a project stakeholder agent.
 """
 
+import asyncio
+import os
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from typing import TypeVar
+
+import anyio
 from pydantic_ai import ModelMessage
 
-from src.agents.stakeholder_agent import run_stakeholder_query
+from src.agents.stakeholder_agent import (
+    run_stakeholder_query,
+    stream_stakeholder_query,
+)
+from src.exceptions.conversation_busy_exception import ConversationBusyException
 from src.exceptions.llm_response_exception import LlmResponseException
+from src.limits.concurrency import ConcurrencyLimitExceeded, conversation_locks
+from src.repository.model_repository import ConversationSummaryRepository
 from src.schemas.message_model import Message
+from src.schemas.persona_model import Persona
+from src.schemas.project_model import Project
+from src.service.compaction_worker import schedule_compaction
 from src.service.history_compactor_service import HistoryCompactorService
 from src.service.persona_service import PersonaService
 from src.service.project_service import ProjectService
 from src.service.message_service import MessageService
 
+# What happens to a streamed response whose client goes away part way:
+# "discard" saves nothing, "save_partial" saves the text so far, marked
+GENERATE_DISCONNECT_POLICY = os.environ.get("GENERATE_DISCONNECT_POLICY", "discard")
+if GENERATE_DISCONNECT_POLICY not in ("discard", "save_partial"):
+    raise RuntimeError(
+        f"Unknown GENERATE_DISCONNECT_POLICY: {GENERATE_DISCONNECT_POLICY!r}"
+    )
+PARTIAL_RESPONSE_MARKER = "\n\n[response interrupted]"
+
+T = TypeVar("T")
+
 
 class AgentService:
     """Service for orchestrating agent conversations and context."""
@@ -23,12 +50,23 @@ class AgentService:
         persona_service: PersonaService,
         project_service: ProjectService,
         message_service: MessageService,
+        summary_repository: ConversationSummaryRepository | None = None,
+        keep_context: bool = False,
     ):
 
         # dependencies injected via FastAPI
         self.persona_service = persona_service
         self.project_service = project_service
         self.message_service = message_service
+        # with it, summaries are folded in the background after each reply;
+        # without it, old messages are summarized inline on every turn
+        self.summary_repository = summary_repository
+        # for long-lived sessions (e.g. a WebSocket): persona and project are
+        # loaded once and each conversation's history is kept in memory; it is
+        # reloaded when another writer added messages since
+        self.keep_context = keep_context
+        self._context: tuple[Persona, Project] | None = None
+        self._histories: dict[str, list[Message]] = {}
         self.request: str | None = None
         self.conversation_id: str | None = None
 
@@ -60,6 +98,68 @@ class AgentService:
         """set from request payload in orchestrator method"""
         self.conversation_id = conversation_id
 
+    def _remember(self, conversation_id: str, message: object) -> None:
+        """Append a saved message to the conversation's in-memory history."""
+        history = self._histories.get(conversation_id)
+        if history is not None:
+            history.append(Message.model_validate(message, from_attributes=True))
+
+    async def _history_is_current(
+        self, user_id: str, conversation_id: str, history: list[Message]
+    ) -> bool:
+        """Whether a kept history still ends with the conversation's newest
+        message, i.e. nothing else (another endpoint, job or session) wrote
+        to the conversation since."""
+        latest_id = await self.message_service.get_latest_message_id(
+            user_id=user_id, conversation_id=conversation_id
+        )
+        newest = history[-1].id if history else None
+        return latest_id == newest
+
+    async def _prepare_context(
+        self, user_id: str, conversation_id: str, up_to: str | None = None
+    ) -> tuple[Persona, Project, list[ModelMessage]]:
+        """Load persona, project and the compacted conversation history.
+        With up_to, the history ends at the message with that id."""
+        if self._context is None or not self.keep_context:
+            self._context = (self.load_persona(), self.load_project())
+        persona, project = self._context
+        history = self._histories.get(conversation_id)  # list[Message]
+        if history is not None and not await self._history_is_current(
+            user_id, conversation_id, history
+        ):
+            history = None
+        if history is None:
+            history = await self.load_history(user_id, conversation_id)
+            if self.keep_context:
+                self._histories[conversation_id] = history
+        if up_to is not None:
+            ids = [str(msg.id) for msg in history]
+            if up_to in ids:
+                history = history[: ids.index(up_to) + 1]
+        compacted_history: list[ModelMessage]
+        if self.summary_repository is not None:
+            compacted_history = await HistoryCompactorService.build_history(
+                history, user_id, self.summary_repository
+            )
+        else:
+            compacted_history = await HistoryCompactorService.summarize_old_messages(
+                history, user_id=user_id
+            )
+        return persona, project, compacted_history
+
+    @asynccontextmanager
+    async def _turn(self, conversation_id: str) -> AsyncIterator[None]:
+        """Hold the conversation's turn; a concurrent turn on it waits here."""
+        async with AsyncExitStack() as stack:
+            try:
+                await stack.enter_async_context(
+                    conversation_locks.acquire(str(conversation_id))
+                )
+            except ConcurrencyLimitExceeded:
+                raise ConversationBusyException() from None
+            yield
+
     async def process_agent_query(
         self, user_id: str, conversation_id: str, content: str
     ) -> dict:
@@ -68,19 +168,70 @@ class AgentService:
         assembles context from persona, project and persistence(history) service
         persists both request and response messages via persistence service
         returns response to controller as dict
+        turns on one conversation run one at a time; raises
+        ConversationBusyException if the previous one takes too long
         """
-        await self.message_service.save_user_message(
+        async with self._turn(conversation_id):
+            return await self._process_agent_query(user_id, conversation_id, content)
+
+    async def queue_agent_query(
+        self,
+        user_id: str,
+        conversation_id: str,
+        content: str,
+        enqueue: Callable[[str], T | None],
+    ) -> T | None:
+        """Save the user message and pass its id to enqueue, which queues the
+        reply as a background job (see respond_to_saved_message)
+        both happen within the conversation's turn, so no other turn saves a
+        message in between; if enqueue returns None (e.g. the queue is full)
+        the message is deleted again and None is returned
+        """
+        async with self._turn(conversation_id):
+            saved_user_message = await self.message_service.save_user_message(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                content=content,
+            )
+            queued = enqueue(str(saved_user_message.id))
+            if queued is None:
+                await self.message_service.delete_message(saved_user_message)
+            return queued
+
+    async def respond_to_saved_message(
+        self, user_id: str, conversation_id: str, content: str, message_id: str
+    ) -> dict:
+        """process_agent_query for a user message that is already saved,
+        e.g. by the request that queued this as a background job
+        the history ends at that message, so messages saved after it are
+        not answered as if they came first
+        """
+        async with self._turn(conversation_id):
+            return await self._respond(
+                user_id, conversation_id, content, up_to=message_id
+            )
+
+    async def _process_agent_query(
+        self, user_id: str, conversation_id: str, content: str
+    ) -> dict:
+        saved_user_message = await self.message_service.save_user_message(
             user_id=user_id,
             conversation_id=conversation_id,
             content=content,
         )
+        self._remember(conversation_id, saved_user_message)
+        return await self._respond(user_id, conversation_id, content)
 
-        persona = self.load_persona()
-        project = self.load_project()
-        history = await self.load_history(user_id, conversation_id)  # list[Message]
-        compacted_history: list[
-            ModelMessage
-        ] = await HistoryCompactorService.summarize_old_messages(history)
+    async def _respond(
+        self,
+        user_id: str,
+        conversation_id: str,
+        content: str,
+        up_to: str | None = None,
+    ) -> dict:
+        persona, project, compacted_history = await self._prepare_context(
+            user_id, conversation_id, up_to
+        )
 
         try:
             response_content = await run_stakeholder_query(
@@ -88,6 +239,7 @@ class AgentService:
                 persona=persona,
                 project=project,
                 history=compacted_history,
+                user_id=user_id,
             )
         except LlmResponseException as e:
             return {
@@ -101,8 +253,73 @@ class AgentService:
             conversation_id=conversation_id,
             content=response_content,
         )
+        self._remember(conversation_id, saved_ai_message)
+        if self.summary_repository is not None:
+            schedule_compaction(conversation_id, user_id)
 
         return {
             "status": "success",
             "response": saved_ai_message.content,
         }
+
+    async def stream_agent_query(
+        self, user_id: str, conversation_id: str, content: str
+    ) -> AsyncGenerator[str, None]:
+        """Streaming variant of process_agent_query
+        yields the response text as it is generated
+        the full response is persisted once the stream completes; if the
+        consumer goes away first, GENERATE_DISCONNECT_POLICY decides whether
+        the partial response is discarded or saved with a marker
+        raises LlmResponseException if the model call fails
+        """
+        async with self._turn(conversation_id):
+            stream = self._stream_agent_query(user_id, conversation_id, content)
+            # Closed before the turn is released, so a partial save lands first
+            async with aclosing(stream):
+                async for delta in stream:
+                    yield delta
+
+    async def _stream_agent_query(
+        self, user_id: str, conversation_id: str, content: str
+    ) -> AsyncGenerator[str, None]:
+        saved_user_message = await self.message_service.save_user_message(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            content=content,
+        )
+        self._remember(conversation_id, saved_user_message)
+        persona, project, compacted_history = await self._prepare_context(
+            user_id, conversation_id
+        )
+
+        chunks: list[str] = []
+        try:
+            async for delta in stream_stakeholder_query(
+                message=content,
+                persona=persona,
+                project=project,
+                history=compacted_history,
+                user_id=user_id,
+            ):
+                chunks.append(delta)
+                yield delta
+        except (asyncio.CancelledError, GeneratorExit):
+            if GENERATE_DISCONNECT_POLICY == "save_partial" and chunks:
+                # The surrounding scope is being cancelled; finish the save
+                with anyio.CancelScope(shield=True):
+                    saved_partial = await self.message_service.save_ai_message(
+                        user_id=user_id,
+                        conversation_id=conversation_id,
+                        content="".join(chunks) + PARTIAL_RESPONSE_MARKER,
+                    )
+                self._remember(conversation_id, saved_partial)
+            raise
+
+        saved_ai_message = await self.message_service.save_ai_message(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            content="".join(chunks),
+        )
+        self._remember(conversation_id, saved_ai_message)
+        if self.summary_repository is not None:
+            schedule_compaction(conversation_id, user_id)
@@ -0,0 +1,119 @@
+"""
+Bounded pool of asyncio workers for jobs that run off the request path.
+
+Jobs are keyed. While a key is queued, enqueueing it again only replaces the
+job, and a key that is already running is queued once more after it
+finishes, so each key runs at most once at a time and never piles up.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class BackgroundWorker:
+    """Runs keyed jobs on a fixed number of worker tasks."""
+
+    def __init__(self, name: str, concurrency: int, max_queue_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue_size = max_queue_size
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        # key -> (job, enqueued at), in queue order
+        self._pending: dict[str, tuple[Job, float]] = {}
+        self._running: set[str] = set()
+        self._rerun: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    @property
+    def full(self) -> bool:
+        """Whether a new key would be dropped right now."""
+        return len(self._pending) >= self.max_queue_size
+
+    def enqueue(self, key: str, job: Job) -> bool:
+        """Queue job under key; returns False if the queue is full."""
+        if key in self._pending:
+            self._pending[key] = (job, self._pending[key][1])
+            self.deduplicated += 1
+            return True
+        if key in self._running:
+            self._rerun[key] = job
+            self.deduplicated += 1
+            return True
+        if self.full:
+            self.dropped += 1
+            logger.warning("%s queue is full, dropping job %s", self.name, key)
+            return False
+        self._pending[key] = (job, time.monotonic())
+        self._queue.put_nowait(key)
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._queue.get()
+            job, enqueued_at = self._pending.pop(key)
+            self.last_lag_seconds = time.monotonic() - enqueued_at
+            self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+            self._running.add(key)
+            try:
+                await job()
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("%s job %s failed", self.name, key)
+            finally:
+                self._running.discard(key)
+                self._queue.task_done()
+                rerun = self._rerun.pop(key, None)
+                if rerun is not None:
+                    self.enqueue(key, rerun)
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"{self.name}-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def join(self) -> None:
+        """Wait until every queued job has run."""
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks; queued jobs are discarded."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        """Return queue depth, lag and job counters."""
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": len(self._pending),
+            "running": len(self._running),
+            "oldest_pending_seconds": 0.0
+            if oldest is None
+            else time.monotonic() - oldest[1],
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "completed": self.completed,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+            "dropped": self.dropped,
+        }
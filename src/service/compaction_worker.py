@@ -0,0 +1,50 @@
+"""
+Background compaction of conversation history.
+
+After a reply is saved, the conversation is queued here and its summary is
+folded on a worker with its own database session, so requests never wait on
+the summarizer. The next turn uses whatever summary has finished by then.
+"""
+
+import os
+from functools import partial
+
+from src.database import SessionLocal
+from src.repository.model_repository import (
+    ConversationSummaryRepository,
+    MessageRepository,
+)
+from src.schemas.message_model import Message
+from src.service.background_worker import BackgroundWorker
+from src.service.history_compactor_service import HistoryCompactorService
+
+COMPACTION_WORKER_CONCURRENCY = int(
+    os.environ.get("COMPACTION_WORKER_CONCURRENCY", "2")
+)
+COMPACTION_QUEUE_SIZE = int(os.environ.get("COMPACTION_QUEUE_SIZE", "1000"))
+
+compaction_worker = BackgroundWorker(
+    "compaction", COMPACTION_WORKER_CONCURRENCY, COMPACTION_QUEUE_SIZE
+)
+
+
+async def compact_conversation(conversation_id: str, user_id: str) -> None:
+    """Fold the conversation's newly old messages into its stored summary."""
+    async with SessionLocal() as session:
+        db_messages = await MessageRepository(session).get_messages_by_conversation_id(
+            conversation_id=conversation_id, user_id=user_id
+        )
+        messages = [
+            Message.model_validate(msg, from_attributes=True) for msg in db_messages
+        ]
+        await HistoryCompactorService.compact(
+            messages, user_id, ConversationSummaryRepository(session)
+        )
+
+
+def schedule_compaction(conversation_id: str, user_id: str) -> bool:
+    """Queue a conversation for compaction; repeated calls are deduplicated."""
+    return compaction_worker.enqueue(
+        f"{user_id}:{conversation_id}",
+        partial(compact_conversation, str(conversation_id), user_id),
+    )
@@ -0,0 +1,187 @@
+"""
+Asynchronous generation jobs.
+
+In async mode /generate saves the user message, queues the agent run here
+and answers 202 with a job id right away; the reply is produced on a worker
+with its own database session and collected later by polling (or
+long-polling) the job. Jobs live in memory, per process, and finished ones
+are kept for a limited time.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import partial
+from typing import Any
+
+from src.database import SessionLocal
+from src.limits.concurrency import generation_limiter
+from src.repository.model_repository import (
+    ConversationSummaryRepository,
+    MessageRepository,
+)
+from src.service.agent_service import AgentService
+from src.service.background_worker import BackgroundWorker
+from src.service.message_service import MessageService
+from src.service.persona_service import PersonaService
+from src.service.project_service import ProjectService
+
+logger = logging.getLogger(__name__)
+
+# What a failed job reports to its owner; the cause is only logged
+GENERATION_JOB_ERROR = "Error processing agent query"
+
+GENERATION_JOB_WORKERS = int(os.environ.get("GENERATION_JOB_WORKERS", "4"))
+GENERATION_JOB_QUEUE_SIZE = int(os.environ.get("GENERATION_JOB_QUEUE_SIZE", "100"))
+# How long a finished job's result can still be collected
+GENERATION_JOB_TTL_SECONDS = float(os.environ.get("GENERATION_JOB_TTL_SECONDS", "3600"))
+GENERATION_JOB_MAX_JOBS = int(os.environ.get("GENERATION_JOB_MAX_JOBS", "10000"))
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+@dataclass
+class GenerationJob:
+    """State of one queued agent run."""
+
+    id: str
+    user_id: str
+    conversation_id: str
+    status: JobStatus = JobStatus.queued
+    response: str | None = None
+    error: str | None = None
+    finished_at: float | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def finish(
+        self, status: JobStatus, response: str | None = None, error: str | None = None
+    ) -> None:
+        self.status = status
+        self.response = response
+        self.error = error
+        self.finished_at = time.monotonic()
+        self.done.set()
+
+
+class GenerationJobStore:
+    """Bounded store of jobs by id; finished jobs expire after ttl."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._jobs: OrderedDict[str, GenerationJob] = OrderedDict()
+        self.evictions = 0
+
+    def create(self, user_id: str, conversation_id: str) -> GenerationJob:
+        job = GenerationJob(
+            id=str(uuid.uuid4()), user_id=user_id, conversation_id=conversation_id
+        )
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_size:
+            self._jobs.popitem(last=False)
+            self.evictions += 1
+        return job
+
+    def get(self, job_id: str, user_id: str) -> GenerationJob | None:
+        """Return the job if it exists, has not expired and belongs to user_id."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if (
+            job.finished_at is not None
+            and time.monotonic() - job.finished_at >= self.ttl
+        ):
+            del self._jobs[job_id]
+            self.evictions += 1
+            return None
+        return job if job.user_id == user_id else None
+
+    def unfinished(self, user_id: str) -> int:
+        """Return how many of user_id's jobs are queued or running."""
+        return sum(
+            1
+            for job in self._jobs.values()
+            if job.user_id == user_id and job.finished_at is None
+        )
+
+    def discard(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+
+    def stats(self) -> dict[str, Any]:
+        """Return job counts by status."""
+        counts = {status.value: 0 for status in JobStatus}
+        for job in self._jobs.values():
+            counts[job.status.value] += 1
+        return {
+            "size": len(self._jobs),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            **counts,
+        }
+
+
+generation_jobs = GenerationJobStore(
+    GENERATION_JOB_TTL_SECONDS, GENERATION_JOB_MAX_JOBS
+)
+generation_job_worker = BackgroundWorker(
+    "generation-jobs", GENERATION_JOB_WORKERS, GENERATION_JOB_QUEUE_SIZE
+)
+
+
+async def run_generation_job(job: GenerationJob, content: str, message_id: str) -> None:
+    """Answer the job's already saved user message, with id message_id."""
+    job.status = JobStatus.running
+    try:
+        async with SessionLocal() as session:
+            agent_service = AgentService(
+                persona_service=PersonaService(),
+                project_service=ProjectService(),
+                message_service=MessageService(MessageRepository(session)),
+                summary_repository=ConversationSummaryRepository(session),
+            )
+            result = await agent_service.respond_to_saved_message(
+                user_id=job.user_id,
+                conversation_id=job.conversation_id,
+                content=content,
+                message_id=message_id,
+            )
+    except BaseException:
+        # The worker logs the exception
+        job.finish(JobStatus.failed, error=GENERATION_JOB_ERROR)
+        raise
+    if result.get("status") == "success":
+        job.finish(JobStatus.succeeded, response=result.get("response", ""))
+    else:
+        logger.error(
+            "generation job %s failed: %s", job.id, result.get("details", "unknown")
+        )
+        job.finish(JobStatus.failed, error=GENERATION_JOB_ERROR)
+
+
+def submit_generation_job(
+    user_id: str, conversation_id: str, content: str, message_id: str
+) -> GenerationJob | None:
+    """Queue an agent run for a saved user message.
+
+    Returns None if the queue is full or the user already has as many jobs
+    queued or running as they may have generations in flight.
+    """
+    if generation_jobs.unfinished(user_id) >= generation_limiter.limit:
+        return None
+    job = generation_jobs.create(user_id, conversation_id)
+    if not generation_job_worker.enqueue(
+        job.id, partial(run_generation_job, job, content, message_id)
+    ):
+        generation_jobs.discard(job.id)
+        return None
+    return job
@@ -2,50 +2,107 @@
 Service to compact conversation history
 by summarizing older messages and keeping only the most recent.
 reduces token usage while preserving context
+summaries are persisted and built hierarchically: each batch of messages that
+left the window gets a chunk summary, and every few summaries of one level are
+merged into one of the next, so prompts and compaction cost grow
+logarithmically with conversation length
 Project StakeHolder
 """
 
+import asyncio
 import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import cast
 
 from pydantic_ai import (
     Agent,
     ModelRequest,
     ModelResponse,
     ModelMessage,
+    SystemPromptPart,
     TextPart,
     UserPromptPart,
 )
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from pydantic_ai.settings import ModelSettings
 
+from src.agents.model_registry import ModelConfig, main_model_config, model_registry
+from src.exceptions.llm_overloaded_exception import LlmOverloadedException
+from src.limits.admission import LlmPriority, LlmQueueTimeout, llm_admission
+from src.limits.quota import acharge_token_usage
+from src.models.conversation_summary import ConversationSummary
+from src.repository.model_repository import ConversationSummaryRepository
 from src.schemas.message_model import Message, MessageType
+from src.service.token_budget import estimate_message_tokens, get_history_token_budget
 
 
-# Read LLM credentials and config from environment
-api_base_url = os.environ.get("AI_PROVIDER_BASE_URL", "")
-api_key = os.environ.get("AI_PROVIDER_API_KEY", "")
-main_model_name = os.environ.get("AI_PROVIDER_MODEL", "llama3.1:8b")
+SUMMARIZER_TIMEOUT_SECONDS = float(os.environ.get("SUMMARIZER_TIMEOUT_SECONDS", "60"))
+# Summarizer calls in flight at once in this process
+SUMMARIZER_MAX_CONCURRENCY = int(os.environ.get("SUMMARIZER_MAX_CONCURRENCY", "2"))
 
-provider = OpenAIProvider(
-    base_url=api_base_url,
-    api_key=api_key,
-)
+# Old messages are folded into the summary once this many have accumulated
+SUMMARY_FOLD_BATCH_SIZE = int(os.environ.get("SUMMARY_FOLD_BATCH_SIZE", "4"))
+# Upper bound on messages sent to the summarizer in one fold step
+SUMMARY_FOLD_MAX_MESSAGES = int(os.environ.get("SUMMARY_FOLD_MAX_MESSAGES", "20"))
+# Stored summaries of one level merged into one of the next level; below 2,
+# a single rolling summary is kept instead
+SUMMARY_LEVEL_FANOUT = int(os.environ.get("SUMMARY_LEVEL_FANOUT", "4"))
 
-summarize_model = OpenAIChatModel(
-    model_name=main_model_name,
-    provider=provider,
-)
 
-# Use less expensive (by token count) model to summarize old messages.
-summarize_agent = Agent(
-    model=summarize_model,
-    instructions="""
+def summarizer_model_config() -> ModelConfig:
+    """Read the summarizer's model config from the environment.
+
+    The summarizer can run on its own, cheaper provider and model; each setting
+    falls back to the main AI provider's.
+    """
+    main = main_model_config()
+    return ModelConfig(
+        base_url=os.environ.get("SUMMARIZER_BASE_URL") or main.base_url,
+        api_key=os.environ.get("SUMMARIZER_API_KEY") or main.api_key,
+        model_name=os.environ.get("SUMMARIZER_MODEL") or main.model_name,
+    )
+
+
+def create_summarize_agent() -> Agent[None, str]:
+    """Create the agent that summarizes old messages."""
+    # Use less expensive (by token count) model to summarize old messages.
+    return Agent(
+        model=model_registry.get_model(summarizer_model_config()),
+        model_settings=ModelSettings(timeout=SUMMARIZER_TIMEOUT_SECONDS),
+        instructions="""
         Summarize this conversation, focus on key points and decisions, and keep it concise. 
         Try to remember personal details and preferences mentioned. 
         The summary should capture the essence of the conversation so far,
         without needing to include every message. The summary will be used to provide context for future messages
         """,
-)
+    )
+
+
+# Built on first use (or at startup by model_registry.warm_up())
+model_registry.register("summarizer", create_summarize_agent)
+
+
+def get_summarize_agent() -> Agent[None, str]:
+    """Get or create the summarizer agent."""
+    return cast(Agent[None, str], model_registry.get_agent("summarizer"))
+
+
+_summarizer_slots = asyncio.Semaphore(SUMMARIZER_MAX_CONCURRENCY)
+
+
+@dataclass
+class HistorySplit:
+    """A conversation divided for compaction."""
+
+    # Stored summaries that still line up with the conversation, oldest first
+    summaries: list[ConversationSummary]
+    # Stored summaries that no longer do; replaced by the next one saved
+    stale: list[ConversationSummary]
+    # Old messages no summary covers yet
+    unsummarized: list[Message]
+    # Newest messages that fit the token budget
+    recent: list[Message]
 
 
 class HistoryCompactorService:
@@ -64,19 +121,326 @@ class HistoryCompactorService:
                 result.append(ModelResponse(parts=[TextPart(content=msg.content)]))
         return result
 
+    @staticmethod
+    def _summary_message(summaries: list[str]) -> ModelMessage:
+        """Wrap stored summaries, oldest first, so they can lead the model history."""
+        joined = "\n\n".join(summaries)
+        return ModelRequest(
+            parts=[
+                SystemPromptPart(
+                    content=f"Summary of the earlier conversation:\n{joined}"
+                )
+            ]
+        )
+
+    @staticmethod
+    def _merge_request(summaries: list[str]) -> ModelMessage:
+        """Ask for summaries, oldest first, to be merged into one; they are the
+        user turn here, as there are no messages to summarize."""
+        joined = "\n\n".join(summaries)
+        return ModelRequest(
+            parts=[
+                UserPromptPart(
+                    content="Summaries of consecutive parts of the conversation, "
+                    f"oldest first:\n{joined}"
+                )
+            ]
+        )
+
+    @staticmethod
+    def _uncovered_messages(
+        old_messages: list[Message],
+        recent_messages: list[Message],
+        latest: ConversationSummary,
+    ) -> list[Message] | None:
+        """Return the old messages newer than the latest summary, or None if the
+        summary no longer lines up with the conversation."""
+        for index, msg in enumerate(old_messages):
+            if msg.id == latest.last_message_id:
+                return old_messages[index + 1 :]
+        # The covered message is gone (e.g. deleted); fall back to timestamps,
+        # as long as the summary does not reach into the recent window
+        last_covered = latest.last_message_created_at
+        timestamps = [msg.created_at for msg in old_messages + recent_messages]
+        if None not in timestamps and all(
+            created_at > last_covered
+            for created_at in timestamps[len(old_messages) :]
+            if created_at is not None
+        ):
+            return [
+                msg
+                for msg in old_messages
+                if msg.created_at is not None and msg.created_at > last_covered
+            ]
+        return None
+
+    @staticmethod
+    async def _fold(
+        previous_summary: str | None, messages: list[Message], user_id: str | None
+    ) -> str:
+        """Summarize the previous summary followed by messages."""
+        to_summarize = HistoryCompactorService._convert_to_modellist(messages)
+        if previous_summary is not None:
+            to_summarize.insert(
+                0, HistoryCompactorService._summary_message([previous_summary])
+            )
+        return await HistoryCompactorService._summarize(to_summarize, user_id)
+
+    @staticmethod
+    async def _summarize(to_summarize: list[ModelMessage], user_id: str | None) -> str:
+        """Run the summarizer on to_summarize, charging its tokens to user_id."""
+        # Call the summarizer agent with list of ModelMessages; it queues
+        # behind user turns for the shared model backend
+        try:
+            async with _summarizer_slots, llm_admission.admit(LlmPriority.background):
+                summary = await get_summarize_agent().run(message_history=to_summarize)
+        except LlmQueueTimeout:
+            raise LlmOverloadedException()
+        if user_id is not None:
+            await acharge_token_usage(user_id, summary.usage())
+        return summary.output
+
+    @staticmethod
+    async def _save_summary(
+        summary_repository: ConversationSummaryRepository | None,
+        user_id: str | None,
+        content: str,
+        covers: Message | ConversationSummary,
+        level: int,
+        replaced: list[ConversationSummary],
+    ) -> ConversationSummary:
+        """Store a summary covering everything up to covers, replacing others.
+        Without a repository the summary is only kept for this call."""
+        last_message_id: uuid.UUID
+        last_message_created_at: datetime | None
+        if isinstance(covers, ConversationSummary):
+            last_message_id = covers.last_message_id
+            last_message_created_at = covers.last_message_created_at
+        else:
+            last_message_id, last_message_created_at = covers.id, covers.created_at
+        if (
+            summary_repository is None
+            or user_id is None
+            or last_message_created_at is None
+        ):
+            return ConversationSummary(
+                content=content,
+                last_message_id=last_message_id,
+                last_message_created_at=last_message_created_at,
+                level=level,
+            )
+        return await summary_repository.save_summary(
+            conversation_id=str(covers.conversation_id),
+            user_id=user_id,
+            content=content,
+            last_message_id=str(last_message_id),
+            last_message_created_at=last_message_created_at,
+            level=level,
+            replaced=replaced,
+        )
+
+    @staticmethod
+    def _split_by_budget(
+        messages: list[Message], budget: int
+    ) -> tuple[list[Message], list[Message]]:
+        """Split messages into old ones and the newest ones that fit budget.
+        The newest message is always kept, even if it alone exceeds it."""
+        used = 0
+        start = len(messages)
+        while start > 0:
+            used += estimate_message_tokens(messages[start - 1].content)
+            if used > budget and start < len(messages):
+                break
+            start -= 1
+        return messages[:start], messages[start:]
+
+    @staticmethod
+    async def _load_split(
+        messages: list[Message],
+        user_id: str | None,
+        summary_repository: ConversationSummaryRepository | None,
+    ) -> HistorySplit:
+        """Split history into stored summaries, old messages they lack, and
+        recent messages."""
+        old_messages, recent_messages = HistoryCompactorService._split_by_budget(
+            messages, get_history_token_budget(main_model_config().model_name)
+        )
+        if not old_messages:
+            return HistorySplit([], [], [], recent_messages)
+        stored: list[ConversationSummary] = []
+        if summary_repository is not None and user_id is not None:
+            stored = await summary_repository.get_summaries(
+                conversation_id=str(old_messages[0].conversation_id), user_id=user_id
+            )
+        if stored:
+            latest = stored[-1]
+            for index, msg in enumerate(recent_messages):
+                if msg.id == latest.last_message_id:
+                    # The window grew past the summaries, which still cover these
+                    return HistorySplit(stored, [], [], recent_messages[index + 1 :])
+            uncovered = HistoryCompactorService._uncovered_messages(
+                old_messages, recent_messages, latest
+            )
+            if uncovered is not None:
+                return HistorySplit(stored, [], uncovered, recent_messages)
+        return HistorySplit([], stored, old_messages, recent_messages)
+
+    @staticmethod
+    async def _merge_levels(
+        summaries: list[ConversationSummary],
+        user_id: str | None,
+        summary_repository: ConversationSummaryRepository | None,
+    ) -> list[ConversationSummary]:
+        """Merge every SUMMARY_LEVEL_FANOUT summaries of a level into one of the
+        next level, like carrying in a counter, until no level is full."""
+        while True:
+            for level in sorted({summary.level for summary in summaries}):
+                group = [summary for summary in summaries if summary.level == level]
+                if len(group) < SUMMARY_LEVEL_FANOUT:
+                    continue
+                children = group[:SUMMARY_LEVEL_FANOUT]
+                content = await HistoryCompactorService._summarize(
+                    [
+                        HistoryCompactorService._merge_request(
+                            [child.content for child in children]
+                        )
+                    ],
+                    user_id,
+                )
+                merged = await HistoryCompactorService._save_summary(
+                    summary_repository,
+                    user_id,
+                    content,
+                    children[-1],
+                    level + 1,
+                    children,
+                )
+                summaries = [
+                    summary for summary in summaries if summary not in children
+                ]
+                summaries.append(merged)
+                summaries.sort(key=lambda summary: summary.last_message_created_at)
+                break
+            else:
+                return summaries
+
+    @staticmethod
+    async def _fold_all(
+        split: HistorySplit,
+        user_id: str | None,
+        summary_repository: ConversationSummaryRepository | None,
+    ) -> list[ConversationSummary]:
+        """Fold the unsummarized messages and return the summaries, oldest first."""
+        hierarchical = summary_repository is not None and SUMMARY_LEVEL_FANOUT >= 2
+        summaries = list(split.summaries)
+        replaced = list(split.stale)
+        # Fold in bounded steps, so even a long backlog never becomes one huge call
+        for start in range(0, len(split.unsummarized), SUMMARY_FOLD_MAX_MESSAGES):
+            batch = split.unsummarized[start : start + SUMMARY_FOLD_MAX_MESSAGES]
+            if hierarchical:
+                # Each batch becomes a chunk summary of its own
+                content = await HistoryCompactorService._fold(None, batch, user_id)
+                summaries.append(
+                    await HistoryCompactorService._save_summary(
+                        summary_repository, user_id, content, batch[-1], 0, replaced
+                    )
+                )
+                summaries = await HistoryCompactorService._merge_levels(
+                    summaries, user_id, summary_repository
+                )
+            else:
+                previous = "\n\n".join(summary.content for summary in summaries)
+                content = await HistoryCompactorService._fold(
+                    previous or None, batch, user_id
+                )
+                summaries = [
+                    await HistoryCompactorService._save_summary(
+                        summary_repository,
+                        user_id,
+                        content,
+                        batch[-1],
+                        0,
+                        replaced + summaries,
+                    )
+                ]
+            replaced = []
+        return summaries
+
+    @staticmethod
+    def _assemble(
+        summaries: list[ConversationSummary],
+        unsummarized: list[Message],
+        recent_messages: list[Message],
+    ) -> list[ModelMessage]:
+        prefix = (
+            [
+                HistoryCompactorService._summary_message(
+                    [summary.content for summary in summaries]
+                )
+            ]
+            if summaries
+            else []
+        )
+        return prefix + HistoryCompactorService._convert_to_modellist(
+            unsummarized + recent_messages
+        )
+
+    @staticmethod
+    async def build_history(
+        messages: list[Message],
+        user_id: str,
+        summary_repository: ConversationSummaryRepository,
+    ) -> list[ModelMessage]:
+        """Build model history from the stored summaries without any LLM call.
+        Recent messages are those that fit the model's token budget.
+        Old messages the summaries do not cover yet are sent verbatim, at most
+        the newest SUMMARY_FOLD_MAX_MESSAGES of them: a backlog that compaction
+        has not caught up with (e.g. after a migration, or while it fails or is
+        shed) loses its oldest messages rather than growing the prompt."""
+        split = await HistoryCompactorService._load_split(
+            messages, user_id, summary_repository
+        )
+        unsummarized = split.unsummarized[-max(SUMMARY_FOLD_MAX_MESSAGES, 1) :]
+        return HistoryCompactorService._assemble(
+            split.summaries, unsummarized, split.recent
+        )
+
+    @staticmethod
+    async def compact(
+        messages: list[Message],
+        user_id: str,
+        summary_repository: ConversationSummaryRepository,
+    ) -> bool:
+        """Fold newly old messages into the stored summaries once a batch is ready.
+        Returns whether a new summary was stored."""
+        split = await HistoryCompactorService._load_split(
+            messages, user_id, summary_repository
+        )
+        if len(split.unsummarized) < max(SUMMARY_FOLD_BATCH_SIZE, 1):
+            return False
+        await HistoryCompactorService._fold_all(split, user_id, summary_repository)
+        return True
+
     @staticmethod
     async def summarize_old_messages(
         messages: list[Message],
+        user_id: str | None = None,
+        summary_repository: ConversationSummaryRepository | None = None,
     ) -> list[ModelMessage]:
-        """Summarize old messages while keeping the 10 most recent.
-        Uses summarize_agent model."""
-        converted_messages = HistoryCompactorService._convert_to_modellist(messages)
-        message_cutoff = 10
-        if len(messages) >= message_cutoff:
-            recent_messages = converted_messages[-message_cutoff:]
-            old_messages = converted_messages[:-message_cutoff]
-
-            # Call summarize_agent with list of ModelMessages
-            summary = await summarize_agent.run(message_history=old_messages)
-            return summary.new_messages() + recent_messages
-        return converted_messages
+        """Summarize old messages, keeping the newest that fit the model's
+        token budget verbatim; nothing is summarized while everything fits.
+        Uses the summarizer agent's model; tokens are charged to user_id if given.
+        With a summary_repository, the stored summaries are reused and only
+        messages that left the recent window since are folded in, once
+        SUMMARY_FOLD_BATCH_SIZE of them have accumulated."""
+        split = await HistoryCompactorService._load_split(
+            messages, user_id, summary_repository
+        )
+        summaries, unsummarized = split.summaries, split.unsummarized
+        if len(unsummarized) >= max(SUMMARY_FOLD_BATCH_SIZE, 1):
+            summaries = await HistoryCompactorService._fold_all(
+                split, user_id, summary_repository
+            )
+            unsummarized = []
+        # Too few newly old messages to be worth a fold yet; they go verbatim
+        return HistoryCompactorService._assemble(summaries, unsummarized, split.recent)
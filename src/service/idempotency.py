@@ -0,0 +1,149 @@
+"""
+Idempotency keys: a retried request runs its work only once.
+
+A retry carrying the same key attaches to the attempt still in flight, or
+gets the completed result replayed until its TTL runs out. The store is
+in-memory, per process, and bounded; the least recently used keys go first.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+T = TypeVar("T")
+
+
+class IdempotencyKeyMismatch(Exception):
+    """Raised when a key is reused for a different request."""
+
+
+@dataclass
+class _Entry(Generic[T]):
+    # Identifies the request the key was first used for
+    fingerprint: str
+    result: "asyncio.Future[T]"
+    # Infinite while the work is in flight
+    expires_at: float
+
+
+class IdempotencyStore(Generic[T]):
+    """Bounded TTL store of in-flight and completed results by key."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, _Entry[T]] = OrderedDict()
+        self.replayed = 0
+        self.joined = 0
+        self.mismatched = 0
+        self.evictions = 0
+
+    def _get(self, key: str) -> _Entry[T] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry.expires_at:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def has(self, key: str) -> bool:
+        """Whether key has an attempt in flight or a result cached."""
+        return self._get(key) is not None
+
+    def _discard(self, key: str, entry: _Entry[T]) -> None:
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        work: Callable[[], Awaitable[T]],
+        cache_if: Callable[[T], bool] = lambda _: True,
+    ) -> T:
+        """Return the result of work for key, running it only if no attempt
+        with this key is in flight or cached.
+
+        Results for which cache_if is false (e.g. errors) are handed to the
+        attempts already waiting but not kept for later retries.
+        Raises IdempotencyKeyMismatch if key was used with another fingerprint.
+        """
+        while True:
+            entry = self._get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                self.mismatched += 1
+                raise IdempotencyKeyMismatch()
+            if entry.result.done():
+                self.replayed += 1
+            else:
+                self.joined += 1
+            try:
+                # Shielded: a retry giving up must not cancel the shared attempt
+                return await asyncio.shield(entry.result)
+            except asyncio.CancelledError:
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise
+                # The attempt we joined was cancelled; take over from it
+
+        if self.max_size <= 0:
+            return await work()
+
+        result: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        entry = _Entry(fingerprint, result, expires_at=float("inf"))
+        self._entries[key] = entry
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        try:
+            value = await work()
+        except Exception as e:
+            self._discard(key, entry)
+            result.set_exception(e)
+            # Mark it retrieved so it is not logged when nobody was waiting
+            result.exception()
+            raise
+        except BaseException:
+            self._discard(key, entry)
+            result.cancel()
+            raise
+
+        if cache_if(value):
+            entry.expires_at = time.monotonic() + self.ttl
+        else:
+            self._discard(key, entry)
+        result.set_result(value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        """Return the store size and counters."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "in_flight": sum(
+                not entry.result.done() for entry in self._entries.values()
+            ),
+            "replayed": self.replayed,
+            "joined": self.joined,
+            "mismatched": self.mismatched,
+            "evictions": self.evictions,
+        }
+
+
+# Responses of /api/v1/generate by user and Idempotency-Key
+generate_idempotency: IdempotencyStore[dict[str, Any]] = IdempotencyStore(
+    IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_KEYS
+)
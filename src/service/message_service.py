@@ -3,6 +3,8 @@ Message persistence service
 Project SteakHolder
 """
 
+import uuid
+
 from src.repository.model_repository import MessageRepository
 from src.models.message import Message
 from src.schemas.message_model import MessageType
@@ -36,6 +38,10 @@ class MessageService:
             type=MessageType.AI,
         )
 
+    async def delete_message(self, message: Message) -> None:
+        """Delete a saved message."""
+        await self.message_repository.delete_message(message)
+
     async def get_conversation_history(
         self, conversation_id: str, user_id: str
     ) -> list[Message]:
@@ -44,3 +50,12 @@ class MessageService:
             conversation_id=conversation_id,
             user_id=user_id,
         )
+
+    async def get_latest_message_id(
+        self, conversation_id: str, user_id: str
+    ) -> uuid.UUID | None:
+        """Return the id of the conversation's newest message, if any."""
+        return await self.message_repository.get_latest_message_id(
+            conversation_id=conversation_id,
+            user_id=user_id,
+        )
@@ -0,0 +1,65 @@
+"""
+Token estimates and per-model history budgets.
+
+Counting is pluggable: the default estimator divides UTF-8 length by four,
+which is close for English text with common BPE tokenizers and costs next to
+nothing. A real tokenizer can be installed with set_token_estimator().
+"""
+
+import json
+import math
+import os
+from typing import Protocol
+
+# Tokens of recent history sent verbatim when a model has no budget of its own
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "4000"))
+
+
+def parse_token_budgets(raw: str) -> dict[str, int]:
+    """Parse HISTORY_TOKEN_BUDGETS, a JSON object of model name to budget."""
+    if not raw:
+        return {}
+    try:
+        budgets = {str(model): int(budget) for model, budget in json.loads(raw).items()}
+    except (AttributeError, TypeError, ValueError) as e:
+        raise RuntimeError(f"Invalid HISTORY_TOKEN_BUDGETS: {e}") from e
+    return budgets
+
+
+_budgets = parse_token_budgets(os.environ.get("HISTORY_TOKEN_BUDGETS", ""))
+
+
+def get_history_token_budget(model_name: str) -> int:
+    """Return the recent-history token budget for model_name."""
+    return _budgets.get(model_name, HISTORY_TOKEN_BUDGET)
+
+
+class TokenEstimator(Protocol):
+    def count(self, text: str) -> int: ...
+
+
+class ByteLengthEstimator:
+    """Estimates tokens from UTF-8 byte length."""
+
+    def __init__(self, bytes_per_token: float = 4.0):
+        self.bytes_per_token = bytes_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text.encode()) / self.bytes_per_token)
+
+
+# Role markers and separators the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_estimator: TokenEstimator = ByteLengthEstimator()
+
+
+def set_token_estimator(estimator: TokenEstimator) -> None:
+    """Replace the estimator, e.g. with one backed by the model's tokenizer."""
+    global _estimator
+    _estimator = estimator
+
+
+def estimate_message_tokens(content: str) -> int:
+    """Estimate the tokens one chat message with this content takes."""
+    return _estimator.count(content) + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,95 @@
+"""
+Unit tests for the LLM model registry.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from src.agents.model_registry import ModelConfig, ModelRegistry, main_model_config
+
+
+class FakeProvider:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.client = MagicMock(close=AsyncMock())
+
+
+class FakeModel:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr("src.agents.model_registry.OpenAIProvider", FakeProvider)
+    monkeypatch.setattr("src.agents.model_registry.OpenAIChatModel", FakeModel)
+    return ModelRegistry()
+
+
+def test_main_model_config_reads_env_at_call_time(monkeypatch):
+    monkeypatch.setenv("AI_PROVIDER_BASE_URL", "http://ai.local")
+    monkeypatch.setenv("AI_PROVIDER_API_KEY", "key")
+    monkeypatch.setenv("AI_PROVIDER_MODEL", "model-x")
+
+    assert main_model_config() == ModelConfig("http://ai.local", "key", "model-x")
+
+
+def test_registry_builds_agents_on_first_use_only(registry):
+    factory = MagicMock(return_value=MagicMock())
+    registry.register("stakeholder", factory)
+    factory.assert_not_called()
+
+    agent = registry.get_agent("stakeholder")
+
+    assert registry.get_agent("stakeholder") is agent
+    factory.assert_called_once_with()
+
+
+def test_registry_rejects_unknown_agents(registry):
+    with pytest.raises(KeyError):
+        registry.get_agent("missing")
+
+
+def test_registry_shares_providers_between_models_on_one_endpoint(registry):
+    main = ModelConfig("http://ai.local", "key", "big-model")
+    cheap = ModelConfig("http://ai.local", "key", "small-model")
+    other = ModelConfig("http://other.local", "key", "big-model")
+
+    main_model = registry.get_model(main)
+
+    assert registry.get_model(main) is main_model
+    assert registry.get_model(cheap).kwargs["provider"] is main_model.kwargs["provider"]
+    assert (
+        registry.get_model(other).kwargs["provider"]
+        is not main_model.kwargs["provider"]
+    )
+    assert registry.stats()["models"] == 3
+    assert registry.stats()["providers"] == 2
+
+
+def test_warm_up_builds_every_registered_agent(registry):
+    registry.register("a", MagicMock())
+    registry.register("b", MagicMock())
+
+    registry.warm_up()
+
+    assert registry.stats()["agents"] == 2
+
+
+@pytest.mark.anyio
+async def test_aclose_closes_providers_and_allows_rebuilding(registry):
+    config = ModelConfig("http://ai.local", "key", "model-x")
+    factory = MagicMock(side_effect=lambda: registry.get_model(config))
+    registry.register("stakeholder", factory)
+    provider = registry.get_agent("stakeholder").kwargs["provider"]
+
+    await registry.aclose()
+
+    provider.client.close.assert_awaited_once()
+    assert registry.stats() == {
+        "registered_agents": 1,
+        "agents": 0,
+        "models": 0,
+        "providers": 0,
+    }
+    assert registry.get_agent("stakeholder").kwargs["provider"] is not provider
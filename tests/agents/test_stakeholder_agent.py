@@ -3,17 +3,23 @@ Unit tests for PydanticAI Stakeholder Agent.
 """
 
 import pytest
+from contextlib import asynccontextmanager
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 from pydantic_ai import ModelRequest, ModelResponse, UserPromptPart, TextPart
+from pydantic_ai.usage import RunUsage
 
+from src.agents.model_registry import ModelRegistry
 from src.agents.stakeholder_agent import (
     AgentDependencies,
     AgentResponse,
     create_stakeholder_agent,
     run_stakeholder_query,
     get_stakeholder_agent,
+    stream_stakeholder_query,
 )
+from src.exceptions.llm_overloaded_exception import LlmOverloadedException
+from src.limits.admission import AdmissionController, LlmPriority
 from src.schemas.persona_model import Persona
 from src.schemas.project_model import Project
 
@@ -136,6 +142,34 @@ async def test_run_stakeholder_query_success(
         assert deps.history == sample_history
 
 
+@pytest.mark.anyio
+async def test_run_stakeholder_query_charges_token_usage(
+    sample_persona, sample_project
+):
+    """Token usage is charged to the user the query runs for."""
+    mock_result = MagicMock()
+    mock_result.output = AgentResponse(content="ok")
+    mock_result.usage.return_value = RunUsage(input_tokens=120, output_tokens=30)
+
+    with (
+        patch("src.agents.stakeholder_agent.get_stakeholder_agent") as mock_get_agent,
+        patch("src.agents.stakeholder_agent.acharge_token_usage") as mock_charge,
+    ):
+        mock_get_agent.return_value.run = AsyncMock(return_value=mock_result)
+
+        await run_stakeholder_query(
+            message="hi",
+            persona=sample_persona,
+            project=sample_project,
+            history=[],
+            user_id="user-1",
+        )
+
+    mock_charge.assert_called_once_with(
+        "user-1", RunUsage(input_tokens=120, output_tokens=30)
+    )
+
+
 @pytest.mark.anyio
 async def test_run_stakeholder_query_with_empty_history(sample_persona, sample_project):
     """Test stakeholder query with no conversation history."""
@@ -222,8 +256,9 @@ def test_create_stakeholder_agent_builds_prompt(
     monkeypatch.setenv("AI_PROVIDER_BASE_URL", "http://ai.local")
     monkeypatch.setenv("AI_PROVIDER_API_KEY", "key")
     monkeypatch.setenv("AI_PROVIDER_MODEL", "model-x")
-    monkeypatch.setattr("src.agents.stakeholder_agent.OpenAIProvider", FakeProvider)
-    monkeypatch.setattr("src.agents.stakeholder_agent.OpenAIChatModel", FakeModel)
+    monkeypatch.setattr("src.agents.stakeholder_agent.model_registry", ModelRegistry())
+    monkeypatch.setattr("src.agents.model_registry.OpenAIProvider", FakeProvider)
+    monkeypatch.setattr("src.agents.model_registry.OpenAIChatModel", FakeModel)
     monkeypatch.setattr("src.agents.stakeholder_agent.Agent", FakeAgent)
 
     agent = create_stakeholder_agent()
@@ -259,3 +294,114 @@ async def test_run_stakeholder_query_wraps_unexpected_exception(
                 project=sample_project,
                 history=[],
             )
+
+
+@pytest.mark.anyio
+async def test_run_stakeholder_query_is_shed_when_backend_is_saturated(
+    sample_persona, sample_project, monkeypatch
+):
+    """Calls not admitted before the queue deadline fail with a 503."""
+    admission = AdmissionController(limit=1, wait_timeout=0)
+    monkeypatch.setattr("src.agents.stakeholder_agent.llm_admission", admission)
+    with patch("src.agents.stakeholder_agent.get_stakeholder_agent") as mock_get_agent:
+        mock_agent = MagicMock()
+        mock_agent.run = AsyncMock()
+        mock_get_agent.return_value = mock_agent
+
+        async with admission.admit(LlmPriority.background):
+            with pytest.raises(LlmOverloadedException) as exc_info:
+                await run_stakeholder_query(
+                    message="hello",
+                    persona=sample_persona,
+                    project=sample_project,
+                    history=[],
+                )
+
+    assert exc_info.value.status_code == 503
+    mock_agent.run.assert_not_awaited()
+
+
+def make_streaming_agent(*partials, error=None):
+    """Agent mock whose run_stream yields the given partial replies."""
+    result = MagicMock()
+    result.usage.return_value = RunUsage(input_tokens=50, output_tokens=10)
+
+    async def stream_output():
+        for partial in partials:
+            yield AgentResponse(content=partial)
+        if error is not None:
+            raise error
+
+    result.stream_output = stream_output
+
+    @asynccontextmanager
+    async def run_stream(*_args, **_kwargs):
+        yield result
+
+    agent = MagicMock()
+    agent.run_stream = run_stream
+    return agent
+
+
+@pytest.mark.anyio
+async def test_stream_stakeholder_query_yields_new_text(sample_persona, sample_project):
+    agent = make_streaming_agent("We", "We have", "We have", "We have bikes.")
+    with (
+        patch("src.agents.stakeholder_agent.get_stakeholder_agent", return_value=agent),
+        patch("src.agents.stakeholder_agent.acharge_token_usage") as mock_charge,
+    ):
+        deltas = [
+            delta
+            async for delta in stream_stakeholder_query(
+                message="hi",
+                persona=sample_persona,
+                project=sample_project,
+                history=[],
+                user_id="user-1",
+            )
+        ]
+
+    assert deltas == ["We", " have", " bikes."]
+    mock_charge.assert_called_once_with(
+        "user-1", RunUsage(input_tokens=50, output_tokens=10)
+    )
+
+
+@pytest.mark.anyio
+async def test_stream_stakeholder_query_charges_abandoned_streams(
+    sample_persona, sample_project
+):
+    agent = make_streaming_agent("We", "We have")
+    with (
+        patch("src.agents.stakeholder_agent.get_stakeholder_agent", return_value=agent),
+        patch("src.agents.stakeholder_agent.acharge_token_usage") as mock_charge,
+    ):
+        stream = stream_stakeholder_query(
+            message="hi",
+            persona=sample_persona,
+            project=sample_project,
+            history=[],
+            user_id="user-1",
+        )
+        assert await anext(stream) == "We"
+        await stream.aclose()
+
+    mock_charge.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_stream_stakeholder_query_wraps_exceptions(
+    sample_persona, sample_project
+):
+    agent = make_streaming_agent("We", error=RuntimeError("llm down"))
+    with patch(
+        "src.agents.stakeholder_agent.get_stakeholder_agent", return_value=agent
+    ):
+        with pytest.raises(Exception, match="Error running stakeholder agent"):
+            async for _ in stream_stakeholder_query(
+                message="hi",
+                persona=sample_persona,
+                project=sample_project,
+                history=[],
+            ):
+                pass
@@ -1,15 +1,45 @@
 """Unit tests for AI controller."""
 
-from unittest.mock import AsyncMock, MagicMock
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi import HTTPException
 
-from src.controllers.ai_controller import generate
+from src.controllers.ai_controller import (
+    generate,
+    generate_stream,
+    get_generation_job,
+)
+from src.dependencies.disconnect import ClientDisconnected
+from src.exceptions.authentication_error import AuthenticationError
+from src.exceptions.llm_response_exception import LlmResponseException
 from src.schemas.ai import GenerateRequest, GenerateResponse, MessageType
+from src.schemas.message_model import Message
+from src.service.agent_service import AgentService
+from src.service.generation_jobs import JobStatus
 from src.dependencies.user import AuthenticatedUser
 
 
+class PassThroughWatcher:
+    """Disconnect watcher for a client that never disconnects."""
+
+    async def run(self, work, route):
+        return await work
+
+
+class DisconnectedWatcher:
+    """Disconnect watcher for a client that has already gone away."""
+
+    async def run(self, work, route):
+        work.close()
+        raise ClientDisconnected()
+
+
 @pytest.mark.anyio
 async def test_ai_controller_generate_success_and_error():
     payload = GenerateRequest(conversation_id="conv-1", content="hello world")
@@ -20,7 +50,16 @@ async def test_ai_controller_generate_success_and_error():
         return_value={"status": "success", "response": "hi"}
     )
 
-    result = await generate(payload, current_user, wide_event, agent_service, None)
+    result = await generate(
+        payload,
+        current_user,
+        wide_event,
+        agent_service,
+        None,
+        None,
+        None,
+        PassThroughWatcher(),
+    )
 
     assert isinstance(result, GenerateResponse)
     assert result.content == "hi"
@@ -31,7 +70,16 @@ async def test_ai_controller_generate_success_and_error():
         return_value={"status": "error", "details": "x"}
     )
     with pytest.raises(HTTPException, match="Error processing agent query"):
-        await generate(payload, current_user, wide_event, agent_service, None)
+        await generate(
+            payload,
+            current_user,
+            wide_event,
+            agent_service,
+            None,
+            None,
+            None,
+            PassThroughWatcher(),
+        )
 
 
 @pytest.mark.anyio
@@ -51,6 +99,530 @@ async def test_ai_controller_generate_rate_limit_is_a_dependency():
         return_value={"status": "success", "response": "ok"}
     )
 
-    result = await generate(payload, current_user, wide_event, agent_service, None)
+    result = await generate(
+        payload,
+        current_user,
+        wide_event,
+        agent_service,
+        None,
+        None,
+        None,
+        PassThroughWatcher(),
+    )
 
     assert isinstance(result, GenerateResponse)
+
+
+@pytest.mark.anyio
+async def test_ai_controller_generate_records_client_disconnects():
+    payload = GenerateRequest(conversation_id="conv-1", content="hello")
+    current_user = AuthenticatedUser(user_id="user-1")
+    wide_event = MagicMock()
+    agent_service = MagicMock()
+    agent_service.process_agent_query = AsyncMock()
+
+    result = await generate(
+        payload,
+        current_user,
+        wide_event,
+        agent_service,
+        None,
+        None,
+        None,
+        DisconnectedWatcher(),
+    )
+
+    assert result.status_code == 499
+    final_context = wide_event.add_context.call_args.kwargs
+    assert final_context["ai_service_process_message_status"] == "cancelled"
+    assert final_context["client_disconnected"] is True
+
+
+@pytest.mark.anyio
+async def test_ai_controller_generate_replays_idempotent_retries(monkeypatch):
+    from src.controllers import ai_controller
+    from src.service.idempotency import IdempotencyStore
+
+    monkeypatch.setattr(ai_controller, "generate_idempotency", IdempotencyStore(60, 10))
+    payload = GenerateRequest(conversation_id="conv-1", content="hello")
+    current_user = AuthenticatedUser(user_id="user-1")
+    agent_service = MagicMock()
+    agent_service.process_agent_query = AsyncMock(
+        return_value={"status": "success", "response": "hi"}
+    )
+
+    for _ in range(2):
+        result = await generate(
+            payload,
+            current_user,
+            MagicMock(),
+            agent_service,
+            None,
+            None,
+            None,
+            DisconnectedWatcher(),
+            idempotency_key="retry-1",
+        )
+        assert result.content == "hi"
+
+    agent_service.process_agent_query.assert_awaited_once()
+
+    other = GenerateRequest(conversation_id="conv-1", content="something else")
+    with pytest.raises(HTTPException) as exc_info:
+        await generate(
+            other,
+            current_user,
+            MagicMock(),
+            agent_service,
+            None,
+            None,
+            None,
+            PassThroughWatcher(),
+            idempotency_key="retry-1",
+        )
+    assert exc_info.value.status_code == 422
+
+
+class InMemoryMessages:
+    """Message service keeping one conversation's messages in a list."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def _save(self, conversation_id, user_id, content, type):
+        message = Message(
+            id=uuid.uuid4(),
+            conversation_id=uuid.uuid5(uuid.NAMESPACE_OID, conversation_id),
+            content=content,
+            type=type,
+        )
+        self.messages.append(message)
+        return message
+
+    async def save_user_message(self, conversation_id, user_id, content):
+        return await self._save(conversation_id, user_id, content, "user")
+
+    async def save_ai_message(self, conversation_id, user_id, content):
+        return await self._save(conversation_id, user_id, content, "ai")
+
+    async def delete_message(self, message):
+        self.messages.remove(message)
+
+    async def get_conversation_history(self, conversation_id, user_id):
+        return list(self.messages)
+
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    from src.controllers import ai_controller
+    from src.service import generation_jobs
+    from src.service.background_worker import BackgroundWorker
+    from src.service.generation_jobs import GenerationJobStore
+
+    store = GenerationJobStore(60, 10)
+    worker = BackgroundWorker("generation-jobs", concurrency=2, max_queue_size=2)
+    for module in (ai_controller, generation_jobs):
+        monkeypatch.setattr(module, "generation_jobs", store)
+        monkeypatch.setattr(module, "generation_job_worker", worker)
+    return store, worker
+
+
+@pytest.fixture
+def async_agent_service(mock_persona_service, mock_project_service, monkeypatch):
+    """AgentService on an in-memory conversation, also used by queued jobs."""
+    from src.service import generation_jobs
+
+    service = AgentService(
+        persona_service=mock_persona_service,
+        project_service=mock_project_service,
+        message_service=InMemoryMessages(),
+    )
+
+    async def run_generation_job(job, content, message_id):
+        result = await service.respond_to_saved_message(
+            job.user_id, job.conversation_id, content, message_id
+        )
+        job.finish(JobStatus.succeeded, response=result["response"])
+
+    monkeypatch.setattr(generation_jobs, "run_generation_job", run_generation_job)
+    return service
+
+
+async def submit_async(agent_service, content):
+    return await generate(
+        GenerateRequest(conversation_id="conv-1", content=content),
+        AuthenticatedUser(user_id="user-1"),
+        MagicMock(),
+        agent_service,
+        None,
+        None,
+        None,
+        PassThroughWatcher(),
+        prefer="respond-async",
+    )
+
+
+@pytest.mark.anyio
+async def test_ai_controller_generate_async_returns_a_job(
+    job_queue, async_agent_service
+):
+    _, worker = job_queue
+    messages = async_agent_service.message_service.messages
+
+    result = await submit_async(async_agent_service, "hello")
+
+    assert result.status_code == 202
+    body = json.loads(result.body)
+    assert body["status"] == "queued"
+    assert result.headers["location"] == f"/api/v1/generate/jobs/{body['job_id']}"
+    assert [message.content for message in messages] == ["hello"]
+    assert worker.stats()["queue_depth"] == 1
+
+    await submit_async(async_agent_service, "again")
+    # The queue is full: shed before saving another message
+    with pytest.raises(HTTPException) as exc_info:
+        await submit_async(async_agent_service, "one more")
+    assert exc_info.value.status_code == 503
+    assert [message.content for message in messages] == ["hello", "again"]
+
+
+@pytest.mark.anyio
+async def test_ai_controller_async_jobs_count_against_the_user_cap(
+    job_queue, async_agent_service, monkeypatch
+):
+    from src.limits.concurrency import generation_limiter
+
+    store, _ = job_queue
+    monkeypatch.setattr(generation_limiter, "limit", 1)
+    messages = async_agent_service.message_service.messages
+
+    first = await submit_async(async_agent_service, "hello")
+    # The first job is still queued: rejected before saving another message
+    with pytest.raises(HTTPException) as exc_info:
+        await submit_async(async_agent_service, "again")
+    assert exc_info.value.status_code == 429
+    assert [message.content for message in messages] == ["hello"]
+
+    store.get(json.loads(first.body)["job_id"], "user-1").finish(
+        JobStatus.succeeded, response="hi"
+    )
+    assert (await submit_async(async_agent_service, "again")).status_code == 202
+
+
+@pytest.mark.anyio
+async def test_ai_controller_async_jobs_answer_only_their_own_message(
+    job_queue, async_agent_service
+):
+    store, worker = job_queue
+    seen = {}
+
+    async def run_query(message, history, **_kwargs):
+        seen[message] = history
+        return f"re: {message}"
+
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            AsyncMock(side_effect=lambda messages, **_: [m.content for m in messages]),
+        ),
+        patch("src.service.agent_service.run_stakeholder_query", run_query),
+    ):
+        first = await submit_async(async_agent_service, "first")
+        second = await submit_async(async_agent_service, "second")
+        worker.start()
+        await worker.join()
+        await worker.stop()
+
+    # Both user messages were saved before either reply, but each job only
+    # sees the conversation up to its own message
+    assert seen["first"] == ["first"]
+    assert seen["second"][:2] == ["first", "second"]
+    for response in (first, second):
+        job = store.get(json.loads(response.body)["job_id"], "user-1")
+        assert job.status is JobStatus.succeeded
+
+
+@pytest.mark.anyio
+async def test_get_generation_job_long_polls_for_the_result(job_queue):
+    store, _ = job_queue
+    job = store.create("user-1", "conv-1")
+
+    pending = await get_generation_job(job.id, AuthenticatedUser(user_id="user-1"))
+    assert pending.status == "queued"
+    assert pending.content is None
+
+    async def finish_soon():
+        await asyncio.sleep(0.01)
+        job.finish(JobStatus.succeeded, response="hi")
+
+    finisher = asyncio.create_task(finish_soon())
+    result = await get_generation_job(
+        job.id, AuthenticatedUser(user_id="user-1"), wait=5
+    )
+    await finisher
+    assert result.status == "succeeded"
+    assert result.content == "hi"
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_generation_job(job.id, AuthenticatedUser(user_id="user-2"))
+    assert exc_info.value.status_code == 404
+
+
+def test_idempotent_replay_is_exempt_from_the_user_limits(monkeypatch):
+    """A retry answered from the store gets its response even when the user is
+    out of rate limit and concurrency slots; a new request does not."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.controllers import ai_controller
+    from src.dependencies import (
+        get_agent_service,
+        get_current_user,
+        get_wide_event,
+        rate_limiter,
+    )
+    from src.dependencies import concurrency, idempotency
+    from src.limits.concurrency import ConcurrencyLimiter
+    from src.service.idempotency import IdempotencyStore
+
+    store = IdempotencyStore(60, 10)
+    monkeypatch.setattr(ai_controller, "generate_idempotency", store)
+    monkeypatch.setattr(idempotency, "generate_idempotency", store)
+    limiter = ConcurrencyLimiter(limit=1, wait_timeout=0)
+    monkeypatch.setattr(concurrency, "generation_limiter", limiter)
+    rate_limit = MagicMock()
+    monkeypatch.setattr(rate_limiter, "rate_limit", rate_limit)
+    agent_service = MagicMock()
+    agent_service.process_agent_query = AsyncMock(
+        return_value={"status": "success", "response": "hi"}
+    )
+
+    app = FastAPI()
+    app.include_router(ai_controller.router)
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser("user-1")
+    app.dependency_overrides[get_wide_event] = lambda: MagicMock()
+    app.dependency_overrides[get_agent_service] = lambda: agent_service
+    client = TestClient(app)
+    body = {"conversation_id": "conv-1", "content": "hello"}
+
+    first = client.post(
+        "/api/v1/generate", json=body, headers={"Idempotency-Key": "retry-1"}
+    )
+    assert first.status_code == 200
+    assert rate_limit.call_count == 1
+
+    # The user is now out of requests, and their only slot is taken
+    rate_limit.side_effect = HTTPException(429, detail="Rate limit exceeded")
+
+    async def hold_slot_and_retry():
+        async with limiter.acquire("user-1"):
+            return client.post(
+                "/api/v1/generate", json=body, headers={"Idempotency-Key": "retry-1"}
+            )
+
+    retry = asyncio.run(hold_slot_and_retry())
+    assert retry.status_code == 200
+    assert retry.json()["content"] == "hi"
+    agent_service.process_agent_query.assert_awaited_once()
+
+    fresh = client.post(
+        "/api/v1/generate", json=body, headers={"Idempotency-Key": "retry-2"}
+    )
+    assert fresh.status_code == 429
+
+
+def make_stream_service(*deltas, error=None):
+    async def stream_agent_query(**_kwargs):
+        for delta in deltas:
+            yield delta
+        if error is not None:
+            raise error
+
+    agent_service = MagicMock()
+    agent_service.stream_agent_query = stream_agent_query
+    return agent_service
+
+
+async def read_events(response) -> list[tuple[str, dict]]:
+    events = []
+    async for chunk in response.body_iterator:
+        event_line, data_line = chunk.strip().split("\n")
+        events.append((event_line.removeprefix("event: "), json.loads(data_line[6:])))
+    return events
+
+
+@pytest.mark.anyio
+async def test_ai_controller_generate_stream_sends_deltas_then_done():
+    payload = GenerateRequest(conversation_id="conv-1", content="hello world")
+    current_user = AuthenticatedUser(user_id="user-1")
+    wide_event = MagicMock()
+    agent_service = make_stream_service("We have ", "bikes.")
+
+    response = await generate_stream(
+        payload, current_user, wide_event, agent_service, None, None, None
+    )
+
+    assert response.media_type == "text/event-stream"
+    assert wide_event.emit_after_body is True
+    assert await read_events(response) == [
+        ("delta", {"content": "We have "}),
+        ("delta", {"content": "bikes."}),
+        (
+            "done",
+            {"conversation_id": "conv-1", "content": "We have bikes.", "type": "ai"},
+        ),
+    ]
+    final_context = wide_event.add_context.call_args.kwargs
+    assert final_context["ai_service_process_message_status"] == "success"
+    assert final_context["ai_service_response_length"] == len("We have bikes.")
+
+
+@pytest.mark.anyio
+async def test_ai_controller_generate_stream_reports_errors_in_stream():
+    payload = GenerateRequest(conversation_id="conv-1", content="hello world")
+    current_user = AuthenticatedUser(user_id="user-1")
+    wide_event = MagicMock()
+    agent_service = make_stream_service(
+        "We", error=LlmResponseException(message="LLM timeout")
+    )
+
+    response = await generate_stream(
+        payload, current_user, wide_event, agent_service, None, None, None
+    )
+
+    events = await read_events(response)
+    assert events[-1] == (
+        "error",
+        {"error": "LLM_RESPONSE_ERROR", "message": "Error processing agent query"},
+    )
+    final_context = wide_event.add_context.call_args.kwargs
+    assert final_context["ai_service_process_message_status"] == "error"
+
+
+@pytest.mark.anyio
+async def test_ai_controller_generate_stream_records_disconnects():
+    payload = GenerateRequest(conversation_id="conv-1", content="hello world")
+    current_user = AuthenticatedUser(user_id="user-1")
+    wide_event = MagicMock()
+    agent_service = make_stream_service("We ", "have ", "bikes.")
+
+    response = await generate_stream(
+        payload, current_user, wide_event, agent_service, None, None, None
+    )
+    await anext(response.body_iterator)
+    await response.body_iterator.aclose()
+
+    final_context = wide_event.add_context.call_args.kwargs
+    assert final_context["ai_service_process_message_status"] == "disconnected"
+    assert final_context["ai_service_response_length"] == len("We ")
+
+
+@pytest.fixture
+def session_client(monkeypatch):
+    """TestClient for the WebSocket endpoint with auth and limits stubbed."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.controllers import ai_controller
+    from src.dependencies import get_session_agent_service
+
+    async def authenticate(token):
+        if token == "expired-token":
+            return AuthenticatedUser(user_id="user-1", expires_at=time.time() - 1)
+        if token != "good-token":
+            raise AuthenticationError("Invalid token")
+        return AuthenticatedUser(user_id="user-1")
+
+    monkeypatch.setattr(ai_controller, "authenticate_token", authenticate)
+    monkeypatch.setattr(ai_controller, "rate_limit", MagicMock())
+    monkeypatch.setattr(ai_controller, "enforce_token_quota", MagicMock())
+
+    agent_service = make_stream_service("We have ", "bikes.")
+
+    class FakeAgentSession:
+        @asynccontextmanager
+        async def turn(self):
+            yield agent_service
+
+    app = FastAPI()
+    app.include_router(ai_controller.router)
+    app.dependency_overrides[get_session_agent_service] = FakeAgentSession
+    return TestClient(app)
+
+
+def test_generate_session_streams_turns_over_one_connection(session_client):
+    with session_client.websocket_connect(
+        "/api/v1/generate/ws", headers={"Authorization": "Bearer good-token"}
+    ) as ws:
+        for _ in range(2):
+            ws.send_json({"conversation_id": "conv-1", "content": "hello"})
+            assert ws.receive_json() == {"type": "delta", "content": "We have "}
+            assert ws.receive_json() == {"type": "delta", "content": "bikes."}
+            assert ws.receive_json() == {
+                "type": "done",
+                "response": {
+                    "conversation_id": "conv-1",
+                    "content": "We have bikes.",
+                    "type": "ai",
+                },
+            }
+
+
+def test_generate_session_accepts_token_as_first_message(session_client):
+    with session_client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json({"token": "good-token"})
+        ws.send_json({"conversation_id": "conv-1", "content": "hello"})
+        assert ws.receive_json()["type"] == "delta"
+
+
+def test_generate_session_closes_on_bad_token(session_client):
+    from starlette.websockets import WebSocketDisconnect
+
+    with session_client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json({"token": "bad-token"})
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            ws.receive_json()
+
+    assert exc_info.value.code == 1008
+
+
+def test_generate_session_closes_once_the_token_expires(session_client):
+    from starlette.websockets import WebSocketDisconnect
+
+    with session_client.websocket_connect(
+        "/api/v1/generate/ws", headers={"Authorization": "Bearer expired-token"}
+    ) as ws:
+        ws.send_json({"conversation_id": "conv-1", "content": "hello"})
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            ws.receive_json()
+
+    assert exc_info.value.code == 1008
+
+
+def test_generate_session_reports_bad_messages_and_keeps_going(session_client):
+    with session_client.websocket_connect(
+        "/api/v1/generate/ws", headers={"Authorization": "Bearer good-token"}
+    ) as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["error"] == "VALIDATION_ERROR"
+        ws.send_json({"conversation_id": "conv-1", "content": "hello"})
+        assert ws.receive_json()["type"] == "delta"
+
+
+def test_generate_session_reports_limits_per_turn(session_client, monkeypatch):
+    from src.controllers import ai_controller
+
+    monkeypatch.setattr(
+        ai_controller,
+        "rate_limit",
+        MagicMock(side_effect=HTTPException(429, detail="Rate limit exceeded")),
+    )
+    with session_client.websocket_connect(
+        "/api/v1/generate/ws", headers={"Authorization": "Bearer good-token"}
+    ) as ws:
+        ws.send_json({"conversation_id": "conv-1", "content": "hello"})
+        assert ws.receive_json() == {
+            "type": "error",
+            "error": "HTTP_ERROR",
+            "message": "Rate limit exceeded",
+        }
@@ -0,0 +1,27 @@
+"""Unit tests for the per-user generation concurrency dependency."""
+
+import pytest
+from fastapi import HTTPException
+
+from src.dependencies import concurrency
+from src.dependencies.concurrency import limit_concurrency
+from src.dependencies.user import AuthenticatedUser
+from src.limits.concurrency import ConcurrencyLimiter
+
+
+@pytest.mark.anyio
+async def test_limit_concurrency_rejects_with_429(monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, wait_timeout=0)
+    monkeypatch.setattr(concurrency, "generation_limiter", limiter)
+    user = AuthenticatedUser(user_id="user-1")
+
+    first = limit_concurrency(user)
+    await anext(first)
+    with pytest.raises(HTTPException) as exc_info:
+        await anext(limit_concurrency(user))
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    with pytest.raises(StopAsyncIteration):
+        await anext(first)
+    assert limiter.stats()["in_flight"] == 0
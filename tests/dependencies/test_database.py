@@ -2,8 +2,15 @@
 
 from unittest.mock import MagicMock
 
-from src.dependencies.database import get_message_repository, get_message_service
-from src.repository.model_repository import MessageRepository
+from src.dependencies.database import (
+    get_conversation_summary_repository,
+    get_message_repository,
+    get_message_service,
+)
+from src.repository.model_repository import (
+    ConversationSummaryRepository,
+    MessageRepository,
+)
 
 
 def test_dependencies_database_factories():
@@ -14,3 +21,11 @@ def test_dependencies_database_factories():
     assert isinstance(repo, MessageRepository)
     assert repo.session is session
     assert service.message_repository is repo
+
+
+def test_dependencies_conversation_summary_repository_factory():
+    session = MagicMock()
+    repo = get_conversation_summary_repository(session)
+
+    assert isinstance(repo, ConversationSummaryRepository)
+    assert repo.session is session
@@ -0,0 +1,70 @@
+"""Unit tests for the client disconnect watcher."""
+
+import asyncio
+
+import pytest
+
+from src.dependencies.disconnect import (
+    ClientDisconnected,
+    DisconnectWatcher,
+    client_disconnects,
+)
+
+
+class FakeRequest:
+    """Request whose client disconnects once disconnected is set."""
+
+    def __init__(self):
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+
+@pytest.mark.anyio
+async def test_run_returns_the_result_while_the_client_is_connected():
+    watcher = DisconnectWatcher(FakeRequest())
+
+    async def work():
+        return "done"
+
+    assert await watcher.run(work(), route="test") == "done"
+
+
+@pytest.mark.anyio
+async def test_run_cancels_work_when_the_client_disconnects():
+    request = FakeRequest()
+    watcher = DisconnectWatcher(request)
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    before = client_disconnects.stats().get("test", 0)
+    run = asyncio.create_task(watcher.run(work(), route="test"))
+    await started.wait()
+    request.disconnected.set()
+
+    with pytest.raises(ClientDisconnected):
+        await run
+
+    assert cancelled.is_set()
+    assert client_disconnects.stats()["test"] == before + 1
+
+
+@pytest.mark.anyio
+async def test_run_propagates_errors_from_the_work():
+    watcher = DisconnectWatcher(FakeRequest())
+
+    async def work():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        await watcher.run(work(), route="test")
@@ -1,40 +1,43 @@
 """Unit tests for the rate limiter dependency."""
 
-from datetime import UTC, datetime, timedelta
-
 import pytest
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
 
-from src.dependencies.rate_limiter import _buckets, rate_limit
+from src.dependencies import rate_limiter
+from src.dependencies.rate_limiter import RateLimiter, rate_limit
 from src.dependencies.user import AuthenticatedUser
+from src.limits import backends
+from src.limits import policies
+from src.limits.backends import InMemoryRateLimitBackend
+from src.limits.policies import RateLimitPolicy
 
 
 @pytest.fixture(autouse=True)
-def clear_buckets():
-    """Reset in-memory state between tests."""
-    _buckets.clear()
-    yield
-    _buckets.clear()
+def backend(monkeypatch):
+    """Give every test its own in-memory backend."""
+    backend = InMemoryRateLimitBackend()
+    monkeypatch.setattr(rate_limiter, "get_rate_limit_backend", lambda: backend)
+    return backend
 
 
-def make_user(user_id: str = "user-1"):
-    return AuthenticatedUser(user_id=user_id)
+def make_user(user_id: str = "user-1", role: str = "authenticated"):
+    return AuthenticatedUser(user_id=user_id, role=role)
 
 
 def test_rate_limit_allows_requests_within_limit():
     """5 requests from the same user should all pass."""
     user = make_user()
     for _ in range(5):
-        rate_limit(user)  # must not raise
+        rate_limit(user, Response())  # must not raise
 
 
 def test_rate_limit_blocks_on_sixth_request():
     """The 6th request from the same user within the window raises 429."""
     user = make_user()
     for _ in range(5):
-        rate_limit(user)
+        rate_limit(user, Response())
     with pytest.raises(HTTPException) as exc_info:
-        rate_limit(user)
+        rate_limit(user, Response())
     assert exc_info.value.status_code == 429
 
 
@@ -43,28 +46,82 @@ def test_rate_limit_isolates_users():
     user_a = make_user("user-a")
     user_b = make_user("user-b")
     for _ in range(5):
-        rate_limit(user_a)
+        rate_limit(user_a, Response())
     # user_b should still pass
-    rate_limit(user_b)  # must not raise
+    rate_limit(user_b, Response())  # must not raise
 
 
-def test_rate_limit_evicts_old_entries():
+def test_rate_limit_evicts_old_entries(monkeypatch):
     """Entries older than 60 seconds are evicted; request should pass."""
     user = make_user()
-    old_time = datetime.now(UTC) - timedelta(seconds=61)
-    # Inject 5 old timestamps directly into the bucket
+    clock = [1000.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
     for _ in range(5):
-        _buckets[user.user_id].append(old_time)
+        rate_limit(user, Response())
+    clock[0] += 61
     # All 5 are expired, so this request should pass
-    rate_limit(user)  # must not raise
+    rate_limit(user, Response())  # must not raise
 
 
-def test_rate_limit_counts_recent_entries():
+def test_rate_limit_counts_recent_entries(monkeypatch):
     """Entries within the window (59s old) still count toward the limit."""
     user = make_user()
-    recent_time = datetime.now(UTC) - timedelta(seconds=59)
+    clock = [1000.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
     for _ in range(5):
-        _buckets[user.user_id].append(recent_time)
+        rate_limit(user, Response())
+    clock[0] += 59
     with pytest.raises(HTTPException) as exc_info:
-        rate_limit(user)
+        rate_limit(user, Response())
     assert exc_info.value.status_code == 429
+
+
+def test_rate_limit_sets_ratelimit_headers():
+    response = Response()
+    rate_limit(make_user(), response)
+
+    assert response.headers["RateLimit-Limit"] == "5"
+    assert response.headers["RateLimit-Remaining"] == "4"
+    assert response.headers["RateLimit-Reset"] == "60"
+    assert response.headers["RateLimit-Policy"] == "5;w=60"
+
+
+def test_rate_limit_rejection_carries_retry_after():
+    user = make_user()
+    for _ in range(5):
+        rate_limit(user, Response())
+    with pytest.raises(HTTPException) as exc_info:
+        rate_limit(user, Response())
+
+    headers = exc_info.value.headers
+    assert headers["RateLimit-Remaining"] == "0"
+    assert headers["Retry-After"] == "60"
+
+
+def test_rate_limit_applies_tier_policy(monkeypatch):
+    """A tier with its own GCRA policy gets its own limit and burst."""
+    monkeypatch.setattr(
+        policies,
+        "_policies",
+        {
+            "default": {"default": RateLimitPolicy(limit=5, period=60.0)},
+            "search": {
+                "service": RateLimitPolicy(
+                    limit=600, period=60.0, algorithm="gcra", burst=2
+                )
+            },
+        },
+    )
+    limiter = RateLimiter("search")
+    service_user = make_user("svc", role="service")
+
+    response = Response()
+    limiter(service_user, response)
+    assert response.headers["RateLimit-Policy"] == "600;w=60;burst=2"
+    limiter(service_user, Response())
+    with pytest.raises(HTTPException) as exc_info:
+        limiter(service_user, Response())
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    # Other tiers on the same route fall back to the default policy
+    limiter(make_user("regular"), Response())
@@ -1,9 +1,13 @@
 """Unit tests for service dependency factories."""
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
+
+from src.dependencies import services
 from src.dependencies.services import (
     get_agent_service,
+    get_session_agent_service,
     get_persona_service,
     get_project_service,
 )
@@ -17,12 +21,39 @@ def test_dependencies_service_factories():
     assert project_service.__class__.__name__ == "ProjectService"
 
     message_service = MagicMock()
+    summary_repository = MagicMock()
     with (
         patch("src.dependencies.services.get_persona_service", return_value="persona"),
         patch("src.dependencies.services.get_project_service", return_value="project"),
     ):
-        agent_service = get_agent_service(message_service)
+        agent_service = get_agent_service(message_service, summary_repository)
 
     assert agent_service.message_service is message_service
+    assert agent_service.summary_repository is summary_repository
     assert agent_service.persona_service == "persona"
     assert agent_service.project_service == "project"
+
+
+@pytest.mark.anyio
+async def test_agent_session_uses_a_database_session_per_turn(monkeypatch):
+    sessions = [MagicMock(), MagicMock()]
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock(side_effect=sessions)
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=None)
+    monkeypatch.setattr(services, "SessionLocal", session_factory)
+    agent_session = get_session_agent_service()
+
+    seen = []
+    for _ in range(2):
+        async with agent_session.turn() as agent_service:
+            seen.append(agent_service)
+            assert agent_service.keep_context
+            assert agent_service.summary_repository.session is sessions[len(seen) - 1]
+            assert (
+                agent_service.message_service.message_repository.session
+                is sessions[len(seen) - 1]
+            )
+
+    # The same service, so its warm context carries over between turns
+    assert seen[0] is seen[1]
+    assert session_factory.return_value.__aexit__.await_count == 2
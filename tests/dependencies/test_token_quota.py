@@ -0,0 +1,51 @@
+"""Unit tests for the LLM token quota dependency."""
+
+import pytest
+from fastapi import HTTPException, Response
+from pydantic_ai.usage import RunUsage
+
+from src.dependencies.token_quota import enforce_token_quota
+from src.dependencies.user import AuthenticatedUser
+from src.limits import quota
+from src.limits.backends import InMemoryRateLimitBackend
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    backend = InMemoryRateLimitBackend()
+    monkeypatch.setattr(quota, "get_rate_limit_backend", lambda: backend)
+    monkeypatch.setattr(quota, "LLM_TOKEN_QUOTA", 1000)
+    monkeypatch.setattr(quota, "LLM_TOKEN_QUOTA_WINDOW_SECONDS", 3600.0)
+    return backend
+
+
+def test_token_quota_allows_user_under_budget():
+    user = AuthenticatedUser(user_id="user-1")
+    quota.charge_token_usage("user-1", RunUsage(input_tokens=400, output_tokens=100))
+
+    response = Response()
+    enforce_token_quota(user, response)
+
+    assert response.headers["X-Token-Quota-Limit"] == "1000"
+    assert response.headers["X-Token-Quota-Remaining"] == "500"
+
+
+def test_token_quota_rejects_user_over_budget():
+    user = AuthenticatedUser(user_id="user-1")
+    quota.charge_token_usage("user-1", RunUsage(input_tokens=900, output_tokens=200))
+
+    with pytest.raises(HTTPException) as exc_info:
+        enforce_token_quota(user, Response())
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["X-Token-Quota-Remaining"] == "0"
+    assert exc_info.value.headers["Retry-After"] == "3600"
+
+
+def test_token_quota_disabled(monkeypatch, backend):
+    monkeypatch.setattr(quota, "LLM_TOKEN_QUOTA", 0)
+    response = Response()
+
+    enforce_token_quota(AuthenticatedUser(user_id="user-1"), response)
+
+    assert "X-Token-Quota-Limit" not in response.headers
@@ -6,8 +6,40 @@ import time
 import pytest
 from unittest.mock import patch
 
+from src.dependencies import user as user_module
 from src.dependencies.user import get_current_user, AuthenticatedUser
 from src.exceptions.authentication_error import AuthenticationError
+from src.security.token_cache import VerifiedTokenCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_cache(monkeypatch):
+    """Give every test its own empty verified-token cache."""
+    cache = VerifiedTokenCache(max_size=100)
+    monkeypatch.setattr(user_module, "verified_token_cache", cache)
+    return cache
+
+
+def make_user_data(**overrides):
+    data = {
+        "iat": int(time.time()),
+        "exp": int(time.time()) + 3600,
+        "iss": "https://example.neonauth.com",
+        "aud": "https://example.neonauth.com",
+        "sub": "user-123",
+        "id": "user-123",
+        "email": "user@example.com",
+        "emailVerified": True,
+        "name": "Test User",
+        "role": "authenticated",
+        "banned": False,
+        "banReason": None,
+        "banExpires": None,
+        "createdAt": "2024-01-01T00:00:00.000Z",
+        "updatedAt": "2024-01-01T00:00:00.000Z",
+    }
+    data.update(overrides)
+    return data
 
 
 @pytest.mark.anyio
@@ -215,3 +247,50 @@ async def test_get_current_user_token_extraction():
 
         # Verify we extracted just the token part (after "Bearer ")
         mock_validate.assert_called_once_with("my-secret-token-xyz")
+
+
+@pytest.mark.anyio
+async def test_get_current_user_caches_verified_token(fresh_token_cache):
+    """Test a repeat token is resolved from the cache without re-validation."""
+    with patch("src.dependencies.user.validate_neon_token") as mock_validate:
+        mock_validate.return_value = make_user_data()
+
+        first = await get_current_user(authorization="Bearer repeat-token")
+        second = await get_current_user(authorization="Bearer repeat-token")
+
+        assert first == second == AuthenticatedUser(user_id="user-123")
+        mock_validate.assert_called_once_with("repeat-token")
+        assert fresh_token_cache.stats()["hits"] == 1
+        assert fresh_token_cache.stats()["misses"] == 1
+
+
+@pytest.mark.anyio
+async def test_get_current_user_does_not_cache_rejected_token(fresh_token_cache):
+    """Test tokens that fail payload validation are never cached."""
+    with patch("src.dependencies.user.validate_neon_token") as mock_validate:
+        mock_validate.return_value = make_user_data(banned=True)
+
+        for _ in range(2):
+            with pytest.raises(AuthenticationError):
+                await get_current_user(authorization="Bearer banned-token")
+
+        assert mock_validate.call_count == 2
+        assert len(fresh_token_cache) == 0
+
+
+@pytest.mark.anyio
+async def test_get_current_user_cache_entry_expires_with_token(fresh_token_cache):
+    """Test the cache entry lives exactly as long as the token's exp."""
+    exp = int(time.time()) + 60
+    with patch("src.dependencies.user.validate_neon_token") as mock_validate:
+        mock_validate.return_value = make_user_data(exp=exp)
+
+        user = await get_current_user(authorization="Bearer short-token")
+
+        with patch("src.security.token_cache.time.time", return_value=exp):
+            assert fresh_token_cache.get("short-token") is None
+
+    assert user.expires_at == exp
+    assert not user.is_expired()
+    with patch("src.dependencies.user.time.time", return_value=exp):
+        assert user.is_expired()
@@ -40,6 +40,7 @@ def make_request(
 class FakeWideEvent:
     def __init__(self, *_args, **_kwargs):
         self.correlation_id = None
+        self.emit_after_body = False
         self.added = []
         self.emitted = []
 
@@ -0,0 +1,117 @@
+"""Unit tests for admission control in front of the model backend."""
+
+import asyncio
+
+import pytest
+
+from src.limits.admission import AdmissionController, LlmPriority, LlmQueueTimeout
+
+
+@pytest.mark.anyio
+async def test_admission_sheds_immediately_without_wait():
+    admission = AdmissionController(limit=1, wait_timeout=0)
+
+    async with admission.admit(LlmPriority.interactive):
+        with pytest.raises(LlmQueueTimeout):
+            async with admission.admit(LlmPriority.interactive):
+                pass
+
+    stats = admission.stats()
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == {"interactive": 1, "background": 0}
+    assert stats["shed"] == {"interactive": 1, "background": 0}
+
+
+@pytest.mark.anyio
+async def test_admission_admits_interactive_calls_before_background_ones():
+    admission = AdmissionController(limit=1, wait_timeout=1.0)
+    release = asyncio.Event()
+    order = []
+
+    async def call(name, priority):
+        async with admission.admit(priority):
+            order.append(name)
+            await release.wait()
+
+    holder = asyncio.create_task(call("holder", LlmPriority.interactive))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.create_task(call("summary", LlmPriority.background)),
+        asyncio.create_task(call("turn-1", LlmPriority.interactive)),
+        asyncio.create_task(call("turn-2", LlmPriority.interactive)),
+    ]
+    await asyncio.sleep(0)
+    assert admission.stats()["queued"] == {"interactive": 2, "background": 1}
+
+    release.set()
+    await asyncio.gather(holder, *waiters)
+
+    assert order == ["holder", "turn-1", "turn-2", "summary"]
+    stats = admission.stats()
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == {"interactive": 0, "background": 0}
+    assert stats["max_wait_seconds"] >= 0
+
+
+@pytest.mark.anyio
+async def test_admission_sheds_calls_queued_past_the_deadline():
+    admission = AdmissionController(limit=1, wait_timeout=0.01)
+    release = asyncio.Event()
+
+    async def holder():
+        async with admission.admit(LlmPriority.interactive):
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    with pytest.raises(LlmQueueTimeout):
+        async with admission.admit(LlmPriority.background):
+            pass
+    release.set()
+    await task
+
+    # The abandoned waiter does not swallow the freed slot
+    async with admission.admit(LlmPriority.interactive):
+        assert admission.stats()["in_flight"] == 1
+    assert admission.stats()["shed"]["background"] == 1
+    assert admission.stats()["in_flight"] == 0
+
+
+@pytest.mark.anyio
+async def test_admission_releases_the_slot_of_a_cancelled_waiter():
+    admission = AdmissionController(limit=1, wait_timeout=1.0)
+    release = asyncio.Event()
+
+    async def holder():
+        async with admission.admit(LlmPriority.interactive):
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_admit_once(admission))
+    await asyncio.sleep(0)
+    # Granted and cancelled in the same step: the slot must be passed on
+    release.set()
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await task
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert admission.stats()["in_flight"] == 0
+
+
+async def _admit_once(admission):
+    async with admission.admit(LlmPriority.interactive):
+        pass
+
+
+@pytest.mark.anyio
+async def test_admission_is_disabled_with_limit_zero():
+    admission = AdmissionController(limit=0, wait_timeout=0)
+
+    async with admission.admit(LlmPriority.interactive):
+        async with admission.admit(LlmPriority.background):
+            pass
+
+    assert admission.stats()["admitted"] == {"interactive": 1, "background": 1}
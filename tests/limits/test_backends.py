@@ -0,0 +1,306 @@
+"""Unit tests for the rate limit storage backends."""
+
+import threading
+
+import pytest
+
+from src.limits import backends
+from src.limits.backends import (
+    InMemoryRateLimitBackend,
+    SQLiteRateLimitBackend,
+    create_rate_limit_backend,
+)
+from src.limits.policies import RateLimitPolicy
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """Run each test against both backend implementations."""
+    if request.param == "memory":
+        return InMemoryRateLimitBackend()
+    return SQLiteRateLimitBackend(str(tmp_path / "limits.sqlite3"))
+
+
+def test_backend_enforces_limit(backend):
+    results = [backend.hit("user-1", 3, 60.0) for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results] == [2, 1, 0, 0]
+    assert 59.0 < results[-1].retry_after <= 60.0
+
+
+def test_backend_isolates_keys(backend):
+    for _ in range(3):
+        backend.hit("user-a", 3, 60.0)
+
+    assert backend.hit("user-b", 3, 60.0).allowed
+
+
+def test_backend_window_expiry(backend, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(backends.time, "time", lambda: clock[0])
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    for _ in range(3):
+        backend.hit("user-1", 3, 60.0)
+    assert not backend.hit("user-1", 3, 60.0).allowed
+
+    clock[0] += 61
+    assert backend.hit("user-1", 3, 60.0).allowed
+
+
+def test_backend_gcra_allows_burst_then_paces(backend, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(backends.time, "time", lambda: clock[0])
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    # 3 per 60s: one request every 20s, up to 3 at once
+    results = [backend.gcra("user-1", 3, 60.0, 3) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results] == [2, 1, 0, 0]
+    assert results[-1].retry_after == pytest.approx(20.0)
+
+    clock[0] += 20
+    assert backend.gcra("user-1", 3, 60.0, 3).allowed
+    assert not backend.gcra("user-1", 3, 60.0, 3).allowed
+
+
+def test_backend_gcra_burst_is_independent_of_rate(backend, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(backends.time, "time", lambda: clock[0])
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    results = [backend.gcra("user-1", 60, 60.0, 2) for _ in range(3)]
+    assert [r.allowed for r in results] == [True, True, False]
+    assert results[-1].retry_after == pytest.approx(1.0)
+    assert results[0].limit == 2
+
+
+def test_backend_check_dispatches_on_algorithm(backend):
+    sliding = RateLimitPolicy(limit=2, period=60.0)
+    gcra = RateLimitPolicy(limit=60, period=60.0, algorithm="gcra", burst=1)
+
+    assert backend.check("user-1", sliding).remaining == 1
+    assert backend.check("user-2", gcra).remaining == 0
+    assert not backend.check("user-2", gcra).allowed
+
+
+def test_backend_quota_usage_accumulates_per_window(backend, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(backends.time, "time", lambda: clock[0])
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    assert backend.get_usage("user-1", 60.0).used == 0
+    backend.add_usage("user-1", 100, 60.0)
+    clock[0] += 30
+    usage = backend.add_usage("user-1", 50, 60.0)
+    assert usage.used == 150
+    assert usage.reset_after == pytest.approx(30.0)
+    assert backend.get_usage("user-1", 60.0).used == 150
+    assert backend.get_usage("user-2", 60.0).used == 0
+
+    clock[0] += 30
+    assert backend.get_usage("user-1", 60.0).used == 0
+    assert backend.add_usage("user-1", 10, 60.0).used == 10
+
+
+def test_backend_reset(backend):
+    for _ in range(3):
+        backend.hit("user-1", 3, 60.0)
+    backend.gcra("user-2", 1, 60.0, 1)
+    backend.add_usage("user-3", 10, 60.0)
+    backend.reset()
+
+    assert backend.hit("user-1", 3, 60.0).allowed
+    assert backend.gcra("user-2", 1, 60.0, 1).allowed
+    assert backend.get_usage("user-3", 60.0).used == 0
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    """Two backends on one file behave like two workers on one host."""
+    path = str(tmp_path / "limits.sqlite3")
+    worker_a = SQLiteRateLimitBackend(path)
+    worker_b = SQLiteRateLimitBackend(path)
+
+    for _ in range(2):
+        assert worker_a.hit("user-1", 3, 60.0).allowed
+    assert worker_b.hit("user-1", 3, 60.0).allowed
+    assert not worker_a.hit("user-1", 3, 60.0).allowed
+    assert not worker_b.hit("user-1", 3, 60.0).allowed
+
+
+def test_sqlite_backend_is_consistent_across_threads(tmp_path):
+    backend = SQLiteRateLimitBackend(str(tmp_path / "limits.sqlite3"))
+    allowed = []
+
+    def worker():
+        for _ in range(10):
+            allowed.append(backend.hit("user-1", 25, 60.0).allowed)
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert allowed.count(True) == 25
+
+
+def test_sqlite_backend_purges_idle_keys(tmp_path, monkeypatch):
+    backend = SQLiteRateLimitBackend(str(tmp_path / "limits.sqlite3"))
+    monkeypatch.setattr(SQLiteRateLimitBackend, "PURGE_EVERY", 2)
+    clock = [1_000_000.0]
+    monkeypatch.setattr(backends.time, "time", lambda: clock[0])
+
+    backend.hit("idle-user", 3, 60.0)
+    clock[0] += 120
+    backend.hit("active-user", 3, 60.0)
+
+    keys = backend._connection().execute("SELECT key FROM rate_limit_hit").fetchall()
+    assert keys == [("active-user",)]
+
+
+def test_sqlite_purge_keeps_other_workers_longer_windows(tmp_path, monkeypatch):
+    """A worker that only ever saw short windows (or GCRA and quota writes)
+    must not purge the log another worker counts a long window in."""
+    path = str(tmp_path / "limits.sqlite3")
+    worker_a = SQLiteRateLimitBackend(path)
+    worker_b = SQLiteRateLimitBackend(path)
+    monkeypatch.setattr(SQLiteRateLimitBackend, "PURGE_EVERY", 1)
+    clock = [1_000_000.0]
+    monkeypatch.setattr(backends.time, "time", lambda: clock[0])
+
+    for _ in range(5):
+        assert worker_a.hit("user-1", 5, 3600.0).allowed
+    assert not worker_a.hit("user-1", 5, 3600.0).allowed
+
+    clock[0] += 120
+    worker_b.gcra("user-2", 1, 60.0, 1)
+    worker_b.hit("user-3", 3, 60.0)
+    worker_b.add_usage("user-4", 10, 60.0)
+
+    assert not worker_a.hit("user-1", 5, 3600.0).allowed
+
+
+def test_sqlite_backend_upgrades_files_without_row_expiry(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "limits.sqlite3")
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE rate_limit_hit (key TEXT NOT NULL, ts REAL NOT NULL)")
+    legacy.execute(
+        "INSERT INTO rate_limit_hit (key, ts) VALUES ('user-1', ?)",
+        (backends.time.time(),),
+    )
+    legacy.commit()
+    legacy.close()
+
+    backend = SQLiteRateLimitBackend(path)
+    assert not backend.hit("user-1", 1, 60.0).allowed
+
+
+def test_memory_backend_evicts_replenished_gcra_keys(monkeypatch):
+    backend = InMemoryRateLimitBackend()
+    clock = [100.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    backend.gcra("idle-user", 3, 60.0, 3)
+    clock[0] += 21
+    backend.gcra("active-user", 3, 60.0, 3)
+
+    assert list(backend.arrival_times) == ["active-user"]
+
+
+def test_create_rate_limit_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        backends, "RATE_LIMIT_SQLITE_PATH", str(tmp_path / "limits.sqlite3")
+    )
+    assert isinstance(create_rate_limit_backend("memory"), InMemoryRateLimitBackend)
+    sqlite_backend = create_rate_limit_backend("sqlite")
+    assert isinstance(sqlite_backend, SQLiteRateLimitBackend)
+    assert sqlite_backend.path == str(tmp_path / "limits.sqlite3")
+    with pytest.raises(RuntimeError, match="RATE_LIMIT_BACKEND"):
+        create_rate_limit_backend("carrier-pigeon")
+
+
+def test_get_rate_limit_backend_is_singleton(monkeypatch):
+    monkeypatch.setattr(backends, "_backend", None)
+    assert backends.get_rate_limit_backend() is backends.get_rate_limit_backend()
+
+
+def test_backend_stats(backend):
+    backend.hit("user-a", 3, 60.0)
+    backend.hit("user-b", 3, 60.0)
+
+    backend.add_usage("user-a", 10, 60.0)
+
+    stats = backend.stats()
+    assert stats["backend"] == backend.name
+    assert stats["bucket_count"] == 2
+    assert stats["quota_count"] == 1
+
+
+def test_memory_backend_uses_fixed_size_ring_buffers(monkeypatch):
+    backend = InMemoryRateLimitBackend()
+    clock = [100.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    for _ in range(20):
+        backend.hit("user-1", 3, 1.0)
+        clock[0] += 0.5
+
+    bucket = backend.buckets["user-1"]
+    assert len(bucket.timestamps) == 3
+    assert bucket.timestamps.typecode == "d"
+    assert bucket.count <= 3
+
+
+def test_memory_backend_evicts_idle_buckets(monkeypatch):
+    backend = InMemoryRateLimitBackend()
+    clock = [100.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    for i in range(10):
+        backend.hit(f"user-{i}", 3, 60.0)
+    assert backend.stats()["bucket_count"] == 10
+    memory_before = backend.stats()["memory_bytes"]
+
+    clock[0] += 61
+    backend.hit("active-user", 3, 60.0)
+
+    assert list(backend.buckets) == ["active-user"]
+    assert backend.stats()["evictions"] == 10
+    assert backend.stats()["memory_bytes"] < memory_before
+
+
+def test_memory_backend_keeps_recently_active_buckets(monkeypatch):
+    backend = InMemoryRateLimitBackend()
+    clock = [100.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: clock[0])
+
+    backend.hit("user-a", 3, 60.0)
+    clock[0] += 30
+    backend.hit("user-b", 3, 60.0)
+    clock[0] += 31
+    backend.hit("user-c", 3, 60.0)
+
+    assert list(backend.buckets) == ["user-b", "user-c"]
+
+
+def test_memory_backend_caps_bucket_count():
+    backend = InMemoryRateLimitBackend(max_buckets=3)
+
+    for i in range(5):
+        backend.hit(f"user-{i}", 3, 60.0)
+
+    assert list(backend.buckets) == ["user-2", "user-3", "user-4"]
+    assert backend.stats()["evictions"] == 2
+
+
+def test_memory_backend_resizes_bucket_when_limit_changes():
+    backend = InMemoryRateLimitBackend()
+    for _ in range(3):
+        backend.hit("user-1", 3, 60.0)
+
+    assert backend.hit("user-1", 5, 60.0).remaining == 4
+    assert len(backend.buckets["user-1"].timestamps) == 5
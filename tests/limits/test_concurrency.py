@@ -0,0 +1,115 @@
+"""Unit tests for the per-key concurrency limiter."""
+
+import asyncio
+
+import pytest
+
+from src.limits.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
+
+
+@pytest.mark.anyio
+async def test_limiter_rejects_immediately_without_wait():
+    limiter = ConcurrencyLimiter(limit=2, wait_timeout=0)
+
+    async with limiter.acquire("user-1"), limiter.acquire("user-1"):
+        assert limiter.stats()["in_flight"] == 2
+        with pytest.raises(ConcurrencyLimitExceeded):
+            async with limiter.acquire("user-1"):
+                pass
+        # Other users have their own slots
+        async with limiter.acquire("user-2"):
+            pass
+
+    assert limiter.stats()["rejected"] == 1
+    assert limiter.stats()["active_keys"] == 0
+
+
+@pytest.mark.anyio
+async def test_limiter_waits_for_a_slot_until_deadline():
+    limiter = ConcurrencyLimiter(limit=1, wait_timeout=1.0)
+    release = asyncio.Event()
+
+    async def holder():
+        async with limiter.acquire("user-1"):
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    asyncio.get_running_loop().call_later(0.01, release.set)
+
+    async with limiter.acquire("user-1"):
+        assert limiter.stats()["in_flight"] == 1
+    await task
+
+
+@pytest.mark.anyio
+async def test_limiter_times_out_waiting():
+    limiter = ConcurrencyLimiter(limit=1, wait_timeout=0.01)
+
+    async with limiter.acquire("user-1"):
+        with pytest.raises(ConcurrencyLimitExceeded):
+            async with limiter.acquire("user-1"):
+                pass
+
+    assert limiter.stats()["waiting"] == 0
+
+
+@pytest.mark.anyio
+async def test_limiter_releases_slot_on_exception_and_cancellation():
+    limiter = ConcurrencyLimiter(limit=1, wait_timeout=0)
+
+    with pytest.raises(RuntimeError):
+        async with limiter.acquire("user-1"):
+            raise RuntimeError("boom")
+
+    async def slow():
+        async with limiter.acquire("user-1"):
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(slow())
+    await asyncio.sleep(0)
+    assert limiter.stats()["in_flight"] == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert limiter.stats() == {
+        "limit": 1,
+        "active_keys": 0,
+        "in_flight": 0,
+        "waiting": 0,
+        "rejected": 0,
+        "acquired": 2,
+        "contended": 0,
+        "wait_seconds_total": 0.0,
+        "max_wait_seconds": 0.0,
+    }
+
+
+@pytest.mark.anyio
+async def test_limiter_measures_contention_and_wait_time():
+    limiter = ConcurrencyLimiter(limit=1, wait_timeout=5)
+    release = asyncio.Event()
+
+    async def holder():
+        async with limiter.acquire("conv-1"):
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+
+    async def waiter():
+        async with limiter.acquire("conv-1"):
+            pass
+
+    waiting = asyncio.create_task(waiter())
+    await asyncio.sleep(0.05)
+    assert limiter.stats()["waiting"] == 1
+    release.set()
+    await asyncio.gather(task, waiting)
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 2
+    assert stats["contended"] == 1
+    assert 0.05 <= stats["wait_seconds_total"] < 5
+    assert stats["max_wait_seconds"] == stats["wait_seconds_total"]
@@ -0,0 +1,56 @@
+"""Unit tests for rate limit policy configuration."""
+
+import pytest
+
+from src.limits import policies
+from src.limits.policies import RateLimitPolicy, get_policy, parse_policies
+
+
+def test_parse_policies_keeps_defaults():
+    parsed = parse_policies(
+        '{"generate": {"service": {"limit": 600, "period": 60,'
+        ' "algorithm": "gcra", "burst": 50}}}'
+    )
+
+    assert parsed["default"]["default"] == RateLimitPolicy(limit=5, period=60.0)
+    assert parsed["generate"]["service"] == RateLimitPolicy(
+        limit=600, period=60, algorithm="gcra", burst=50
+    )
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "not json",
+        '{"generate": {"default": {"limit": 0, "period": 60}}}',
+        '{"generate": {"default": {"limit": 5, "period": 60, "algorithm": "x"}}}',
+        '{"generate": {"default": {"limit": 5}}}',
+        '{"generate": ["default"]}',
+    ],
+)
+def test_parse_policies_rejects_invalid_config(raw):
+    with pytest.raises(RuntimeError, match="RATE_LIMIT_POLICIES"):
+        parse_policies(raw)
+
+
+def test_get_policy_falls_back_to_defaults(monkeypatch):
+    service = RateLimitPolicy(limit=600, period=60.0, algorithm="gcra", burst=50)
+    monkeypatch.setattr(
+        policies,
+        "_policies",
+        {
+            "default": {"default": RateLimitPolicy(limit=5, period=60.0)},
+            "generate": {"service": service},
+        },
+    )
+
+    assert get_policy("generate", "service") is service
+    assert get_policy("generate", "authenticated").limit == 5
+    assert get_policy("unknown", "service").limit == 5
+
+
+def test_policy_header_value():
+    assert RateLimitPolicy(limit=5, period=60.0).header_value() == "5;w=60"
+    gcra = RateLimitPolicy(limit=10, period=1.5, algorithm="gcra", burst=3)
+    assert gcra.header_value() == "10;w=1.5;burst=3"
+    assert gcra.capacity == 3
@@ -0,0 +1,51 @@
+"""Unit tests for the LLM token quota."""
+
+import pytest
+from pydantic_ai.usage import RunUsage
+
+from src.limits import quota
+from src.limits.backends import InMemoryRateLimitBackend
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    backend = InMemoryRateLimitBackend()
+    monkeypatch.setattr(quota, "get_rate_limit_backend", lambda: backend)
+    monkeypatch.setattr(quota, "LLM_TOKEN_QUOTA", 1000)
+    return backend
+
+
+def test_charge_token_usage_counts_prompt_and_completion_tokens():
+    quota.charge_token_usage("user-1", RunUsage(input_tokens=300, output_tokens=20))
+    quota.charge_token_usage("user-1", RunUsage(input_tokens=100, output_tokens=80))
+
+    assert quota.get_token_usage("user-1").used == 500
+    assert quota.get_token_usage("user-2").used == 0
+
+
+def test_charge_token_usage_is_noop_when_quota_disabled(monkeypatch, backend):
+    monkeypatch.setattr(quota, "LLM_TOKEN_QUOTA", 0)
+
+    assert quota.charge_token_usage("user-1", RunUsage(input_tokens=10)) is None
+    assert len(backend.usage) == 0
+
+
+@pytest.mark.anyio
+async def test_acharge_token_usage_charges_off_the_event_loop(monkeypatch, backend):
+    import threading
+
+    threads = []
+    add_usage = backend.add_usage
+
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+        return add_usage(*args)
+
+    monkeypatch.setattr(backend, "add_usage", record_thread)
+
+    usage = await quota.acharge_token_usage(
+        "user-1", RunUsage(input_tokens=300, output_tokens=20)
+    )
+
+    assert usage.used == 320
+    assert threads and threads[0] is not threading.main_thread()
@@ -3,7 +3,7 @@
 from unittest.mock import MagicMock
 
 import pytest
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
 from src.middlewares.events import EventMiddleware, WideEvent
 from tests.helpers import FakeWideEvent, make_request
@@ -76,3 +76,33 @@ async def test_event_middleware_dispatch_exception(monkeypatch):
 
     assert len(created) == 1
     assert created[0].emitted == []
+
+
+@pytest.mark.anyio
+async def test_event_middleware_emits_streamed_responses_after_the_body(monkeypatch):
+    created = []
+
+    class TrackingWideEvent(FakeWideEvent):
+        def __init__(self, request):
+            super().__init__(request)
+            created.append(self)
+
+    monkeypatch.setattr("src.middlewares.events.WideEvent", TrackingWideEvent)
+    middleware = EventMiddleware(app=MagicMock())
+    request = make_request(path="/stream")
+
+    async def body():
+        yield b"data: 1\n\n"
+        yield b"data: 2\n\n"
+
+    async def call_next(req):
+        req.state.wide_event.emit_after_body = True
+        return StreamingResponse(body())
+
+    response = await middleware.dispatch(request, call_next)
+    assert created[0].emitted == []
+
+    chunks = [chunk async for chunk in response.body_iterator]
+
+    assert chunks == [b"data: 1\n\n", b"data: 2\n\n"]
+    assert created[0].emitted == [(200, "success")]
@@ -4,7 +4,12 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from src.repository.model_repository import MessageRepository
+from datetime import datetime, timezone
+
+from src.repository.model_repository import (
+    ConversationSummaryRepository,
+    MessageRepository,
+)
 from src.schemas.message_model import MessageType
 
 
@@ -40,3 +45,38 @@ async def test_message_repository_methods():
     with patch.object(repo, "delete", AsyncMock()) as mock_delete:
         await repo.delete_message("msg")
         mock_delete.assert_awaited_once_with("msg")
+
+
+@pytest.mark.anyio
+async def test_conversation_summary_repository_methods():
+    session = AsyncMock()
+    repo = ConversationSummaryRepository(session)
+
+    session.execute.return_value = RepoResultScalarsAll(["s1", "s2"])
+    assert await repo.get_summaries("c1", "u1") == ["s1", "s2"]
+
+    session.execute.reset_mock()
+    created = MagicMock()
+    last_created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with patch.object(repo, "create", AsyncMock(return_value=created)) as mock_create:
+        result = await repo.save_summary("c1", "u1", "text", "m9", last_created_at)
+        session.execute.assert_not_awaited()
+
+        await repo.save_summary(
+            "c1",
+            "u1",
+            "merged",
+            "m9",
+            last_created_at,
+            level=1,
+            replaced=[MagicMock(id="s1"), MagicMock(id="s2")],
+        )
+
+    assert result is created
+    summary_arg = mock_create.await_args_list[0].args[0]
+    assert summary_arg.content == "text"
+    assert summary_arg.last_message_id == "m9"
+    assert summary_arg.last_message_created_at == last_created_at
+    assert mock_create.await_args_list[1].args[0].level == 1
+    # The replaced summaries are deleted before the new one is stored
+    assert "DELETE FROM conversation_summary" in str(session.execute.await_args.args[0])
@@ -1,9 +1,16 @@
 """Unit tests for Neon security helpers."""
 
+import asyncio
+import base64
+import json
+import os
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
 import jwt
 import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 
 from src.security import neon
 
@@ -39,28 +46,39 @@ def test_get_signing_key_success_and_errors(monkeypatch):
         neon.get_signing_key("token", {"keys": [{"kid": "other", "x": x_value}]})
 
 
+def make_source(fetch):
+    """Wrap a fetch mock as a JWKS source."""
+    return SimpleNamespace(name="fake", fetch=fetch)
+
+
+@pytest.fixture(autouse=True)
+def fresh_jwks_cache(monkeypatch):
+    """Give every test its own empty JWKS cache."""
+    monkeypatch.setattr(
+        neon, "_jwks_cache", neon.JWKSCache(neon.RemoteJWKSSource(neon.NEON_JWKS_URL))
+    )
+
+
 @pytest.mark.anyio
 async def test_get_jwks_and_validate_token(monkeypatch):
     """Test JWKS retrieval and token validation error/success paths."""
     fake_response = MagicMock()
-    fake_response.json.return_value = {"keys": ["ok"]}
+    fake_response.json.return_value = {"keys": [{"kid": "ok"}]}
+    fake_response.headers = {"cache-control": "public, max-age=600"}
     fake_client = MagicMock()
     fake_client.get = AsyncMock(return_value=fake_response)
 
-    class FakeClientCM:
-        async def __aenter__(self):
-            return fake_client
-
-        async def __aexit__(self, exc_type, exc, tb):
-            return False
-
-    monkeypatch.setattr(neon, "AsyncClient", lambda: FakeClientCM())
-    assert await neon.get_jwks() == {"keys": ["ok"]}
-    fake_client.get.assert_awaited_once()
+    monkeypatch.setattr(neon, "get_http_client", lambda: fake_client)
+    assert await neon.get_jwks() == {"keys": [{"kid": "ok"}]}
+    fake_client.get.assert_awaited_once_with(neon.NEON_JWKS_URL)
     fake_response.raise_for_status.assert_called_once()
 
-    monkeypatch.setattr(neon, "get_jwks", AsyncMock(return_value={"keys": []}))
-    monkeypatch.setattr(neon, "get_signing_key", lambda token, jwks: "signing-key")
+    registry = MagicMock()
+    registry.get_key.return_value = "signing-key"
+    cache = MagicMock()
+    cache.get_registry = AsyncMock(return_value=registry)
+    monkeypatch.setattr(neon, "_jwks_cache", cache)
+    monkeypatch.setattr(neon.jwt, "get_unverified_header", lambda _token: {"kid": "k1"})
     monkeypatch.setattr(neon.jwt, "decode", lambda *args, **kwargs: {"sub": "user-1"})
     assert await neon.validate_neon_token("token") == {"sub": "user-1"}
 
@@ -71,3 +89,456 @@ async def test_get_jwks_and_validate_token(monkeypatch):
     )
     with pytest.raises(Exception, match="Token validation error"):
         await neon.validate_neon_token("token")
+
+
+def test_parse_cache_control_ttl():
+    """Test TTL extraction from Cache-Control headers."""
+    assert neon.parse_cache_control_ttl(None) is None
+    assert neon.parse_cache_control_ttl("public") is None
+    assert neon.parse_cache_control_ttl("public, max-age=120") == 120.0
+    assert neon.parse_cache_control_ttl("no-store") == 0.0
+    assert neon.parse_cache_control_ttl("No-Cache, max-age=60") == 0.0
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_serves_until_ttl_expires(monkeypatch):
+    """Test the cached key set is reused until its TTL runs out."""
+    fetch = AsyncMock(return_value=({"keys": [{"kid": "k1"}]}, 60.0))
+    clock = [1000.0]
+    monkeypatch.setattr(neon.time, "monotonic", lambda: clock[0])
+    cache = neon.JWKSCache(make_source(fetch))
+
+    assert await cache.get("k1") == {"keys": [{"kid": "k1"}]}
+    clock[0] += 59
+    await cache.get("k1")
+    assert fetch.await_count == 1
+
+    clock[0] += 2
+    await cache.get("k1")
+    assert fetch.await_count == 2
+    assert cache.expires_at == clock[0] + 60.0
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_uses_default_ttl_without_cache_control(monkeypatch):
+    """Test the configured TTL applies when the response has no max-age."""
+    fetch = AsyncMock(return_value=({"keys": []}, None))
+    monkeypatch.setattr(neon.time, "monotonic", lambda: 50.0)
+    cache = neon.JWKSCache(
+        make_source(fetch), default_ttl=10.0, min_refresh_interval=5.0
+    )
+
+    await cache.get()
+    assert cache.expires_at == 60.0
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_refreshes_on_unknown_kid(monkeypatch):
+    """Test an unknown kid triggers a refresh, throttled by the min interval."""
+    fetch = AsyncMock(
+        side_effect=[
+            ({"keys": [{"kid": "old"}]}, 3600.0),
+            ({"keys": [{"kid": "old"}, {"kid": "new"}]}, 3600.0),
+        ]
+    )
+    clock = [0.0]
+    monkeypatch.setattr(neon.time, "monotonic", lambda: clock[0])
+    cache = neon.JWKSCache(make_source(fetch), min_refresh_interval=30.0)
+
+    await cache.get("old")
+    clock[0] += 5
+    # Too soon after the last fetch: serve the cached set as-is
+    assert await cache.get("new") == {"keys": [{"kid": "old"}]}
+    assert fetch.await_count == 1
+
+    clock[0] += 30
+    document = await cache.get("new")
+    assert {jwk["kid"] for jwk in document["keys"]} == {"old", "new"}
+    assert fetch.await_count == 2
+
+    await cache.get("new")
+    assert fetch.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_collapses_concurrent_refreshes(monkeypatch):
+    """Test a burst of requests on an empty cache causes a single fetch."""
+
+    async def slow_fetch():
+        await asyncio.sleep(0.01)
+        return {"keys": [{"kid": "k1"}]}, 300.0
+
+    fetch = AsyncMock(side_effect=slow_fetch)
+    cache = neon.JWKSCache(make_source(fetch))
+
+    results = await asyncio.gather(*(cache.get("k1") for _ in range(500)))
+
+    assert fetch.await_count == 1
+    assert all(result == {"keys": [{"kid": "k1"}]} for result in results)
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_collapses_concurrent_refreshes_with_zero_ttl():
+    """Test waiters reuse a fetch that finished while they queued, even when
+    no-cache (TTL 0) makes the key set stale straight away."""
+
+    async def slow_fetch():
+        await asyncio.sleep(0.01)
+        return {"keys": [{"kid": "k1"}]}, 0.0
+
+    fetch = AsyncMock(side_effect=slow_fetch)
+    cache = neon.JWKSCache(make_source(fetch))
+
+    await asyncio.gather(*(cache.get_registry() for _ in range(50)))
+    assert fetch.await_count == 1
+
+    # A later request reuses it too, for the minimum refresh interval
+    await cache.get_registry()
+    assert fetch.await_count == 1
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_reuses_zero_ttl_key_sets_for_the_min_interval(monkeypatch):
+    """Test no-cache (TTL 0) is floored, so sequential requests do not each
+    refetch the key set."""
+    fetch = AsyncMock(return_value=({"keys": [{"kid": "k1"}]}, 0.0))
+    clock = [1000.0]
+    monkeypatch.setattr(neon.time, "monotonic", lambda: clock[0])
+    cache = neon.JWKSCache(make_source(fetch), min_refresh_interval=30.0)
+
+    for _ in range(10):
+        await cache.get("k1")
+        clock[0] += 1
+    assert fetch.await_count == 1
+
+    clock[0] += 20
+    await cache.get("k1")
+    assert fetch.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_validate_neon_token_passes_kid_to_cache(monkeypatch):
+    """Test the token's kid is used to look up the cached signing key."""
+    registry = MagicMock()
+    registry.get_key.return_value = "signing-key"
+    cache = MagicMock()
+    cache.get_registry = AsyncMock(return_value=registry)
+    monkeypatch.setattr(neon, "_jwks_cache", cache)
+    monkeypatch.setattr(neon.jwt, "get_unverified_header", lambda _token: {"kid": "k9"})
+    captured = {}
+
+    def fake_decode(token, key, **kwargs):
+        captured["key"] = key
+        return {"sub": "user-1"}
+
+    monkeypatch.setattr(neon.jwt, "decode", fake_decode)
+
+    await neon.validate_neon_token("token")
+
+    cache.get_registry.assert_awaited_once_with("k9")
+    registry.get_key.assert_called_once_with("k9")
+    assert captured["key"] == "signing-key"
+
+
+@pytest.mark.anyio
+async def test_validate_neon_token_requires_kid(monkeypatch):
+    """Test a token without a kid is rejected before the cache is consulted."""
+    cache = MagicMock()
+    cache.get_registry = AsyncMock()
+    monkeypatch.setattr(neon, "_jwks_cache", cache)
+    monkeypatch.setattr(neon.jwt, "get_unverified_header", lambda _token: {})
+
+    with pytest.raises(Exception, match="missing 'kid'"):
+        await neon.validate_neon_token("token")
+    cache.get_registry.assert_not_awaited()
+
+
+def test_signing_key_registry_parses_keys_once(monkeypatch):
+    """Test keys are decoded when the registry is built, not on lookup."""
+    calls = []
+
+    def fake_from_public_bytes(public_key_bytes):
+        calls.append(public_key_bytes)
+        return object()
+
+    monkeypatch.setattr(
+        neon.Ed25519PublicKey, "from_public_bytes", fake_from_public_bytes
+    )
+    registry = neon.SigningKeyRegistry(
+        {"keys": [{"kid": "k1", "x": "AQIDBA"}, {"kid": "k2", "x": "BQYHCA"}]}
+    )
+    assert len(calls) == 2
+
+    first = registry.get_key("k1")
+    assert registry.get_key("k1") is first
+    assert registry.get_key("k2") is not first
+    assert len(calls) == 2
+    assert "k1" in registry
+    assert "k3" not in registry
+    assert len(registry) == 2
+
+
+def test_signing_key_registry_error_details():
+    """Test a malformed JWK fails lookups of its kid, with its details."""
+    registry = neon.SigningKeyRegistry(
+        {"keys": [{"kid": "k1"}, {"kid": "k2", "x": "!!"}, {"kid": "k3", "x": "AA"}]}
+    )
+
+    with pytest.raises(neon.AuthenticationError, match="missing 'x'") as exc_info:
+        registry.get_key("k1")
+    assert exc_info.value.details == {"jwk": {"kid": "k1"}}
+
+    with pytest.raises(neon.AuthenticationError, match="invalid 'x'"):
+        registry.get_key("k3")
+
+    with pytest.raises(neon.AuthenticationError, match="Matching JWK not found") as exc:
+        registry.get_key("missing")
+    assert exc.value.details == {
+        "kid": "missing",
+        "available_kids": ["k1", "k2", "k3"],
+    }
+
+
+def test_signing_key_registry_skips_jwks_without_kid(monkeypatch):
+    """Test a kid-less JWK does not hide the keys after it; it is only
+    reported for a kid no JWK matches."""
+    monkeypatch.setattr(
+        neon.Ed25519PublicKey, "from_public_bytes", lambda _bytes: "key"
+    )
+    registry = neon.SigningKeyRegistry(
+        {"keys": [{"x": "AQIDBA"}, {"kid": "k1", "x": "AQIDBA"}]}
+    )
+
+    assert registry.get_key("k1") == "key"
+    with pytest.raises(neon.AuthenticationError, match="missing 'kid'") as exc_info:
+        registry.get_key("k2")
+    assert exc_info.value.details == {"jwk": {"x": "AQIDBA"}}
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_rebuilds_registry_only_when_document_changes(monkeypatch):
+    """Test the registry is swapped on a new document and kept otherwise."""
+    monkeypatch.setattr(
+        neon.Ed25519PublicKey, "from_public_bytes", lambda _bytes: object()
+    )
+    fetch = AsyncMock(
+        side_effect=[
+            ({"keys": [{"kid": "k1", "x": "AQIDBA"}]}, 0.0),
+            ({"keys": [{"kid": "k1", "x": "AQIDBA"}]}, 0.0),
+            ({"keys": [{"kid": "k2", "x": "AQIDBA"}]}, 0.0),
+        ]
+    )
+    cache = neon.JWKSCache(make_source(fetch), min_refresh_interval=0.0)
+
+    first = await cache.get_registry("k1")
+    assert await cache.get_registry("k1") is first
+
+    rotated = await cache.get_registry("k2")
+    assert rotated is not first
+    assert "k2" in rotated
+    assert "k1" not in rotated
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_notifies_rotation_listeners(monkeypatch):
+    """Test listeners run when a new key set replaces a different one."""
+    monkeypatch.setattr(
+        neon.Ed25519PublicKey, "from_public_bytes", lambda _bytes: object()
+    )
+    fetch = AsyncMock(
+        side_effect=[
+            ({"keys": [{"kid": "k1", "x": "AQIDBA"}]}, 0.0),
+            ({"keys": [{"kid": "k1", "x": "AQIDBA"}]}, 0.0),
+            ({"keys": [{"kid": "k2", "x": "AQIDBA"}]}, 0.0),
+        ]
+    )
+    cache = neon.JWKSCache(make_source(fetch), min_refresh_interval=0.0)
+    listener = MagicMock()
+    cache.add_rotation_listener(listener)
+
+    await cache.get_registry()
+    await cache.get_registry()
+    listener.assert_not_called()
+
+    await cache.get_registry()
+    listener.assert_called_once_with()
+
+
+@pytest.mark.anyio
+async def test_file_jwks_source_reloads_when_file_changes(tmp_path):
+    """Test the file source re-reads the JWKS only after the file changes."""
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [{"kid": "k1"}]}))
+    source = neon.FileJWKSSource(str(path), poll_interval=5.0)
+
+    assert await source.fetch() == ({"keys": [{"kid": "k1"}]}, 5.0)
+
+    path.write_text(json.dumps({"keys": [{"kid": "k2"}]}))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    document, _ = await source.fetch()
+    assert document == {"keys": [{"kid": "k2"}]}
+
+
+@pytest.mark.anyio
+async def test_file_jwks_source_keeps_last_good_document(tmp_path):
+    """Test a half-written file does not replace the loaded key set."""
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [{"kid": "k1"}]}))
+    source = neon.FileJWKSSource(str(path), poll_interval=5.0)
+    await source.fetch()
+
+    path.write_text('{"keys": [')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert await source.fetch() == ({"keys": [{"kid": "k1"}]}, 5.0)
+
+    broken = neon.FileJWKSSource(str(path), poll_interval=5.0)
+    with pytest.raises(json.JSONDecodeError):
+        await broken.fetch()
+
+
+@pytest.mark.anyio
+async def test_static_jwks_source_returns_inline_document():
+    """Test the inline source serves its document without a TTL."""
+    source = neon.StaticJWKSSource({"keys": [{"kid": "k1"}]})
+    assert await source.fetch() == ({"keys": [{"kid": "k1"}]}, None)
+
+
+def test_create_jwks_source_prefers_local_sources(monkeypatch):
+    """Test source selection: file, then inline JSON, then the auth service."""
+    monkeypatch.setattr(neon, "AUTH_JWKS_FILE", "/etc/jwks.json")
+    monkeypatch.setattr(neon, "AUTH_JWKS_JSON", '{"keys": []}')
+    assert isinstance(neon.create_jwks_source(), neon.FileJWKSSource)
+
+    monkeypatch.setattr(neon, "AUTH_JWKS_FILE", "")
+    source = neon.create_jwks_source()
+    assert isinstance(source, neon.StaticJWKSSource)
+    assert source.document == {"keys": []}
+
+    monkeypatch.setattr(neon, "AUTH_JWKS_JSON", "")
+    source = neon.create_jwks_source()
+    assert isinstance(source, neon.RemoteJWKSSource)
+    assert source.url == neon.NEON_JWKS_URL
+
+    monkeypatch.setattr(neon, "AUTH_JWKS_JSON", "{not json")
+    with pytest.raises(RuntimeError, match="AUTH_JWKS_JSON"):
+        neon.create_jwks_source()
+
+
+@pytest.mark.anyio
+async def test_validate_neon_token_with_static_jwks(monkeypatch):
+    """Test a real EdDSA token verifies end to end against an inline key set."""
+    private_key = Ed25519PrivateKey.generate()
+    public_bytes = private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    x = base64.urlsafe_b64encode(public_bytes).rstrip(b"=").decode()
+    jwks = {"keys": [{"kty": "OKP", "crv": "Ed25519", "kid": "local", "x": x}]}
+    monkeypatch.setattr(
+        neon, "_jwks_cache", neon.JWKSCache(neon.StaticJWKSSource(jwks))
+    )
+    monkeypatch.setattr(neon, "ORIGIN", "https://auth.example")
+    token = jwt.encode(
+        {"sub": "user-1", "iss": "https://auth.example", "aud": "https://auth.example"},
+        private_key,
+        algorithm="EdDSA",
+        headers={"kid": "local"},
+    )
+
+    assert (await neon.validate_neon_token(token))["sub"] == "user-1"
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_keeps_last_good_key_set_on_failure(monkeypatch):
+    """Test a failed refresh serves the previous key set and records the error."""
+    fetch = AsyncMock(
+        side_effect=[({"keys": [{"kid": "k1"}]}, 0.0), RuntimeError("auth down")]
+    )
+    clock = [100.0]
+    monkeypatch.setattr(neon.time, "monotonic", lambda: clock[0])
+    cache = neon.JWKSCache(make_source(fetch), min_refresh_interval=30.0)
+
+    await cache.get()
+    clock[0] += 30
+    assert await cache.get() == {"keys": [{"kid": "k1"}]}
+    assert cache.last_error == "RuntimeError: auth down"
+    assert cache.failure_count == 1
+    # Retries are spaced out rather than attempted on every request
+    assert cache.expires_at == clock[0] + 30.0
+
+    empty = neon.JWKSCache(make_source(AsyncMock(side_effect=RuntimeError("x"))))
+    with pytest.raises(RuntimeError):
+        await empty.get()
+
+
+def test_jwks_cache_next_refresh_delay(monkeypatch):
+    """Test the background refresh fires ahead of expiry and backs off on errors."""
+    monkeypatch.setattr(neon, "JWKS_REFRESH_LEAD_SECONDS", 30.0)
+    monkeypatch.setattr(neon, "JWKS_REFRESH_MAX_BACKOFF_SECONDS", 60.0)
+    monkeypatch.setattr(neon.time, "monotonic", lambda: 100.0)
+    cache = neon.JWKSCache(make_source(AsyncMock()))
+
+    assert cache.next_refresh_delay() == 2.0
+
+    cache.document = {"keys": []}
+    cache.fetched_at, cache.expires_at = 100.0, 400.0
+    assert cache.next_refresh_delay() == 270.0
+
+    # Short TTLs refresh halfway through instead
+    cache.expires_at = 120.0
+    assert cache.next_refresh_delay() == 10.0
+
+    cache.consecutive_failures = 10
+    assert cache.next_refresh_delay() == 60.0
+
+
+@pytest.mark.anyio
+async def test_jwks_cache_background_refresh(monkeypatch):
+    """Test the background task refreshes the key set and can be stopped."""
+    fetch = AsyncMock(return_value=({"keys": [{"kid": "k1"}]}, 300.0))
+    cache = neon.JWKSCache(make_source(fetch))
+    refreshed = asyncio.Event()
+    monkeypatch.setattr(cache, "next_refresh_delay", lambda: 0)
+    real_refresh = cache.refresh
+
+    async def refresh():
+        await real_refresh()
+        refreshed.set()
+
+    monkeypatch.setattr(cache, "refresh", refresh)
+
+    cache.start_background_refresh()
+    await asyncio.wait_for(refreshed.wait(), timeout=1)
+    assert cache.health()["background_refresh"] is True
+
+    await cache.stop_background_refresh()
+    assert cache.health()["background_refresh"] is False
+    assert fetch.await_count >= 1
+
+
+@pytest.mark.anyio
+async def test_jwks_health_and_prefetch(monkeypatch):
+    """Test prefetch loads the key set and health reports its age."""
+    fetch = AsyncMock(return_value=({"keys": [{"kid": "k1", "x": "AQIDBA"}]}, 300.0))
+    monkeypatch.setattr(
+        neon.Ed25519PublicKey, "from_public_bytes", lambda _bytes: object()
+    )
+    clock = [10.0]
+    monkeypatch.setattr(neon.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(neon, "_jwks_cache", neon.JWKSCache(make_source(fetch)))
+
+    assert neon.jwks_health()["healthy"] is False
+    assert await neon.prefetch_jwks() is True
+    clock[0] += 20
+
+    health = neon.jwks_health()
+    assert health["healthy"] is True
+    assert health["source"] == "fake"
+    assert health["key_count"] == 1
+    assert health["age_seconds"] == 20.0
+    assert health["expires_in_seconds"] == 280.0
+    assert health["last_error"] is None
+
+    fetch.side_effect = RuntimeError("down")
+    monkeypatch.setattr(neon, "_jwks_cache", neon.JWKSCache(make_source(fetch)))
+    assert await neon.prefetch_jwks() is False
+    assert neon.jwks_health()["last_error"] == "RuntimeError: down"
@@ -0,0 +1,79 @@
+"""Unit tests for the verified-token cache."""
+
+from unittest.mock import patch
+
+from src.security.token_cache import VerifiedTokenCache
+
+
+def test_token_cache_hit_and_miss_counters():
+    """Test lookups update the hit and miss counters."""
+    cache: VerifiedTokenCache[str] = VerifiedTokenCache(max_size=10)
+
+    assert cache.get("token-a") is None
+    cache.put("token-a", "user-a", expires_at=2_000_000_000)
+    assert cache.get("token-a") == "user-a"
+
+    assert cache.stats() == {
+        "size": 1,
+        "max_size": 10,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+    }
+
+
+def test_token_cache_does_not_store_raw_tokens():
+    """Test entries are keyed by a digest rather than the token itself."""
+    cache: VerifiedTokenCache[str] = VerifiedTokenCache(max_size=10)
+    cache.put("secret-token", "user-a", expires_at=2_000_000_000)
+
+    assert "secret-token" not in cache._entries
+    assert len(next(iter(cache._entries))) == 32
+
+
+def test_token_cache_expires_entries_at_exp():
+    """Test an entry is evicted once its expiry time is reached."""
+    cache: VerifiedTokenCache[str] = VerifiedTokenCache(max_size=10)
+    cache.put("token-a", "user-a", expires_at=1000.0)
+
+    with patch("src.security.token_cache.time.time", return_value=999.0):
+        assert cache.get("token-a") == "user-a"
+    with patch("src.security.token_cache.time.time", return_value=1000.0):
+        assert cache.get("token-a") is None
+
+    assert len(cache) == 0
+    assert cache.stats()["evictions"] == 1
+
+
+def test_token_cache_evicts_least_recently_used():
+    """Test the cache stays within max_size by evicting the LRU entry."""
+    cache: VerifiedTokenCache[str] = VerifiedTokenCache(max_size=2)
+    cache.put("token-a", "user-a", expires_at=2_000_000_000)
+    cache.put("token-b", "user-b", expires_at=2_000_000_000)
+    cache.get("token-a")
+    cache.put("token-c", "user-c", expires_at=2_000_000_000)
+
+    assert cache.get("token-b") is None
+    assert cache.get("token-a") == "user-a"
+    assert cache.get("token-c") == "user-c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_token_cache_clear_counts_evictions():
+    """Test clearing on key rotation evicts and counts every entry."""
+    cache: VerifiedTokenCache[str] = VerifiedTokenCache(max_size=10)
+    cache.put("token-a", "user-a", expires_at=2_000_000_000)
+    cache.put("token-b", "user-b", expires_at=2_000_000_000)
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.stats()["evictions"] == 2
+
+
+def test_token_cache_disabled_with_zero_size():
+    """Test a max_size of zero disables caching."""
+    cache: VerifiedTokenCache[str] = VerifiedTokenCache(max_size=0)
+    cache.put("token-a", "user-a", expires_at=2_000_000_000)
+
+    assert cache.get("token-a") is None
@@ -178,3 +178,348 @@ async def test_process_agent_query_handles_llm_error(agent_service):
         assert "Error processing agent query" in result["response"]
         mock_compact.assert_called_once()
         mock_run.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_process_agent_query_compacts_in_background(agent_service):
+    """With a summary repository, the reply does not wait for summarization."""
+    agent_service.summary_repository = MagicMock()
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.build_history",
+            new_callable=AsyncMock,
+            return_value=[],
+        ) as mock_build,
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+        ) as mock_summarize,
+        patch(
+            "src.service.agent_service.run_stakeholder_query",
+            new_callable=AsyncMock,
+            return_value="ok",
+        ),
+        patch("src.service.agent_service.schedule_compaction") as mock_schedule,
+    ):
+        result = await agent_service.process_agent_query(
+            user_id="user-1", conversation_id="conv-1", content="hello"
+        )
+
+    assert result["status"] == "success"
+    mock_build.assert_awaited_once()
+    mock_summarize.assert_not_awaited()
+    mock_schedule.assert_called_once_with("conv-1", "user-1")
+
+
+def fake_stream(*deltas, error=None):
+    async def stream(**_kwargs):
+        for delta in deltas:
+            yield delta
+        if error is not None:
+            raise error
+
+    return stream
+
+
+@pytest.mark.anyio
+async def test_stream_agent_query_saves_full_response(agent_service):
+    """The streamed text is saved as one AI message once the stream ends."""
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+            return_value=[],
+        ),
+        patch(
+            "src.service.agent_service.stream_stakeholder_query",
+            fake_stream("We have ", "mountain bikes."),
+        ),
+    ):
+        deltas = [
+            delta
+            async for delta in agent_service.stream_agent_query(
+                user_id="user-1", conversation_id="conv-1", content="hello"
+            )
+        ]
+
+    assert deltas == ["We have ", "mountain bikes."]
+    agent_service.message_service.save_user_message.assert_awaited_once()
+    agent_service.message_service.save_ai_message.assert_awaited_once_with(
+        user_id="user-1", conversation_id="conv-1", content="We have mountain bikes."
+    )
+
+
+@pytest.mark.anyio
+async def test_stream_agent_query_discards_abandoned_response(agent_service):
+    """Nothing is saved for a reply whose consumer went away part way."""
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+            return_value=[],
+        ),
+        patch(
+            "src.service.agent_service.stream_stakeholder_query",
+            fake_stream("We have ", "mountain bikes."),
+        ),
+    ):
+        stream = agent_service.stream_agent_query(
+            user_id="user-1", conversation_id="conv-1", content="hello"
+        )
+        assert await anext(stream) == "We have "
+        await stream.aclose()
+
+    agent_service.message_service.save_ai_message.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_stream_agent_query_raises_llm_errors(agent_service):
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+            return_value=[],
+        ),
+        patch(
+            "src.service.agent_service.stream_stakeholder_query",
+            fake_stream("We", error=LlmResponseException(message="LLM timeout")),
+        ),
+    ):
+        with pytest.raises(LlmResponseException):
+            async for _ in agent_service.stream_agent_query(
+                user_id="user-1", conversation_id="conv-1", content="hello"
+            ):
+                pass
+
+    agent_service.message_service.save_ai_message.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_keep_context_loads_persona_project_and_history_once(
+    mock_persona_service, mock_project_service, mock_message_service
+):
+    """A session's turns reuse the loaded context and remember new messages."""
+    from src.service.agent_service import AgentService
+
+    service = AgentService(
+        persona_service=mock_persona_service,
+        project_service=mock_project_service,
+        message_service=mock_message_service,
+        keep_context=True,
+    )
+    # The database already holds the first turn's message when it is loaded
+    stored = mock_history + [
+        Message(
+            id=uuid.uuid4(),
+            conversation_id=mock_conversation_id,
+            content="first",
+            type=MessageType.USER,
+        )
+    ]
+    mock_message_service.get_conversation_history.return_value = list(stored)
+
+    def save(message_type):
+        def _save(**kw):
+            stored.append(
+                Message(
+                    id=uuid.uuid4(),
+                    conversation_id=mock_conversation_id,
+                    content=kw["content"],
+                    type=message_type,
+                )
+            )
+            return stored[-1]
+
+        return _save
+
+    mock_message_service.save_user_message.side_effect = save(MessageType.USER)
+    mock_message_service.save_ai_message.side_effect = save(MessageType.AI)
+    mock_message_service.get_latest_message_id.side_effect = lambda **kw: stored[-1].id
+
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+            return_value=[],
+        ) as mock_compact,
+        patch(
+            "src.service.agent_service.stream_stakeholder_query",
+            fake_stream("ok"),
+        ),
+    ):
+        for turn in ("first", "second"):
+            async for _ in service.stream_agent_query(
+                user_id="user-1", conversation_id="conv-1", content=turn
+            ):
+                pass
+
+    mock_message_service.get_conversation_history.assert_awaited_once()
+    assert mock_persona_service.load_persona.call_count == 1
+    # Both turns compact the one in-memory history, which now ends with them
+    history = mock_compact.await_args_list[1].args[0]
+    assert mock_compact.await_args_list[0].args[0] is history
+    assert [msg.content for msg in history] == [
+        "Hello!",
+        "Hi!",
+        "first",
+        "ok",
+        "second",
+        "ok",
+    ]
+
+
+@pytest.mark.anyio
+async def test_keep_context_reloads_history_written_elsewhere(
+    mock_persona_service, mock_project_service, mock_message_service
+):
+    """A kept history is reloaded once another writer added messages."""
+    from src.service.agent_service import AgentService
+
+    service = AgentService(
+        persona_service=mock_persona_service,
+        project_service=mock_project_service,
+        message_service=mock_message_service,
+        keep_context=True,
+    )
+    elsewhere = Message(
+        id=uuid.uuid4(),
+        conversation_id=mock_conversation_id,
+        content="sent over HTTP",
+        type=MessageType.USER,
+    )
+    mock_message_service.get_latest_message_id.return_value = mock_history[-1].id
+
+    await service._prepare_context("user-1", "conv-1")
+    await service._prepare_context("user-1", "conv-1")
+    assert mock_message_service.get_conversation_history.await_count == 1
+
+    mock_message_service.get_conversation_history.return_value = mock_history + [
+        elsewhere
+    ]
+    mock_message_service.get_latest_message_id.return_value = elsewhere.id
+    _, _, history = await service._prepare_context("user-1", "conv-1")
+
+    assert mock_message_service.get_conversation_history.await_count == 2
+    assert history[-1].parts[0].content == "sent over HTTP"
+    assert mock_persona_service.load_persona.call_count == 1
+
+
+@pytest.mark.anyio
+async def test_stream_agent_query_can_save_marked_partial_response(
+    agent_service, monkeypatch
+):
+    """With the save_partial policy, an abandoned reply is kept, marked."""
+    from src.service import agent_service as agent_service_module
+
+    monkeypatch.setattr(
+        agent_service_module, "GENERATE_DISCONNECT_POLICY", "save_partial"
+    )
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+            return_value=[],
+        ),
+        patch(
+            "src.service.agent_service.stream_stakeholder_query",
+            fake_stream("We have ", "mountain bikes."),
+        ),
+    ):
+        stream = agent_service.stream_agent_query(
+            user_id="user-1", conversation_id="conv-1", content="hello"
+        )
+        assert await anext(stream) == "We have "
+        await stream.aclose()
+
+    agent_service.message_service.save_ai_message.assert_awaited_once_with(
+        user_id="user-1",
+        conversation_id="conv-1",
+        content="We have " + agent_service_module.PARTIAL_RESPONSE_MARKER,
+    )
+
+
+@pytest.mark.anyio
+async def test_turns_on_one_conversation_run_one_at_a_time(agent_service, monkeypatch):
+    """A second turn on a conversation starts only after the first has finished."""
+    import asyncio
+
+    from src.limits.concurrency import ConcurrencyLimiter
+    from src.service import agent_service as agent_service_module
+
+    monkeypatch.setattr(
+        agent_service_module, "conversation_locks", ConcurrencyLimiter(1, 5)
+    )
+    events = []
+    release = asyncio.Event()
+
+    async def run_query(message, **_kwargs):
+        events.append(f"start {message}")
+        if message == "first":
+            await release.wait()
+        events.append(f"end {message}")
+        return "ok"
+
+    with (
+        patch(
+            "src.service.history_compactor_service.HistoryCompactorService.summarize_old_messages",
+            new_callable=AsyncMock,
+            return_value=[],
+        ),
+        patch("src.service.agent_service.run_stakeholder_query", run_query),
+    ):
+        first = asyncio.create_task(
+            agent_service.process_agent_query("user-1", "conv-1", "first")
+        )
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(
+            agent_service.process_agent_query("user-1", "conv-1", "second")
+        )
+        other = asyncio.create_task(
+            agent_service.process_agent_query("user-1", "conv-2", "other")
+        )
+        await asyncio.sleep(0.01)
+        assert events == ["start first", "start other", "end other"]
+        release.set()
+        await asyncio.gather(first, second, other)
+
+    assert events[3:] == ["end first", "start second", "end second"]
+
+
+@pytest.mark.anyio
+async def test_turn_waiting_too_long_reports_a_busy_conversation(
+    agent_service, monkeypatch
+):
+    from src.exceptions.conversation_busy_exception import ConversationBusyException
+    from src.limits.concurrency import ConcurrencyLimiter
+    from src.service import agent_service as agent_service_module
+
+    locks = ConcurrencyLimiter(1, 0)
+    monkeypatch.setattr(agent_service_module, "conversation_locks", locks)
+
+    async with locks.acquire("conv-1"):
+        with pytest.raises(ConversationBusyException):
+            await agent_service.process_agent_query("user-1", "conv-1", "hello")
+        with pytest.raises(ConversationBusyException):
+            async for _ in agent_service.stream_agent_query(
+                user_id="user-1", conversation_id="conv-1", content="hello"
+            ):
+                pass
+
+
+@pytest.mark.anyio
+async def test_queue_agent_query_deletes_the_message_when_not_queued(agent_service):
+    saved = MagicMock(id=uuid.uuid4())
+    agent_service.message_service.save_user_message = AsyncMock(return_value=saved)
+    agent_service.message_service.delete_message = AsyncMock()
+
+    queued = await agent_service.queue_agent_query(
+        "user-1", "conv-1", "hello", enqueue=lambda message_id: message_id
+    )
+    assert queued == str(saved.id)
+    agent_service.message_service.delete_message.assert_not_awaited()
+
+    queued = await agent_service.queue_agent_query(
+        "user-1", "conv-1", "hello", enqueue=lambda message_id: None
+    )
+    assert queued is None
+    agent_service.message_service.delete_message.assert_awaited_once_with(saved)
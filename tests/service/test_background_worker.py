@@ -0,0 +1,103 @@
+"""Unit tests for the keyed background worker pool."""
+
+import asyncio
+
+import pytest
+
+from src.service.background_worker import BackgroundWorker
+
+
+@pytest.mark.anyio
+async def test_worker_runs_jobs_with_bounded_concurrency():
+    worker = BackgroundWorker("test", concurrency=2, max_queue_size=10)
+    active = 0
+    peak = 0
+
+    async def job():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    for i in range(6):
+        worker.enqueue(f"key-{i}", job)
+    worker.start()
+    await worker.join()
+    await worker.stop()
+
+    assert peak == 2
+    stats = worker.stats()
+    assert stats["completed"] == 6
+    assert stats["queue_depth"] == 0
+    assert stats["last_lag_seconds"] > 0
+
+
+@pytest.mark.anyio
+async def test_worker_deduplicates_queued_keys():
+    worker = BackgroundWorker("test", concurrency=1, max_queue_size=10)
+    calls = []
+
+    for i in range(3):
+        worker.enqueue("conv-1", lambda i=i: asyncio.sleep(0, calls.append(i)))
+    assert worker.stats()["queue_depth"] == 1
+
+    worker.start()
+    await worker.join()
+    await worker.stop()
+
+    # Only the latest job for the key runs
+    assert calls == [2]
+    assert worker.stats()["deduplicated"] == 2
+
+
+@pytest.mark.anyio
+async def test_worker_reruns_key_enqueued_while_running():
+    worker = BackgroundWorker("test", concurrency=2, max_queue_size=10)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    runs = []
+
+    async def slow_job():
+        runs.append("first")
+        started.set()
+        await release.wait()
+
+    async def second_job():
+        runs.append("second")
+
+    worker.start()
+    worker.enqueue("conv-1", slow_job)
+    await started.wait()
+    # Must not run concurrently with the first job for the same key
+    worker.enqueue("conv-1", second_job)
+    await asyncio.sleep(0.01)
+    assert runs == ["first"]
+
+    release.set()
+    await asyncio.sleep(0.01)
+    await worker.join()
+    await worker.stop()
+    assert runs == ["first", "second"]
+
+
+@pytest.mark.anyio
+async def test_worker_survives_failures_and_drops_when_full():
+    worker = BackgroundWorker("test", concurrency=1, max_queue_size=1)
+
+    async def failing_job():
+        raise RuntimeError("boom")
+
+    assert worker.enqueue("a", failing_job)
+    assert not worker.enqueue("b", failing_job)
+
+    worker.start()
+    await worker.join()
+    assert worker.enqueue("c", failing_job)
+    await worker.join()
+    await worker.stop()
+
+    stats = worker.stats()
+    assert stats["failed"] == 2
+    assert stats["dropped"] == 1
+    assert stats["workers"] == 0
@@ -0,0 +1,52 @@
+"""Unit tests for background conversation compaction."""
+
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.service import compaction_worker
+from src.service.background_worker import BackgroundWorker
+
+
+@pytest.mark.anyio
+async def test_compact_conversation_uses_its_own_session(monkeypatch):
+    session = MagicMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=None)
+    monkeypatch.setattr(compaction_worker, "SessionLocal", session_factory)
+
+    db_message = MagicMock(
+        id=uuid.uuid4(), conversation_id=uuid.uuid4(), content="hi", type="user"
+    )
+    db_message.created_at = None
+    with (
+        patch.object(
+            compaction_worker.MessageRepository,
+            "get_messages_by_conversation_id",
+            AsyncMock(return_value=[db_message]),
+        ) as mock_get,
+        patch.object(
+            compaction_worker.HistoryCompactorService, "compact", AsyncMock()
+        ) as mock_compact,
+    ):
+        await compaction_worker.compact_conversation("conv-1", "user-1")
+
+    mock_get.assert_awaited_once_with(conversation_id="conv-1", user_id="user-1")
+    messages, user_id, repository = mock_compact.await_args.args
+    assert messages[0].content == "hi"
+    assert user_id == "user-1"
+    assert repository.session is session
+
+
+def test_schedule_compaction_deduplicates_per_conversation(monkeypatch):
+    worker = BackgroundWorker("compaction", concurrency=1, max_queue_size=10)
+    monkeypatch.setattr(compaction_worker, "compaction_worker", worker)
+
+    assert compaction_worker.schedule_compaction("conv-1", "user-1")
+    assert compaction_worker.schedule_compaction("conv-1", "user-1")
+    assert compaction_worker.schedule_compaction("conv-2", "user-1")
+
+    assert worker.stats()["queue_depth"] == 2
+    assert worker.stats()["deduplicated"] == 1
@@ -0,0 +1,126 @@
+"""Unit tests for asynchronous generation jobs."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.service import generation_jobs
+from src.service.background_worker import BackgroundWorker
+from src.service.generation_jobs import GenerationJobStore, JobStatus
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    session = MagicMock()
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    factory.return_value.__aexit__ = AsyncMock(return_value=None)
+    monkeypatch.setattr(generation_jobs, "SessionLocal", factory)
+    return factory
+
+
+@pytest.mark.anyio
+async def test_run_generation_job_records_the_response(session_factory):
+    job = GenerationJobStore(60, 10).create("user-1", "conv-1")
+    with patch.object(
+        generation_jobs.AgentService,
+        "respond_to_saved_message",
+        AsyncMock(return_value={"status": "success", "response": "hi"}),
+    ) as mock_respond:
+        await generation_jobs.run_generation_job(job, "hello", "msg-1")
+
+    mock_respond.assert_awaited_once_with(
+        user_id="user-1", conversation_id="conv-1", content="hello", message_id="msg-1"
+    )
+    assert job.status is JobStatus.succeeded
+    assert job.response == "hi"
+    assert job.done.is_set()
+
+
+@pytest.mark.anyio
+async def test_run_generation_job_records_failures(session_factory, caplog):
+    job = GenerationJobStore(60, 10).create("user-1", "conv-1")
+    with patch.object(
+        generation_jobs.AgentService,
+        "respond_to_saved_message",
+        AsyncMock(return_value={"status": "error", "details": "boom"}),
+    ):
+        await generation_jobs.run_generation_job(job, "hello", "msg-1")
+    assert job.status is JobStatus.failed
+    # The owner gets a generic error; the details only go to the log
+    assert job.error == generation_jobs.GENERATION_JOB_ERROR
+    assert "boom" in caplog.text
+
+    job = GenerationJobStore(60, 10).create("user-1", "conv-1")
+    with (
+        patch.object(
+            generation_jobs.AgentService,
+            "respond_to_saved_message",
+            AsyncMock(side_effect=RuntimeError("db down")),
+        ),
+        pytest.raises(RuntimeError),
+    ):
+        await generation_jobs.run_generation_job(job, "hello", "msg-1")
+    assert job.status is JobStatus.failed
+    assert job.error == generation_jobs.GENERATION_JOB_ERROR
+    assert job.done.is_set()
+
+
+def test_job_store_checks_owner_and_expires_finished_jobs(monkeypatch):
+    store = GenerationJobStore(ttl=60, max_size=2)
+    now = 1000.0
+    monkeypatch.setattr(generation_jobs.time, "monotonic", lambda: now)
+
+    job = store.create("user-1", "conv-1")
+    assert store.get(job.id, "user-1") is job
+    assert store.get(job.id, "user-2") is None
+
+    job.finish(JobStatus.succeeded, response="hi")
+    now += 59
+    assert store.get(job.id, "user-1") is job
+    now += 1
+    assert store.get(job.id, "user-1") is None
+
+    for _ in range(3):
+        store.create("user-1", "conv-1")
+    stats = store.stats()
+    assert stats["size"] == 2
+    assert stats["queued"] == 2
+    assert stats["evictions"] == 2
+
+
+def test_submit_generation_job_reports_a_full_queue(monkeypatch):
+    store = GenerationJobStore(60, 10)
+    worker = BackgroundWorker("generation-jobs", concurrency=1, max_queue_size=1)
+    monkeypatch.setattr(generation_jobs, "generation_jobs", store)
+    monkeypatch.setattr(generation_jobs, "generation_job_worker", worker)
+
+    job = generation_jobs.submit_generation_job("user-1", "conv-1", "hello", "msg-1")
+    assert job is not None
+    assert worker.full
+
+    assert (
+        generation_jobs.submit_generation_job("user-1", "conv-1", "again", "msg-2")
+        is None
+    )
+    assert store.stats()["size"] == 1
+
+
+def test_submit_generation_job_caps_unfinished_jobs_per_user(monkeypatch):
+    store = GenerationJobStore(60, 10)
+    worker = BackgroundWorker("generation-jobs", concurrency=1, max_queue_size=10)
+    monkeypatch.setattr(generation_jobs, "generation_jobs", store)
+    monkeypatch.setattr(generation_jobs, "generation_job_worker", worker)
+    monkeypatch.setattr(generation_jobs.generation_limiter, "limit", 2)
+
+    jobs = [
+        generation_jobs.submit_generation_job("user-1", "conv-1", "hi", f"msg-{i}")
+        for i in range(3)
+    ]
+    assert jobs[2] is None
+    assert store.unfinished("user-1") == 2
+    # Other users have their own allowance
+    assert generation_jobs.submit_generation_job("user-2", "conv-2", "hi", "msg-4")
+
+    jobs[0].finish(JobStatus.failed, error="boom")
+    assert generation_jobs.submit_generation_job("user-1", "conv-1", "hi", "msg-5")
@@ -2,28 +2,43 @@
 Test class for HistoryCompactorService.
 """
 
+import asyncio
 import uuid
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
-from pydantic_ai import ModelRequest, ModelResponse, TextPart
+from pydantic_ai import ModelRequest, ModelResponse, TextPart, UserPromptPart
 
+from src.models.conversation_summary import ConversationSummary
 from src.schemas.message_model import Message, MessageType
+from src.service import history_compactor_service
 from src.service.history_compactor_service import HistoryCompactorService
 
 
 @pytest.fixture(autouse=True)
-def mock_summarize_agent_run_with_five_messages():
-    """Fixture to mock summarize_agent.run"""
+def ten_message_budget(monkeypatch):
+    """Budget that fits exactly ten short "Message N" messages (7 tokens each)."""
+    monkeypatch.setattr(
+        history_compactor_service, "get_history_token_budget", lambda _: 70
+    )
+
+
+@pytest.fixture(autouse=True)
+def summarize_agent():
+    """Fixture to mock the summarizer agent"""
+    mock_agent = MagicMock()
+    mock_result = MagicMock()
+    mock_result.new_messages.return_value = [
+        ModelResponse(parts=[TextPart(content="Summary of old messages")])
+    ]
+    mock_result.output = "Summary of old messages"
+    mock_agent.run = AsyncMock(return_value=mock_result)
     with patch(
-        "src.service.history_compactor_service.summarize_agent.run",
-        new_callable=AsyncMock,
-    ) as mock_run:
-        mock_result = MagicMock()
-        mock_result.new_messages.return_value = [
-            ModelResponse(parts=[TextPart(content="Summary of old messages")])
-        ]
-        mock_run.return_value = mock_result
-        yield
+        "src.service.history_compactor_service.get_summarize_agent",
+        return_value=mock_agent,
+    ):
+        yield mock_agent
 
 
 @pytest.mark.anyio
@@ -58,3 +73,385 @@ async def test_summarize_old_messages_with_summarization():
     result = await HistoryCompactorService.summarize_old_messages(messages)
     assert len(result) == 11  # summary + 10 recent
     assert all(isinstance(msg, (ModelRequest, ModelResponse)) for msg in result)
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_charges_token_usage():
+    """Summarization tokens are charged to the user when one is given."""
+    messages = [
+        Message(
+            id=uuid.uuid4(),
+            conversation_id=uuid.uuid4(),
+            content=f"Message {i}",
+            type=MessageType.USER if i % 2 == 0 else MessageType.AI,
+        )
+        for i in range(15)
+    ]
+    with patch(
+        "src.service.history_compactor_service.acharge_token_usage"
+    ) as mock_charge:
+        await HistoryCompactorService.summarize_old_messages(messages, user_id="u-1")
+
+    mock_charge.assert_called_once()
+    assert mock_charge.call_args[0][0] == "u-1"
+
+
+def make_timed_messages(count: int) -> list[Message]:
+    conversation_id = uuid.uuid4()
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        Message(
+            id=uuid.uuid4(),
+            conversation_id=conversation_id,
+            content=f"Message {i}",
+            type=MessageType.USER if i % 2 == 0 else MessageType.AI,
+            created_at=start + timedelta(minutes=i),
+        )
+        for i in range(count)
+    ]
+
+
+def make_summary_repository(stored=None):
+    """Repository mock whose save_summary keeps the rows it is asked to store."""
+    rows = [] if stored is None else [stored]
+    repository = MagicMock()
+    repository.rows = rows
+    repository.get_summaries = AsyncMock(side_effect=lambda **_: list(rows))
+
+    async def save_summary(replaced=(), **kwargs):
+        for summary in replaced:
+            rows.remove(summary)
+        kwargs.pop("conversation_id")
+        kwargs.pop("user_id")
+        row = ConversationSummary(id=uuid.uuid4(), **kwargs)
+        rows.append(row)
+        return row
+
+    repository.save_summary = AsyncMock(side_effect=save_summary)
+    return repository
+
+
+@pytest.fixture
+def flat_summaries(monkeypatch):
+    """Keep one rolling summary instead of a hierarchy."""
+    monkeypatch.setattr(history_compactor_service, "SUMMARY_LEVEL_FANOUT", 0)
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_persists_new_summary(summarize_agent):
+    messages = make_timed_messages(15)
+    repository = make_summary_repository()
+
+    result = await HistoryCompactorService.summarize_old_messages(
+        messages, user_id="u-1", summary_repository=repository
+    )
+
+    assert len(result) == 11
+    assert "Summary of old messages" in result[0].parts[0].content
+    summarize_agent.run.assert_awaited_once()
+    assert len(summarize_agent.run.await_args.kwargs["message_history"]) == 5
+    save_kwargs = repository.save_summary.await_args.kwargs
+    assert save_kwargs["content"] == "Summary of old messages"
+    assert save_kwargs["last_message_id"] == str(messages[4].id)
+    assert save_kwargs["last_message_created_at"] == messages[4].created_at
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_reuses_stored_summary(summarize_agent):
+    """No LLM call when the stored summary already covers every old message."""
+    messages = make_timed_messages(15)
+    stored = ConversationSummary(
+        level=0,
+        content="Stored summary",
+        last_message_id=messages[4].id,
+        last_message_created_at=messages[4].created_at,
+    )
+    repository = make_summary_repository(stored)
+
+    result = await HistoryCompactorService.summarize_old_messages(
+        messages, user_id="u-1", summary_repository=repository
+    )
+
+    assert len(result) == 11
+    assert "Stored summary" in result[0].parts[0].content
+    summarize_agent.run.assert_not_awaited()
+    repository.save_summary.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_folds_only_new_messages(
+    flat_summaries, summarize_agent
+):
+    """Only messages that left the recent window since the last summary are sent."""
+    messages = make_timed_messages(19)
+    stored = ConversationSummary(
+        level=0,
+        content="Stored summary",
+        last_message_id=messages[4].id,
+        last_message_created_at=messages[4].created_at,
+    )
+    repository = make_summary_repository(stored)
+
+    await HistoryCompactorService.summarize_old_messages(
+        messages, user_id="u-1", summary_repository=repository
+    )
+
+    history = summarize_agent.run.await_args.kwargs["message_history"]
+    # previous summary + messages 5 to 8
+    assert len(history) == 5
+    assert "Stored summary" in history[0].parts[0].content
+    assert history[1].parts[0].content == "Message 5"
+    assert repository.save_summary.await_args.kwargs["last_message_id"] == str(
+        messages[8].id
+    )
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_falls_back_to_timestamps(
+    flat_summaries, summarize_agent
+):
+    """A summary whose last message was deleted is still matched by timestamp."""
+    messages = make_timed_messages(19)
+    stored = ConversationSummary(
+        level=0,
+        content="Stored summary",
+        last_message_id=uuid.uuid4(),
+        last_message_created_at=messages[4].created_at + timedelta(seconds=1),
+    )
+    repository = make_summary_repository(stored)
+
+    await HistoryCompactorService.summarize_old_messages(
+        messages, user_id="u-1", summary_repository=repository
+    )
+
+    history = summarize_agent.run.await_args.kwargs["message_history"]
+    assert [part.content for msg in history[1:] for part in msg.parts] == [
+        "Message 5",
+        "Message 6",
+        "Message 7",
+        "Message 8",
+    ]
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_waits_for_a_full_batch(summarize_agent):
+    """Fewer than a batch of newly old messages are sent verbatim, without a fold."""
+    messages = make_timed_messages(17)
+    stored = ConversationSummary(
+        level=0,
+        content="Stored summary",
+        last_message_id=messages[4].id,
+        last_message_created_at=messages[4].created_at,
+    )
+    repository = make_summary_repository(stored)
+
+    result = await HistoryCompactorService.summarize_old_messages(
+        messages, user_id="u-1", summary_repository=repository
+    )
+
+    # summary + messages 5 and 6 verbatim + 10 recent
+    assert len(result) == 13
+    assert "Stored summary" in result[0].parts[0].content
+    assert result[1].parts[0].content == "Message 5"
+    summarize_agent.run.assert_not_awaited()
+    repository.save_summary.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_folds_backlog_in_bounded_steps(
+    monkeypatch, flat_summaries, summarize_agent
+):
+    monkeypatch.setattr(history_compactor_service, "SUMMARY_FOLD_MAX_MESSAGES", 20)
+    messages = make_timed_messages(60)
+    repository = make_summary_repository()
+
+    result = await HistoryCompactorService.summarize_old_messages(
+        messages, user_id="u-1", summary_repository=repository
+    )
+
+    assert len(result) == 11
+    # 50 old messages: 20 + 20 + 10, each step carrying the previous summary
+    sizes = [
+        len(call.kwargs["message_history"])
+        for call in summarize_agent.run.await_args_list
+    ]
+    assert sizes == [20, 21, 11]
+    saved = [
+        call.kwargs["last_message_id"]
+        for call in repository.save_summary.await_args_list
+    ]
+    assert saved == [str(messages[i].id) for i in (19, 39, 49)]
+
+
+@pytest.mark.anyio
+async def test_build_history_never_calls_the_summarizer(summarize_agent):
+    """The request path uses the stored summary plus uncovered messages verbatim."""
+    messages = make_timed_messages(25)
+    stored = ConversationSummary(
+        level=0,
+        content="Stored summary",
+        last_message_id=messages[4].id,
+        last_message_created_at=messages[4].created_at,
+    )
+    repository = make_summary_repository(stored)
+
+    result = await HistoryCompactorService.build_history(messages, "u-1", repository)
+
+    # summary + messages 5 to 14 verbatim + 10 recent
+    assert len(result) == 21
+    assert "Stored summary" in result[0].parts[0].content
+    summarize_agent.run.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_build_history_bounds_the_uncovered_backlog(monkeypatch, summarize_agent):
+    """Without a usable summary, only the newest uncovered messages are sent."""
+    monkeypatch.setattr(history_compactor_service, "SUMMARY_FOLD_MAX_MESSAGES", 5)
+    messages = make_timed_messages(60)
+    repository = make_summary_repository()
+
+    result = await HistoryCompactorService.build_history(messages, "u-1", repository)
+
+    # messages 45 to 49 verbatim + 10 recent
+    assert len(result) == 15
+    assert result[0].parts[0].content == "Message 45"
+    summarize_agent.run.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_compact_folds_only_full_batches(summarize_agent):
+    messages = make_timed_messages(17)
+    stored = ConversationSummary(
+        level=0,
+        content="Stored summary",
+        last_message_id=messages[4].id,
+        last_message_created_at=messages[4].created_at,
+    )
+    repository = make_summary_repository(stored)
+
+    assert not await HistoryCompactorService.compact(messages, "u-1", repository)
+    summarize_agent.run.assert_not_awaited()
+
+    messages = make_timed_messages(15)
+    repository = make_summary_repository()
+    assert await HistoryCompactorService.compact(messages, "u-1", repository)
+    repository.save_summary.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_keeps_everything_within_budget(
+    monkeypatch, summarize_agent
+):
+    """Nothing is summarized while the whole conversation fits the budget."""
+    monkeypatch.setattr(
+        history_compactor_service, "get_history_token_budget", lambda _: 10_000
+    )
+    messages = make_timed_messages(40)
+
+    result = await HistoryCompactorService.summarize_old_messages(messages)
+
+    assert len(result) == 40
+    summarize_agent.run.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_summarize_old_messages_window_follows_message_size(summarize_agent):
+    """A few large messages fill the budget that ten short ones would."""
+    messages = make_timed_messages(12)
+    messages[-1].content = "x" * 200  # ~50 tokens + overhead
+    messages[-2].content = "y" * 40  # ~10 tokens + overhead
+
+    result = await HistoryCompactorService.summarize_old_messages(messages)
+
+    # summary + the two large messages; the 10 short ones are summarized
+    assert len(result) == 3
+    summarize_agent.run.assert_awaited_once()
+
+
+def test_split_by_budget_keeps_newest_message_even_if_oversized():
+    messages = make_timed_messages(3)
+    messages[-1].content = "z" * 1000
+
+    old, recent = HistoryCompactorService._split_by_budget(messages, 70)
+
+    assert recent == [messages[-1]]
+    assert old == messages[:-1]
+
+
+@pytest.mark.anyio
+async def test_compact_builds_summary_levels(monkeypatch, summarize_agent):
+    """Chunk summaries are merged level by level, like carries in a counter."""
+    monkeypatch.setattr(history_compactor_service, "SUMMARY_LEVEL_FANOUT", 2)
+    monkeypatch.setattr(history_compactor_service, "SUMMARY_FOLD_MAX_MESSAGES", 5)
+    messages = make_timed_messages(30)
+    repository = make_summary_repository()
+
+    assert await HistoryCompactorService.compact(messages, "u-1", repository)
+
+    # 4 chunk summaries + 3 merges (2 at level 0, 1 at level 1)
+    assert summarize_agent.run.await_count == 7
+    assert [(row.level, row.last_message_id) for row in repository.rows] == [
+        (2, str(messages[19].id))
+    ]
+    # Chunk summaries only see their own chunk, not earlier summaries
+    first_chunk = summarize_agent.run.await_args_list[0].kwargs["message_history"]
+    assert [msg.parts[0].content for msg in first_chunk] == [
+        f"Message {i}" for i in range(5)
+    ]
+    # A merge sends its children as the user turn
+    merge = summarize_agent.run.await_args_list[2].kwargs["message_history"]
+    assert len(merge) == 1
+    assert isinstance(merge[0].parts[0], UserPromptPart)
+    assert merge[0].parts[0].content.count("Summary of old messages") == 2
+
+
+@pytest.mark.anyio
+async def test_compact_only_adds_a_chunk_to_existing_levels(
+    monkeypatch, summarize_agent
+):
+    monkeypatch.setattr(history_compactor_service, "SUMMARY_LEVEL_FANOUT", 4)
+    messages = make_timed_messages(24)
+    older = ConversationSummary(
+        level=1,
+        content="Level 1",
+        last_message_id=messages[7].id,
+        last_message_created_at=messages[7].created_at,
+    )
+    repository = make_summary_repository(older)
+
+    assert await HistoryCompactorService.compact(messages, "u-1", repository)
+
+    # Only messages 8 to 13 are summarized; the level 1 summary is untouched
+    summarize_agent.run.assert_awaited_once()
+    assert [row.level for row in repository.rows] == [1, 0]
+
+    history = await HistoryCompactorService.build_history(messages, "u-1", repository)
+    assert len(history) == 11
+    summary = history[0].parts[0].content
+    assert summary.index("Level 1") < summary.index("Summary of old messages")
+
+
+@pytest.mark.anyio
+async def test_summarizer_calls_are_bounded(monkeypatch, summarize_agent):
+    monkeypatch.setattr(
+        history_compactor_service, "_summarizer_slots", asyncio.Semaphore(1)
+    )
+    active = 0
+    peak = 0
+
+    async def run(**_):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return MagicMock(output="summary")
+
+    summarize_agent.run.side_effect = run
+    messages = make_timed_messages(3)
+
+    await asyncio.gather(
+        *(HistoryCompactorService._fold(None, messages, None) for _ in range(3))
+    )
+
+    assert peak == 1
@@ -0,0 +1,105 @@
+"""Unit tests for the idempotency key store."""
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+
+from src.service import idempotency
+from src.service.idempotency import IdempotencyKeyMismatch, IdempotencyStore
+
+
+@pytest.mark.anyio
+async def test_completed_result_is_replayed():
+    store = IdempotencyStore(ttl=60, max_size=10)
+    work = AsyncMock(return_value="response")
+
+    assert await store.run("k", "fp", work) == "response"
+    assert await store.run("k", "fp", work) == "response"
+
+    work.assert_awaited_once()
+    assert store.stats()["replayed"] == 1
+
+
+@pytest.mark.anyio
+async def test_retry_attaches_to_the_attempt_in_flight():
+    store = IdempotencyStore(ttl=60, max_size=10)
+    release = asyncio.Event()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "response"
+
+    first = asyncio.create_task(store.run("k", "fp", work))
+    await asyncio.sleep(0)
+    retry = asyncio.create_task(store.run("k", "fp", work))
+    await asyncio.sleep(0)
+    assert store.stats()["in_flight"] == 1
+    release.set()
+
+    assert await asyncio.gather(first, retry) == ["response", "response"]
+    assert calls == 1
+    assert store.stats()["joined"] == 1
+
+
+@pytest.mark.anyio
+async def test_key_reused_for_another_request_is_rejected():
+    store = IdempotencyStore(ttl=60, max_size=10)
+    await store.run("k", "fp", AsyncMock(return_value="response"))
+
+    with pytest.raises(IdempotencyKeyMismatch):
+        await store.run("k", "other", AsyncMock())
+
+
+@pytest.mark.anyio
+async def test_uncached_results_and_errors_are_redone():
+    store = IdempotencyStore(ttl=60, max_size=10)
+    work = AsyncMock(side_effect=["error", "response"])
+
+    assert await store.run("k", "fp", work, cache_if=lambda r: r != "error") == "error"
+    assert await store.run("k", "fp", work) == "response"
+
+    failing = AsyncMock(side_effect=[RuntimeError("down"), "response"])
+    with pytest.raises(RuntimeError):
+        await store.run("k2", "fp", failing)
+    assert await store.run("k2", "fp", failing) == "response"
+
+
+@pytest.mark.anyio
+async def test_retry_takes_over_when_the_attempt_is_cancelled():
+    store = IdempotencyStore(ttl=60, max_size=10)
+    started = asyncio.Event()
+
+    async def stuck():
+        started.set()
+        await asyncio.sleep(60)
+
+    first = asyncio.create_task(store.run("k", "fp", stuck))
+    await started.wait()
+    retry = asyncio.create_task(
+        store.run("k", "fp", AsyncMock(return_value="response"))
+    )
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await retry == "response"
+
+
+@pytest.mark.anyio
+async def test_store_is_bounded_and_entries_expire(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(idempotency.time, "monotonic", lambda: now)
+    store = IdempotencyStore(ttl=60, max_size=2)
+    for key in ("a", "b", "c"):
+        await store.run(key, "fp", AsyncMock(return_value=key))
+
+    assert store.stats()["size"] == 2
+    assert store.stats()["evictions"] == 1
+
+    now += 61
+    work = AsyncMock(return_value="fresh")
+    assert await store.run("c", "fp", work) == "fresh"
+    work.assert_awaited_once()
@@ -131,3 +131,13 @@ async def test_get_conversation_history_with_messages(
     assert result[0].type == MessageType.USER
     assert result[1].content == "AI response"
     assert result[1].type == MessageType.AI
+
+
+@pytest.mark.anyio
+async def test_delete_message(message_service, mock_message_repository):
+    """Test deleting a saved message."""
+    message = object()
+
+    await message_service.delete_message(message)
+
+    mock_message_repository.delete_message.assert_awaited_once_with(message)
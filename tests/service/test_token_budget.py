@@ -0,0 +1,50 @@
+"""Unit tests for token estimates and per-model history budgets."""
+
+import pytest
+
+from src.service import token_budget
+from src.service.token_budget import (
+    ByteLengthEstimator,
+    estimate_message_tokens,
+    get_history_token_budget,
+    parse_token_budgets,
+    set_token_estimator,
+)
+
+
+def test_byte_length_estimator_counts_utf8_bytes():
+    estimator = ByteLengthEstimator()
+
+    assert estimator.count("") == 0
+    assert estimator.count("abcd") == 1
+    assert estimator.count("abcde") == 2
+    # multi-byte characters cost more than ASCII
+    assert estimator.count("éé") == 1
+    assert estimator.count("日本語") == 3
+
+
+def test_estimator_is_pluggable(monkeypatch):
+    class WordEstimator:
+        def count(self, text: str) -> int:
+            return len(text.split())
+
+    monkeypatch.setattr(token_budget, "_estimator", token_budget._estimator)
+    set_token_estimator(WordEstimator())
+
+    assert estimate_message_tokens("one two three") == 3 + 4
+
+
+def test_history_token_budget_per_model(monkeypatch):
+    monkeypatch.setattr(
+        token_budget, "_budgets", parse_token_budgets('{"gpt-4o": 12000}')
+    )
+    monkeypatch.setattr(token_budget, "HISTORY_TOKEN_BUDGET", 4000)
+
+    assert get_history_token_budget("gpt-4o") == 12000
+    assert get_history_token_budget("llama3.1:8b") == 4000
+
+
+@pytest.mark.parametrize("raw", ["nope", '["gpt-4o"]', '{"gpt-4o": "lots"}'])
+def test_parse_token_budgets_rejects_invalid_config(raw):
+    with pytest.raises(RuntimeError, match="HISTORY_TOKEN_BUDGETS"):
+        parse_token_budgets(raw)
@@ -0,0 +1,45 @@
+"""Unit tests for the shared HTTP client module."""
+
+import pytest
+
+import src.http_client as http_client
+
+
+@pytest.fixture(autouse=True)
+def reset_client(monkeypatch):
+    monkeypatch.setattr(http_client, "_client", None)
+
+
+def test_create_http_client_applies_pool_settings(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_MAX_CONNECTIONS", 7)
+    monkeypatch.setattr(http_client, "HTTP_MAX_KEEPALIVE_CONNECTIONS", 3)
+    monkeypatch.setattr(http_client, "HTTP_TIMEOUT_SECONDS", 2.5)
+    monkeypatch.setattr(http_client, "HTTP_CONNECT_TIMEOUT_SECONDS", 1.0)
+
+    client = http_client.create_http_client()
+
+    pool = client._transport._pool
+    assert pool._max_connections == 7
+    assert pool._max_keepalive_connections == 3
+    assert client.timeout.read == 2.5
+    assert client.timeout.connect == 1.0
+
+
+@pytest.mark.anyio
+async def test_get_http_client_is_shared_and_recreated_after_close():
+    client = http_client.get_http_client()
+    assert http_client.get_http_client() is client
+
+    await http_client.close_http_client()
+    assert client.is_closed
+    assert http_client._client is None
+
+    reopened = http_client.get_http_client()
+    assert reopened is not client
+    await http_client.close_http_client()
+
+
+@pytest.mark.anyio
+async def test_close_http_client_without_client_is_noop():
+    await http_client.close_http_client()
+    assert http_client._client is None
@@ -2,9 +2,10 @@
 
 import importlib
 from types import SimpleNamespace
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from fastapi import Response
 
 
 @pytest.mark.anyio
@@ -16,12 +17,64 @@ async def test_main_module_routes_and_lifespan(monkeypatch):
 
     assert await main_mod.main() == "Hello from ai-server!"
     assert await main_mod.health() == {"status": "ok"}
-    assert await main_mod.ready() == {"status": "ok"}
+    metrics = await main_mod.metrics()
+    assert "hits" in metrics["auth_token_cache"]
+    assert "bucket_count" in metrics["rate_limiter"]
+    assert "in_flight" in metrics["generation_concurrency"]
+    assert "queue_depth" in metrics["compaction"]
+    assert "registered_agents" in metrics["llm_models"]
 
     dispose = AsyncMock()
     monkeypatch.setattr(main_mod, "engine", SimpleNamespace(dispose=dispose))
+    get_http_client = MagicMock()
+    close_http_client = AsyncMock()
+    monkeypatch.setattr(main_mod, "get_http_client", get_http_client)
+    monkeypatch.setattr(main_mod, "close_http_client", close_http_client)
+    prefetch_jwks = AsyncMock(return_value=True)
+    start_jwks_refresh = MagicMock()
+    stop_jwks_refresh = AsyncMock()
+    monkeypatch.setattr(main_mod, "prefetch_jwks", prefetch_jwks)
+    monkeypatch.setattr(main_mod, "start_jwks_refresh", start_jwks_refresh)
+    monkeypatch.setattr(main_mod, "stop_jwks_refresh", stop_jwks_refresh)
+    compaction_worker = SimpleNamespace(start=MagicMock(), stop=AsyncMock())
+    monkeypatch.setattr(main_mod, "compaction_worker", compaction_worker)
+    generation_job_worker = SimpleNamespace(start=MagicMock(), stop=AsyncMock())
+    monkeypatch.setattr(main_mod, "generation_job_worker", generation_job_worker)
+    model_registry = SimpleNamespace(warm_up=MagicMock(), aclose=AsyncMock())
+    monkeypatch.setattr(main_mod, "model_registry", model_registry)
 
     async with main_mod.lifespan(main_mod.app):
-        pass
+        get_http_client.assert_called_once_with()
+        compaction_worker.start.assert_called_once_with()
+        generation_job_worker.start.assert_called_once_with()
+        model_registry.warm_up.assert_called_once_with()
+        prefetch_jwks.assert_awaited_once()
+        start_jwks_refresh.assert_called_once_with()
+        close_http_client.assert_not_awaited()
 
+    stop_jwks_refresh.assert_awaited_once()
+    compaction_worker.stop.assert_awaited_once()
+    generation_job_worker.stop.assert_awaited_once()
+    model_registry.aclose.assert_awaited_once()
+    close_http_client.assert_awaited_once()
     dispose.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_ready_reports_jwks_health(monkeypatch):
+    main_mod = importlib.import_module("src.main")
+    health = {"healthy": True, "age_seconds": 12.5, "key_count": 2}
+    monkeypatch.setattr(main_mod, "jwks_health", lambda: health)
+
+    response = Response()
+    assert await main_mod.ready(response) == {"status": "ok", "jwks": health}
+    assert response.status_code == 200
+
+    unhealthy = {"healthy": False, "last_error": "ConnectError: down"}
+    monkeypatch.setattr(main_mod, "jwks_health", lambda: unhealthy)
+    response = Response()
+    assert await main_mod.ready(response) == {
+        "status": "unavailable",
+        "jwks": unhealthy,
+    }
+    assert response.status_code == 503